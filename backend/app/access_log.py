@@ -0,0 +1,218 @@
+"""
+Structured JSON access logs, written off the request path.
+
+Every request gets an id (the caller's X-Request-ID, or a new one) that is
+returned in the response header and attached to every log record emitted
+while the request runs. The access record holds method, path, status,
+duration and client. Headers are only logged with ACCESS_LOG_HEADERS=true,
+and even then Authorization, Cookie and similar headers are redacted.
+
+Successful requests are sampled with ACCESS_LOG_SAMPLE_RATE. Server errors,
+unhandled exceptions and requests slower than ACCESS_LOG_SLOW_MS are always
+logged. Handlers on the event loop only enqueue records: a QueueListener
+thread formats them and writes them to stdout, so a slow log pipeline never
+stalls a request.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from fastapi import Request
+
+from .metrics import REGISTRY
+
+# The package logger ("app", or "backend.app" when run from the project root)
+APP_LOGGER = __name__.rsplit('.', 1)[0]
+ACCESS_LOGGER = f"{APP_LOGGER}.access"
+REQUEST_ID_HEADER = "X-Request-ID"
+
+REDACTED_HEADERS = frozenset({
+    'authorization', 'proxy-authorization', 'cookie', 'set-cookie', 'x-api-key', 'x-auth-token'
+})
+
+request_id_var: ContextVar[Optional[str]] = ContextVar('request_id', default=None)
+
+# Fields every LogRecord has; anything else was passed via extra= and is logged
+_RECORD_FIELDS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener: Optional[QueueListener] = None
+
+DROPPED_RECORDS = REGISTRY.counter("log_records_dropped_total", "Log records dropped because the log queue was full.")
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request_id and extra fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS and key != 'request_id':
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _AsyncLogHandler(QueueHandler):
+    """Hands records to the writer thread without formatting them to JSON first.
+
+    The request id is stamped while the record is still in the request's
+    context. Records are dropped (and counted) rather than blocking the event
+    loop when the queue is full.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        if getattr(record, 'request_id', None) is None:
+            record.request_id = request_id_var.get()
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            # Tracebacks hold frames; keep only their text across the thread hand-off
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DROPPED_RECORDS.inc()
+
+
+class AccessLogger:
+    def __init__(self, sample_rate: float = 1.0, slow_ms: float = 1000.0, log_headers: bool = False):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.log_headers = log_headers
+        self.logger = logging.getLogger(ACCESS_LOGGER)
+
+    @classmethod
+    def from_env(cls) -> "AccessLogger":
+        return cls(
+            sample_rate=float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "1.0")),
+            slow_ms=float(os.getenv("ACCESS_LOG_SLOW_MS", "1000")),
+            log_headers=os.getenv("ACCESS_LOG_HEADERS", "false").lower() == "true"
+        )
+
+    @staticmethod
+    def redact_headers(headers) -> Dict[str, str]:
+        return {
+            name: '[REDACTED]' if name.lower() in REDACTED_HEADERS else value
+            for name, value in headers.items()
+        }
+
+    def should_log(self, status: int, duration_ms: float) -> bool:
+        if status >= 500 or duration_ms >= self.slow_ms:
+            return True
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def record(self, request: Request, status: int, duration_ms: float, error: Optional[BaseException] = None):
+        if not self.logger.isEnabledFor(logging.INFO) or not self.should_log(status, duration_ms):
+            return
+        fields: Dict[str, Any] = {
+            'method': request.method,
+            'path': request.url.path,
+            'status': status,
+            'duration_ms': round(duration_ms, 2),
+            'client': request.client.host if request.client else None,
+            'user_agent': request.headers.get('user-agent')
+        }
+        if request.url.query:
+            fields['query'] = request.url.query
+        if self.log_headers:
+            fields['headers'] = self.redact_headers(request.headers)
+        if status < 500:
+            fields['sample_rate'] = self.sample_rate
+        message = f"{request.method} {request.url.path} {status}"
+        if error is not None:
+            self.logger.error(message, extra=fields, exc_info=(type(error), error, error.__traceback__))
+        else:
+            self.logger.log(logging.WARNING if status >= 500 else logging.INFO, message, extra=fields)
+
+    async def middleware(self, request: Request, call_next):
+        request_id = request.headers.get(REQUEST_ID_HEADER, '')[:128] or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        started = time.perf_counter()
+        try:
+            try:
+                response = await call_next(request)
+            except Exception as e:
+                self.record(request, 500, (time.perf_counter() - started) * 1000, error=e)
+                raise
+            response.headers[REQUEST_ID_HEADER] = request_id
+            # Streaming responses are timed to their headers; the body keeps flowing afterwards
+            self.record(request, response.status_code, (time.perf_counter() - started) * 1000)
+            return response
+        finally:
+            request_id_var.reset(token)
+
+
+def start_logging():
+    """Route the app's loggers through a queue to a JSON stdout writer thread (idempotent)."""
+    global _listener
+    if _listener is not None:
+        return
+    log_queue: queue.Queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JSONFormatter())
+    _listener = QueueListener(log_queue, stream, respect_handler_level=False)
+
+    handler = _AsyncLogHandler(log_queue)
+    logger = logging.getLogger(APP_LOGGER)
+    logger.handlers = [handler]
+    logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    logger.propagate = False  # keep records away from uvicorn's own handlers
+    _listener.start()
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread (app shutdown)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def open_jsonl_log(name: str, path: Path) -> logging.Logger:
+    """Logger that appends each message as one line to path, written by its own thread.
+
+    For side logs such as model routing decisions. Like the app log, records
+    are only enqueued on the caller's thread and dropped when the queue is full.
+    Raises OSError when the log directory cannot be created.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    writer = logging.FileHandler(path, encoding='utf-8', delay=True)
+    writer.setFormatter(logging.Formatter('%(message)s'))
+    log_queue: queue.Queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+    listener = QueueListener(log_queue, writer)
+    listener.start()
+    atexit.register(listener.stop)  # flush pending lines, also for CLI use without app shutdown
+
+    logger = logging.getLogger(name)
+    logger.handlers = [_AsyncLogHandler(log_queue)]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False  # the file is the destination, not the app log
+    return logger
@@ -0,0 +1,127 @@
+"""
+Cross-lingual alignment of parallel provisions.
+
+The corpus holds some acts twice, e.g. the Nepali and the English
+constitution. धारा ७६ and "Article 76" then compete for the same top_k slots
+and spend the prompt budget twice on one provision. Chunks are aligned on
+(act alias group, section type, section number); the alias groups from
+citation_index put "नेपालको संविधान" and "Constitution of Nepal" together.
+After retrieval, each aligned provision collapses to the variants in the
+preferred language (the answer language). The kept chunk takes the best
+score and rank of the group and records the variants it replaced in
+'aligned_variants'. Retrieval over-fetches so that top_k still yields
+top_k distinct provisions.
+"""
+
+import math
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from .citation_index import act_group
+from .retrieval_scope import text_language
+from .sparse_index import normalize_numerals
+
+ProvisionKey = Tuple[str, str, str]
+
+
+def provision_key(metadata: Dict[str, Any]) -> Optional[ProvisionKey]:
+    """(act group, section type, section number) shared by every language version of a provision."""
+    act_name = metadata.get('act_name_ne')
+    section_type = metadata.get('section_type_ne')
+    section_number = normalize_numerals(str(metadata.get('section_number', ''))).lstrip('0')
+    if not (act_name and section_type and section_number):
+        return None
+    return act_group(act_name), section_type, section_number
+
+
+class ParallelProvisionIndex:
+    def __init__(self, overfetch: float = 2.0):
+        self.overfetch = overfetch
+        self._languages: Dict[str, str] = {}   # chunk id -> 'ne' / 'en'
+        self._parallel: Set[ProvisionKey] = set()
+        self._lock = threading.Lock()
+        self.stats = {'collapsed_groups': 0, 'dropped_variants': 0}
+
+    def build(self, corpus: Sequence[Dict[str, Any]]):
+        """Find the provisions present in more than one language."""
+        languages: Dict[str, str] = {}
+        by_key: Dict[ProvisionKey, Set[str]] = defaultdict(set)
+        for chunk in corpus:
+            language = text_language(chunk['text'][:300])
+            languages[chunk['id']] = language
+            key = provision_key(chunk.get('metadata', {}))
+            if key is not None:
+                by_key[key].add(language)
+        self._languages = languages
+        self._parallel = {key for key, found in by_key.items() if len(found) > 1}
+
+    def __len__(self) -> int:
+        return len(self._parallel)
+
+    def depth(self, n_results: int) -> int:
+        """Candidates to retrieve so n_results survive the collapse."""
+        if not self._parallel:
+            return n_results
+        return math.ceil(n_results * self.overfetch)
+
+    def language(self, chunk: Dict[str, Any]) -> str:
+        language = self._languages.get(chunk['id'])
+        return language if language is not None else text_language(chunk['text'][:300])
+
+    def collapse(self, results: List[Dict[str, Any]], preferred_language: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Keep one language per aligned provision, in the position of its best-ranked variant.
+
+        The preferred language wins when present; otherwise the language of the
+        best-ranked variant does. Same-language chunks of one provision (e.g.
+        its sub-chunks) are all kept.
+        """
+        if not self._parallel or len(results) < 2:
+            return results
+
+        groups: Dict[ProvisionKey, List[int]] = defaultdict(list)
+        for i, result in enumerate(results):
+            key = provision_key(result.get('metadata', {}))
+            if key in self._parallel:
+                groups[key].append(i)
+
+        dropped: Set[int] = set()
+        moved: Dict[int, Dict[str, Any]] = {}  # position of a group's first variant -> kept chunk
+        for positions in groups.values():
+            languages = [self.language(results[i]) for i in positions]
+            if len(set(languages)) < 2:
+                continue
+            keep = preferred_language if preferred_language in languages else languages[0]
+            kept = [i for i, language in zip(positions, languages) if language == keep]
+            others = [i for i, language in zip(positions, languages) if language != keep]
+            lead = results[kept[0]]
+            variants = [results[i] for i in others]
+            moved[positions[0]] = {
+                **lead,
+                'score': max(results[i].get('score') or 0.0 for i in positions),
+                'aligned_variants': [
+                    {'id': variant['id'], 'language': self.language(variant),
+                     'citation_reference': variant.get('metadata', {}).get('citation_reference')}
+                    for variant in variants
+                ]
+            }
+            dropped.update(others)
+            if kept[0] != positions[0]:
+                dropped.add(kept[0])
+            with self._lock:
+                self.stats['collapsed_groups'] += 1
+                self.stats['dropped_variants'] += len(others)
+
+        if not moved:
+            return results
+        collapsed = []
+        for i, result in enumerate(results):
+            if i in moved:
+                collapsed.append(moved[i])
+            elif i not in dropped:
+                collapsed.append(result)
+        return collapsed
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, 'parallel_provisions': len(self._parallel), 'overfetch': self.overfetch}
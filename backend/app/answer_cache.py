@@ -0,0 +1,200 @@
+"""
+Answer cache for the legal RAG pipeline.
+
+Sits in front of LegalRAGWithGroq.answer_question with two tiers:
+- exact: normalized question text (e.g. casing, spacing, trailing "?" / "।" ignored)
+- semantic: cosine similarity of the query embedding above a threshold, only
+  between questions that mention the same numbers. e5 scores "धारा ७६ के भन्छ"
+  and "धारा ७७ के भन्छ" as near duplicates, but they ask about different
+  provisions.
+
+Entries expire after a TTL and the least recently used entry is evicted when
+the cache is full. Entries are keyed on a namespace (the prompt version and
+retrieval scope that produced them), so editing a prompt template stops
+serving older answers and a question scoped to one act never gets the answer
+to the unscoped one. Call invalidate() whenever the Chroma collection is rebuilt.
+"""
+
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .sparse_index import normalize_numerals
+
+_PUNCTUATION_RE = re.compile(r'[?!।॥.,;:"\'`]+')
+_WHITESPACE_RE = re.compile(r'\s+')
+_NUMBER_RE = re.compile(r'[0-9०-९]+')
+
+
+def normalize_query(text: str) -> str:
+    """Normalize a question for exact-match lookups."""
+    text = unicodedata.normalize('NFC', text).casefold()
+    text = _PUNCTUATION_RE.sub(' ', text)
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+def query_numbers(text: str) -> Tuple[str, ...]:
+    """Section numbers, years and amounts in a question; semantic matches must agree on them.
+
+    >>> query_numbers("धारा ७६ के भन्छ?") == query_numbers("What does article 76 say")
+    True
+    >>> query_numbers("धारा ७६ के भन्छ?") == query_numbers("धारा ७७ के भन्छ?")
+    False
+    """
+    return tuple(sorted({number.lstrip('0') or '0' for number in _NUMBER_RE.findall(normalize_numerals(text))}))
+
+
+class AnswerCache:
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 3600,
+                 similarity_threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+
+        # key -> {'result', 'embedding', 'numbers', 'top_k', 'namespace', 'created_at'}; order = recency
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Embedding matrix for the semantic tier, rebuilt lazily after changes
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[str] = []
+
+        self.generation = 0
+        self.stats = {
+            'exact_hits': 0,
+            'exact_misses': 0,
+            'semantic_hits': 0,
+            'semantic_misses': 0,
+            'evictions': 0,
+            'invalidations': 0
+        }
+
+    @staticmethod
+    def _key(query: str, top_k: int, namespace: str = "") -> str:
+        return f"{namespace}:{top_k}:{normalize_query(query)}"
+
+    def _expired(self, entry: Dict[str, Any]) -> bool:
+        return time.monotonic() - entry['created_at'] > self.ttl_seconds
+
+    def _drop(self, key: str):
+        self._entries.pop(key, None)
+        self._matrix = None
+
+    def _hit(self, key: str, tier: str) -> Dict[str, Any]:
+        self._entries.move_to_end(key)
+        self.stats[f'{tier}_hits'] += 1
+        return {**self._entries[key]['result'], 'cached': tier}
+
+    def get_exact(self, query: str, top_k: int, namespace: str = "") -> Optional[Dict[str, Any]]:
+        """Look up a previous answer for the same normalized question.
+
+        Every question goes through here first, so its misses are the
+        denominator of the hit rate even when the semantic tier is never asked.
+        """
+        key = self._key(query, top_k, namespace)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.stats['exact_misses'] += 1
+                return None
+            return self._hit(key, 'exact')
+
+    def get_semantic(self, query: str, embedding, top_k: int, namespace: str = "") -> Optional[Dict[str, Any]]:
+        """Look up a previous answer whose question embedding is close enough.
+
+        Only questions citing the same numbers match. Call it after get_exact missed.
+        """
+        query_vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query_vec)
+        if norm == 0:
+            return None
+        query_vec = query_vec / norm
+        numbers = query_numbers(query)
+
+        with self._lock:
+            if self._matrix is None:
+                self._rebuild_matrix()
+            if not self._matrix_keys:
+                self.stats['semantic_misses'] += 1
+                return None
+
+            similarities = self._matrix @ query_vec
+            for idx in np.argsort(-similarities):
+                if similarities[idx] < self.similarity_threshold:
+                    break
+                key = self._matrix_keys[idx]
+                entry = self._entries.get(key)
+                if (entry is None or entry['top_k'] != top_k or entry['namespace'] != namespace
+                        or entry['numbers'] != numbers):
+                    continue
+                if self._expired(entry):
+                    self._drop(key)
+                    break
+                return self._hit(key, 'semantic')
+
+            self.stats['semantic_misses'] += 1
+            return None
+
+    def _rebuild_matrix(self):
+        keys, vectors = [], []
+        for key, entry in self._entries.items():
+            if entry['embedding'] is not None:
+                keys.append(key)
+                vectors.append(entry['embedding'])
+        self._matrix_keys = keys
+        self._matrix = np.vstack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+
+    def put(self, query: str, top_k: int, result: Dict[str, Any], embedding=None, namespace: str = ""):
+        """Store an answer, evicting the least recently used entry if full."""
+        normalized_embedding = None
+        if embedding is not None:
+            vec = np.asarray(embedding, dtype=np.float32)
+            norm = np.linalg.norm(vec)
+            if norm > 0:
+                normalized_embedding = vec / norm
+
+        key = self._key(query, top_k, namespace)
+        with self._lock:
+            self._entries[key] = {
+                'result': result,
+                'embedding': normalized_embedding,
+                'numbers': query_numbers(query),
+                'top_k': top_k,
+                'namespace': namespace,
+                'created_at': time.monotonic()
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+            self._matrix = None
+
+    def invalidate(self):
+        """Drop every entry, e.g. after the Chroma collection is rebuilt."""
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self._matrix_keys = []
+            self.generation += 1
+            self.stats['invalidations'] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.stats['exact_hits'] + self.stats['semantic_hits']
+            # One exact lookup per question; semantic hits are a subset of the exact misses
+            lookups = self.stats['exact_hits'] + self.stats['exact_misses']
+            return {
+                **self.stats,
+                'misses': lookups - hits,
+                'entries': len(self._entries),
+                'generation': self.generation,
+                'hit_rate': hits / lookups if lookups else 0.0
+            }
@@ -1,19 +1,43 @@
 """
 Legal Chat API - RAG-powered legal Q&A endpoint
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from pathlib import Path
+import asyncio
+import json
+import logging
+import os
 
 # Import RAG service using relative import
 try:
-    from ...rag_service import LegalRAGWithGroq
+    from ...rag_service import LegalRAGWithGroq, StageTimeoutError
+    from ...llm_provider import LLMUnavailableError
+    from ...retrieval_scope import RetrievalScope, ScopeError
 except ImportError as e:
     print(f"Failed to import RAG service: {e}")
     LegalRAGWithGroq = None
+    StageTimeoutError = TimeoutError
+    LLMUnavailableError = ConnectionError
+    RetrievalScope = None
+    ScopeError = ValueError
+
+from ...auth import get_current_user
+from ...metrics import REGISTRY, span
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Scrape-time mirrors of the RAG components' own counters (see collect_rag_metrics)
+CACHE_HITS = REGISTRY.counter("rag_cache_hits_total", "Lookups served from a cache.", ("cache",))
+CACHE_MISSES = REGISTRY.counter("rag_cache_misses_total", "Lookups that missed a cache.", ("cache",))
+CACHE_HIT_RATIO = REGISTRY.gauge("rag_cache_hit_ratio", "Share of lookups served from a cache since startup.",
+                                 ("cache",))
+CORPUS_CHUNKS = REGISTRY.gauge("rag_corpus_chunks", "Chunks in the in-process corpus (BM25 and citation indexes).")
+COLLECTION_DOCUMENTS = REGISTRY.gauge("rag_collection_documents", "Documents in the Chroma collection.")
+RAG_READY = REGISTRY.gauge("rag_ready", "1 once the RAG system is loaded and warmed up.")
 
 # Models
 class ChatMessage(BaseModel):
@@ -23,7 +47,16 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     history: Optional[List[ChatMessage]] = []
-    top_k: int = 3  # Reduced from 6 to 3 to stay under token limits
+    session_id: Optional[str] = None  # Keeps follow-up context server-side; otherwise history is used
+    top_k: int = 3  # Chunks sent to the LLM; reranking picks them from a wider candidate set
+    latency_budget_ms: Optional[float] = None  # Rerank budget; None uses RAG_RERANK_BUDGET_MS
+    answer_language: Optional[str] = None  # 'ne' or 'en'; None uses RAG_PROMPT_LANGUAGE
+    prompt_variant: Optional[str] = None  # Prompt A/B variant; None picks one per session
+    # Retrieval scope; without acts, acts named in the message are used
+    acts: Optional[List[str]] = None  # Act names or aliases, e.g. ["property tax", "नागरिक संहिता"]
+    section_types: Optional[List[str]] = None  # धारा / दफा / नियम (or article / section / rule)
+    source_language: Optional[str] = None  # Only 'ne' or only 'en' source texts
+    exclude_sources: Optional[List[str]] = None  # Source files to skip, e.g. ["constitution_english.txt"]
 
 class SourceReference(BaseModel):
     document: str
@@ -35,39 +68,148 @@ class ChatResponse(BaseModel):
     answer: str
     sources: List[SourceReference]
     query: str
+    context_tokens: Optional[int] = None  # Tokens of legal context packed into the prompt
+    prompt_version: Optional[str] = None  # Prompt templates used, e.g. "ne/default@1a2b3c4d"
+    scope: Optional[Dict[str, Any]] = None  # Acts / section types searched, and whether they were inferred
 
 # Global RAG system instance (singleton pattern)
 rag_system = None
+_warmup_task: Optional[asyncio.Task] = None  # The only place the RAG system is built
+_warmup_error: Optional[str] = None  # Last warm-up failure while a retry is pending
 
-def get_rag_system():
-    """Initialize RAG system once and reuse"""
-    global rag_system
+# Seconds before retrying a failed warm-up, doubling up to the maximum
+WARMUP_RETRY_SECONDS = float(os.getenv("RAG_WARMUP_RETRY_SECONDS", "30"))
+WARMUP_RETRY_MAX_SECONDS = float(os.getenv("RAG_WARMUP_RETRY_MAX_SECONDS", "300"))
+
+def _ml_dir() -> Path:
+    # Get the project root dynamically
+    current_file = Path(__file__).resolve()
+    project_root = current_file.parent.parent.parent.parent.parent  # backend/app/api/v1 -> backend -> project root
+    return project_root / "ml"
+
+def _warmup_in_progress() -> bool:
+    return _warmup_task is not None and not _warmup_task.done()
+
+async def _warm_up_rag_system():
+    """Build the RAG system off the event loop, retrying with backoff until it loads"""
+    global rag_system, _warmup_error
     
-    if rag_system is None:
-        if LegalRAGWithGroq is None:
-            raise HTTPException(
-                status_code=500,
-                detail="RAG service not available. Check if dependencies are installed."
-            )
-        
+    retry_seconds = WARMUP_RETRY_SECONDS
+    while rag_system is None:
         try:
-            # Get the project root dynamically
-            current_file = Path(__file__).resolve()
-            project_root = current_file.parent.parent.parent.parent.parent  # backend/app/api/v1 -> backend -> project root
-            ml_dir = project_root / "ml"
-            
-            print(f"🔍 Initializing RAG system with ML directory: {ml_dir}")
-            rag_system = LegalRAGWithGroq(base_dir=str(ml_dir))
-            print("✅ RAG system initialized successfully")
+            logger.info("Warming up RAG system", extra={'ml_dir': str(_ml_dir())})
+            rag = await asyncio.to_thread(LegalRAGWithGroq, base_dir=str(_ml_dir()), load=False)
+            await rag.aload()
+            rag_system = rag
+            _warmup_error = None
+            logger.info("RAG system warmed up and ready")
         except Exception as e:
-            import traceback
-            traceback.print_exc()
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to initialize RAG system: {str(e)}"
-            )
+            _warmup_error = str(e)
+            logger.exception("RAG system warm-up failed, retrying", extra={'retry_seconds': retry_seconds})
+            await asyncio.sleep(retry_seconds)
+            retry_seconds = min(retry_seconds * 2, WARMUP_RETRY_MAX_SECONDS)
+
+def _ensure_warmup():
+    """Start the warm-up task unless it is running or done (needs the event loop)"""
+    global _warmup_task
+    
+    if rag_system is None and not _warmup_in_progress():
+        _warmup_task = asyncio.get_running_loop().create_task(_warm_up_rag_system())
+
+def start_rag_warmup():
+    """Start eager RAG warm-up in the background (called at app startup).
+    
+    The server keeps answering liveness checks while the model loads;
+    /health reports 503 until warm-up finishes. Set RAG_EAGER_WARMUP=false
+    to start the same warm-up on the first request instead.
+    """
+    if LegalRAGWithGroq is None or os.getenv("RAG_EAGER_WARMUP", "true").lower() != "true":
+        return
+    _ensure_warmup()
+
+async def stop_rag_system():
+    """Close pooled LLM connections on shutdown (called at app shutdown)."""
+    if _warmup_in_progress():
+        _warmup_task.cancel()
+    if rag_system is not None:
+        await rag_system.aclose()
+
+def _not_ready_error() -> HTTPException:
+    detail = "RAG system is warming up. Please retry shortly."
+    if _warmup_error:
+        detail = f"RAG system warm-up failed ({_warmup_error}); retrying in the background."
+    return HTTPException(status_code=503, detail=detail, headers={"Retry-After": "5"})
+
+def get_rag_system():
+    """Return the RAG system, or 503 while the background warm-up builds it.
     
-    return rag_system
+    Never builds it on the caller's thread: handlers run on the event loop.
+    """
+    if rag_system is not None:
+        return rag_system
+    
+    if LegalRAGWithGroq is None:
+        raise HTTPException(
+            status_code=500,
+            detail="RAG service not available. Check if dependencies are installed."
+        )
+    
+    _ensure_warmup()
+    raise _not_ready_error()
+
+def collect_rag_metrics():
+    """Refresh cache and corpus metrics from the RAG system before a /metrics scrape"""
+    rag = rag_system
+    RAG_READY.set(1 if rag is not None and rag.ready else 0)
+    if rag is None or not rag.ready:
+        return
+    
+    answer = rag.answer_cache.get_stats()
+    embedding = rag.embedding_service.get_stats()
+    caches = {
+        "answer": (answer['exact_hits'] + answer['semantic_hits'], answer['misses'], answer['hit_rate']),
+        "embedding": (embedding['hits'], embedding['misses'], embedding['hit_rate'])
+    }
+    if rag.reranker is not None:
+        rerank = rag.reranker.get_stats()
+        lookups = rerank['pairs_cached'] + rerank['pairs_scored']
+        caches["rerank"] = (rerank['pairs_cached'], rerank['pairs_scored'],
+                            rerank['pairs_cached'] / lookups if lookups else 0.0)
+    for cache, (hits, misses, ratio) in caches.items():
+        CACHE_HITS.set_total(hits, cache=cache)
+        CACHE_MISSES.set_total(misses, cache=cache)
+        CACHE_HIT_RATIO.set(ratio, cache=cache)
+    
+    CORPUS_CHUNKS.set(len(rag.corpus))
+    COLLECTION_DOCUMENTS.set(rag.collection.count())
+
+REGISTRY.add_collector(collect_rag_metrics)
+
+def format_sources(retrieved_docs: List[Dict[str, Any]]) -> List[SourceReference]:
+    """Convert retrieved chunks into API source references"""
+    sources = []
+    for doc in retrieved_docs:
+        metadata = doc.get('metadata', {})
+        sources.append(SourceReference(
+            document=metadata.get('citation_reference', 'Unknown'),
+            section=f"{metadata.get('section_type_ne', '')} {metadata.get('section_number', '')}".strip() or 'N/A',
+            content=doc.get('text', '')[:500],  # Truncate to 500 chars
+            similarity=doc.get('similarity', 0.0)
+        ))
+    return sources
+
+def request_scope(request: ChatRequest):
+    """Retrieval scope asked for by the request (resolved against the corpus by the RAG system)"""
+    return RetrievalScope(
+        acts=tuple(request.acts or ()),
+        section_types=tuple(request.section_types or ()),
+        source_language=request.source_language,
+        exclude_sources=tuple(request.exclude_sources or ())
+    )
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Encode one Server-Sent Event frame"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
 @router.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
@@ -76,65 +218,188 @@ async def chat(request: ChatRequest):
     
     - **message**: User's legal question
     - **history**: Previous chat messages for context
-    - **top_k**: Number of relevant documents to retrieve (default: 6)
+    - **top_k**: Number of relevant documents to retrieve (default: 3)
+    - **latency_budget_ms**: Time allowed for reranking; sets how many candidates are scored
+    - **session_id**: Chat session; follow-up questions are resolved against its earlier turns
+    - **answer_language** / **prompt_variant**: Prompt language ('ne', 'en') and A/B variant
+    - **acts** / **section_types** / **source_language** / **exclude_sources**: Restrict retrieval
     """
-    print(f"🔵 Chat endpoint called with message: {request.message[:50]}...")
-    print(f"🔵 History length: {len(request.history)}")
-    print(f"🔵 Top-k: {request.top_k}")
+    logger.debug("Chat request", extra={'message_chars': len(request.message),
+                                        'history_length': len(request.history or []),
+                                        'top_k': request.top_k})
     
     try:
         # Get RAG system
         rag = get_rag_system()
         
         # Generate answer using Groq (this returns a dict with answer, sources, etc.)
-        result = rag.answer_question(request.message, top_k=request.top_k)
-        
-        # Debug: Print the result to see what we got
-        print(f"\n🔍 DEBUG - Result type: {type(result)}")
-        print(f"🔍 DEBUG - Result keys: {result.keys() if isinstance(result, dict) else 'NOT A DICT'}")
+        # Embedding/search run on the RAG executor and the LLM call is async,
+        # so this request never blocks the event loop.
+        result = await rag.aanswer_question(
+            request.message,
+            top_k=request.top_k,
+            latency_budget_ms=request.latency_budget_ms,
+            session_id=request.session_id,
+            history=[message.model_dump() for message in request.history or []],
+            answer_language=request.answer_language,
+            prompt_variant=request.prompt_variant,
+            scope=request_scope(request)
+        )
         
         # Extract answer and sources from result
         answer_text = result.get('answer', 'माफ गर्नुहोस्, त्रुटि भयो।')
-        print(f"🔍 DEBUG - Answer type: {type(answer_text)}")
-        print(f"🔍 DEBUG - Answer preview: {str(answer_text)[:100]}")
+        logger.debug("Chat answer", extra={'answer_chars': len(str(answer_text)),
+                                           'sources': len(result.get('sources', [])),
+                                           'intent': result.get('intent'),
+                                           'cached': result.get('cached'),
+                                           'prompt_version': result.get('prompt_version')})
         
         retrieved_docs = result.get('sources', [])
         
-        # Format sources
-        sources = []
-        for doc in retrieved_docs:
-            metadata = doc.get('metadata', {})
-            sources.append(SourceReference(
-                document=metadata.get('citation_reference', 'Unknown'),
-                section=f"{metadata.get('section_type_ne', '')} {metadata.get('section_number', '')}".strip() or 'N/A',
-                content=doc.get('text', '')[:500],  # Truncate to 500 chars
-                similarity=doc.get('similarity', 0.0)
-            ))
-        
         # Ensure answer_text is a string, not a dict
         if isinstance(answer_text, dict):
             # If it's still a dict, extract the answer field
             answer_text = answer_text.get('answer', 'माफ गर्नुहोस्, त्रुटि भयो।')
         
-        return ChatResponse(
-            answer=str(answer_text),  # Ensure it's a string
-            sources=sources,
-            query=request.message
-        )
+        # Serialize here rather than letting FastAPI validate the model a second
+        # time, so the cost shows up as its own stage in /metrics
+        with span('serialization'):
+            response = ChatResponse(
+                answer=str(answer_text),  # Ensure it's a string
+                sources=format_sources(retrieved_docs),
+                query=request.message,
+                context_tokens=result.get('context_tokens'),
+                prompt_version=result.get('prompt_version'),
+                scope=result.get('scope')
+            )
+            body = response.model_dump_json()
+        return Response(content=body, media_type="application/json")
         
     except HTTPException:
         raise
+    except ScopeError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid retrieval scope: {str(e)}"
+        )
+    except StageTimeoutError as e:
+        raise HTTPException(
+            status_code=504,
+            detail=f"Chat request timed out: {str(e)}"
+        )
+    except LLMUnavailableError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Language model unavailable: {str(e)}"
+        )
+    except Exception as e:
+        logger.exception("Chat request failed")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing chat request: {str(e)}"
+        )
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
+    """
+    Streaming legal Q&A endpoint (Server-Sent Events)
+    
+    Emits a `sources` event as soon as retrieval finishes, then one `token`
+    event per answer delta and a final `done` event. An `error` event is sent
+    if generation fails mid-stream. Generation stops when the client disconnects.
+    """
+    rag = get_rag_system()
+    
+    try:
+        prepared = await rag.aprepare_answer(
+            request.message,
+            top_k=request.top_k,
+            latency_budget_ms=request.latency_budget_ms,
+            session_id=request.session_id,
+            history=[message.model_dump() for message in request.history or []],
+            answer_language=request.answer_language,
+            prompt_variant=request.prompt_variant,
+            scope=request_scope(request)
+        )
+    except ScopeError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid retrieval scope: {str(e)}"
+        )
+    except StageTimeoutError as e:
+        raise HTTPException(
+            status_code=504,
+            detail=f"Chat request timed out: {str(e)}"
+        )
     except Exception as e:
+        logger.exception("Chat request failed")
         raise HTTPException(
             status_code=500,
             detail=f"Error processing chat request: {str(e)}"
         )
+    
+    async def event_stream():
+        with span('serialization'):
+            sources = format_sources(prepared.get('sources', []))
+            sources_event = sse_event('sources', {
+                'query': request.message,
+                'sources': [source.model_dump() for source in sources],
+                'context_tokens': prepared.get('context_tokens'),
+                'prompt_version': prepared.get('prompt_version'),
+                'scope': prepared.get('scope')
+            })
+        yield sources_event
+        
+        # Canned replies (greeting, off-topic, no results) need no LLM call
+        if 'answer' in prepared:
+            yield sse_event('token', {'content': prepared['answer']})
+            yield sse_event('done', {'finish_reason': 'stop'})
+            return
+        
+        tokens = rag.astream_groq(prepared['system_prompt'], prepared['user_prompt'], prepared.get('model'))
+        parts = []
+        try:
+            async for token in tokens:
+                if await http_request.is_disconnected():
+                    logger.info("Client disconnected, stopping generation")
+                    return
+                parts.append(token)
+                yield sse_event('token', {'content': token})
+            # Only complete answers are cached
+            rag.cache_answer(prepared, "".join(parts))
+            yield sse_event('done', {'finish_reason': 'stop'})
+        except Exception as e:
+            yield sse_event('error', {'detail': f"Error with Groq API: {str(e)}"})
+        finally:
+            # Closes the upstream Groq stream so a disconnected client stops billing tokens
+            await tokens.aclose()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Disable proxy buffering so tokens flush immediately
+        }
+    )
+
+@router.get("/live")
+async def liveness_check():
+    """Liveness: the process is up and serving requests (model may still be loading)"""
+    return {"status": "alive"}
 
 @router.get("/health")
 async def health_check():
-    """Check if RAG system is initialized and healthy"""
+    """Readiness: 503 until the RAG system is loaded and warmed up (never starts loading it)"""
+    rag = rag_system
+    if rag is None or not rag.ready:
+        if LegalRAGWithGroq is None:
+            raise HTTPException(status_code=503, detail="RAG service not available")
+        if not _warmup_in_progress():
+            raise HTTPException(status_code=503, detail="RAG system not loaded; it loads on the first chat request")
+        raise _not_ready_error()
+    
     try:
-        rag = get_rag_system()
         return {
             "status": "healthy",
             "message": "RAG system is operational",
@@ -158,10 +423,51 @@ async def get_stats():
         
         return {
             "total_documents": count,
-            "sample_metadata": sample['metadatas'][0] if sample['metadatas'] else {}
+            "sample_metadata": sample['metadatas'][0] if sample['metadatas'] else {},
+            "answer_cache": rag.answer_cache.get_stats(),
+            "embedding_cache": rag.embedding_service.get_stats(),
+            "reranker": rag.reranker.get_stats() if rag.reranker else None,
+            "conversations": rag.conversations.get_stats(),
+            "llm": rag.llm.get_stats(),
+            "model_routing": rag.router.get_stats() if rag.router else None,
+            "hierarchy": rag.hierarchy.get_stats(),
+            "retrieval_scope": rag.scope_resolver.get_stats(),
+            "bilingual_alignment": rag.alignment.get_stats(),
+            "prompts": rag.prompts.describe()
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error fetching stats: {str(e)}"
         )
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """Get answer and query-embedding cache hit/miss counters"""
+    rag = get_rag_system()
+    return {
+        "answer_cache": rag.answer_cache.get_stats(),
+        "embedding_cache": rag.embedding_service.get_stats()
+    }
+
+@router.post("/cache/invalidate")
+async def invalidate_cache(current=Depends(get_current_user)):
+    """Drop all cached answers. Call this after the Chroma collection is rebuilt (login required)."""
+    rag = get_rag_system()
+    rag.invalidate_caches()
+    logger.info("Answer cache invalidated", extra={'user_id': current['id']})
+    return {"message": "Answer cache invalidated", "generation": rag.answer_cache.generation}
+
+@router.get("/routing/decisions")
+async def get_routing_decisions(limit: int = 50):
+    """Most recent model routing decisions (newest first) with their signals"""
+    rag = get_rag_system()
+    if rag.router is None:
+        return {"enabled": False, "decisions": []}
+    return {
+        "enabled": True,
+        "stats": rag.router.get_stats(),
+        "decisions": rag.router.recent(max(1, min(limit, 500)))
+    }
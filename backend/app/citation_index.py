@@ -0,0 +1,253 @@
+"""
+Direct section-citation lookup for the legal corpus.
+
+Questions such as "संविधान धारा ७६" or "Civil code section 17" name the exact
+provision. The index maps (act, section_type, section_number) to chunks so
+those questions are answered with an O(1) dict lookup instead of embedding the
+query and running ANN search.
+"""
+
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from .sparse_index import normalize_numerals
+
+# Alias group -> phrases users write for that act (casefolded, Nepali + English).
+# An act in the corpus belongs to a group when one of the phrases appears in its
+# act_name_ne, so the Nepali and English constitution share the 'constitution' group.
+ACT_ALIASES: Dict[str, Tuple[str, ...]] = {
+    'constitution': ('नेपालको संविधान', 'संविधान', 'constitution'),
+    'civil_code': ('मुलुकी देवानी संहिता', 'देवानी संहिता', 'नागरिक संहिता', 'civil code'),
+    'financial_act': ('आर्थिक ऐन', 'financial act', 'finance act'),
+    'land_use_act': ('भूमि उपयोग ऐन', 'भूमि उपयोग', 'land use act', 'land use'),
+    'property_tax_act': ('सम्पत्ति कर ऐन', 'सम्पत्ति कर', 'property tax'),
+}
+
+# English words for the Nepali section markers used in chunk metadata
+SECTION_TYPE_ALIASES = {
+    'धारा': 'धारा', 'article': 'धारा', 'art': 'धारा',
+    'दफा': 'दफा', 'section': 'दफा', 'sec': 'दफा',
+    'नियम': 'नियम', 'rule': 'नियम',
+}
+
+# The marker must start a word ("Part 3", "subsection 3" and "depart 3" are not
+# citations). The number must end one, except for attached Nepali postpositions
+# ("धारा ७६को"), so "article 3rd" does not match either.
+_CITATION_RE = re.compile(
+    r'(?<![\w\u0900-\u097f])(धारा|दफा|नियम|articles?|art\.?|sections?|sec\.?|rules?)'
+    r'\s*(?:no\.?\s*)?([0-9०-९]+)(?![^\W\u0900-\u097f])',
+    re.IGNORECASE
+)
+
+# Further numbers after a citation: lists ("धारा ७६ र ७७", "articles 76, 77 and 78")
+# and ranges ("धारा ७६ देखि ८० सम्म", "sections 12-14"). An attached postposition
+# on the previous number ("७६को र ७७") is skipped.
+_CONTINUATION_RE = re.compile(
+    r'[\u0900-\u0965\u0970-\u097f]*?'
+    r'(\s*,\s*(?:and\s+|र\s+)?|\s+(?:र|and|&|तथा)\s+|\s*[-–]\s*|\s*(?:देखि|to|through)\s+)'
+    r'([0-9०-९]+)(?![^\W\u0900-\u097f])',
+    re.IGNORECASE
+)
+_RANGE_SEPARATORS = ('-', '–', 'देखि', 'to', 'through')
+
+# Longer ranges are left unexpanded (the lookup is then not exact)
+MAX_RANGE_SECTIONS = 40
+
+# Section-like numbers; four digits and more are years or amounts
+_SECTION_NUMBER_RE = re.compile(r'(?<![0-9०-९])[0-9०-९]{1,3}(?![0-9०-९])')
+
+
+@dataclass(frozen=True)
+class Citation:
+    section_type: str        # धारा / दफा / नियम
+    section_number: str      # ASCII digits, as in chunk metadata
+    groups: Tuple[str, ...]  # Act alias groups named in the question (may be empty)
+
+
+def _section_number(text: str) -> str:
+    return normalize_numerals(text).lstrip('0') or '0'
+
+
+def _scan(text: str) -> Tuple[List[Tuple[str, str]], List[Tuple[int, int]]]:
+    """Citations in text and the spans of text they were parsed from."""
+    citations: List[Tuple[str, str]] = []
+    spans = []
+    position = 0
+    while True:
+        match = _CITATION_RE.search(text, position)
+        if match is None:
+            break
+        marker = match.group(1).casefold().rstrip('.')
+        section_type = SECTION_TYPE_ALIASES.get(marker) or SECTION_TYPE_ALIASES[marker[:-1]]
+        numbers = [_section_number(match.group(2))]
+        end = match.end()
+        while True:
+            more = _CONTINUATION_RE.match(text, end)
+            if more is None:
+                break
+            number = _section_number(more.group(2))
+            if more.group(1).strip().casefold() in _RANGE_SEPARATORS:
+                first = int(numbers[-1])
+                if not first < int(number) <= first + MAX_RANGE_SECTIONS:
+                    break
+                numbers.extend(str(n) for n in range(first + 1, int(number) + 1))
+            else:
+                numbers.append(number)
+            end = more.end()
+        for number in numbers:
+            if (section_type, number) not in citations:
+                citations.append((section_type, number))
+        spans.append((match.start(), end))
+        position = end
+    return citations, spans
+
+
+def find_citations(text: str) -> List[Tuple[str, str]]:
+    """(section type, ASCII section number) for every provision marker in text.
+
+    Lists and ranges after a marker give one citation per section.
+
+    >>> find_citations("संविधानको धारा ७६को व्यवस्था, article 3 and Sec. 12")
+    [('धारा', '76'), ('धारा', '3'), ('दफा', '12')]
+    >>> find_citations("What does Part 3 say? constitution subsection 3, depart 3, article 3rd")
+    []
+    >>> find_citations("संविधानको धारा ७६ र ७७ के भन्छ?")
+    [('धारा', '76'), ('धारा', '77')]
+    >>> find_citations("article 76 and 77 of the constitution")
+    [('धारा', '76'), ('धारा', '77')]
+    >>> find_citations("धारा ७६ देखि ८० सम्म")
+    [('धारा', '76'), ('धारा', '77'), ('धारा', '78'), ('धारा', '79'), ('धारा', '80')]
+    >>> find_citations("sections 12-14, 17 and 20")
+    [('दफा', '12'), ('दफा', '13'), ('दफा', '14'), ('दफा', '17'), ('दफा', '20')]
+    """
+    return _scan(text)[0]
+
+
+def has_uncited_numbers(text: str) -> bool:
+    """Whether text has section-like numbers that are not part of a parsed citation.
+
+    Such questions may be about more provisions than were parsed, so a direct
+    lookup of the parsed ones alone is not an exact answer.
+
+    >>> has_uncited_numbers("धारा ७६ देखि ८० सम्म, संविधान २०७२")
+    False
+    >>> has_uncited_numbers("article 76 and also 77")
+    True
+    >>> has_uncited_numbers("धारा १ देखि ९९ सम्म")
+    True
+    """
+    spans = _scan(text)[1]
+    for number in _SECTION_NUMBER_RE.finditer(text):
+        if not any(start <= number.start() < end for start, end in spans):
+            return True
+    return False
+
+
+def act_group(act_name: str) -> str:
+    """Alias group an act belongs to; unknown acts form their own group."""
+    name = act_name.casefold()
+    for group, aliases in ACT_ALIASES.items():
+        if any(alias in name for alias in aliases):
+            return group
+    return act_name
+
+
+def find_act_groups(text: str, extra_acts: Sequence[str] = ()) -> List[str]:
+    """Act groups mentioned in free text.
+
+    extra_acts are corpus act names without an alias entry; they match on their
+    name minus the trailing year (e.g. "X ऐन, २०७६" matches "x ऐन").
+    """
+    text = text.casefold()
+    groups = [group for group, aliases in ACT_ALIASES.items()
+              if any(alias in text for alias in aliases)]
+    for act_name in extra_acts:
+        short_name = act_name.split(',')[0].strip().casefold()
+        if short_name and short_name in text and act_name not in groups:
+            groups.append(act_name)
+    return groups
+
+
+class CitationIndex:
+    def __init__(self):
+        self._by_key: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = defaultdict(list)
+        self._groups_by_section: Dict[Tuple[str, str], Set[str]] = defaultdict(set)
+        self._unaliased_acts: List[str] = []
+
+    def build(self, chunks: Sequence[Dict[str, Any]]):
+        """Index chunks given as {'id', 'text', 'metadata'} dicts."""
+        self._by_key.clear()
+        self._groups_by_section.clear()
+        unaliased = set()
+
+        for chunk in chunks:
+            metadata = chunk.get('metadata', {})
+            act_name = metadata.get('act_name_ne')
+            section_type = metadata.get('section_type_ne')
+            section_number = normalize_numerals(str(metadata.get('section_number', ''))).lstrip('0') or '0'
+            if not (act_name and section_type and section_number):
+                continue
+            group = act_group(act_name)
+            if group == act_name:
+                unaliased.add(act_name)
+            self._by_key[(group, section_type, section_number)].append(chunk)
+            self._groups_by_section[(section_type, section_number)].add(group)
+
+        self._unaliased_acts = sorted(unaliased)
+
+    def __len__(self) -> int:
+        return len(self._by_key)
+
+    def parse(self, query: str) -> List[Citation]:
+        """Extract the provisions a question names."""
+        groups = tuple(find_act_groups(query, self._unaliased_acts))
+        return [Citation(section_type=section_type, section_number=number, groups=groups)
+                for section_type, number in find_citations(query)]
+
+    def _resolve(self, citation: Citation) -> List[Dict[str, Any]]:
+        groups = citation.groups
+        if not groups:
+            # No act named: only unambiguous if one act group has this provision
+            groups = tuple(self._groups_by_section.get((citation.section_type, citation.section_number), ()))
+            if len(groups) != 1:
+                return []
+
+        chunks = []
+        for group in groups:
+            chunks.extend(self._by_key.get((group, citation.section_type, citation.section_number), []))
+        if not chunks:
+            # "Constitution section 76" -> धारा ७६: try the act's other markers
+            for section_type in ('धारा', 'दफा', 'नियम'):
+                for group in groups:
+                    chunks.extend(self._by_key.get((group, section_type, citation.section_number), []))
+                if chunks:
+                    break
+        return chunks
+
+    def lookup(self, query: str,
+               where: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """Return (chunks, exact) for the provisions cited in a question.
+
+        exact is True when every citation resolved and the question has no
+        other section-like numbers, so vector search can be skipped. where is
+        a metadata predicate applied to the resolved chunks.
+        """
+        citations = self.parse(query)
+        chunks: List[Dict[str, Any]] = []
+        seen: Set[str] = set()
+        exact = bool(citations) and not has_uncited_numbers(query)
+
+        for citation in citations:
+            resolved = self._resolve(citation)
+            if where is not None:
+                resolved = [chunk for chunk in resolved if where(chunk.get('metadata', {}))]
+            if not resolved:
+                exact = False
+            for chunk in resolved:
+                if chunk['id'] not in seen:
+                    seen.add(chunk['id'])
+                    chunks.append(chunk)
+
+        return chunks, exact and bool(chunks)
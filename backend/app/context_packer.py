@@ -0,0 +1,176 @@
+"""
+Token-budgeted context packing for the legal RAG prompt.
+
+Replaces the fixed 800-character cut per chunk:
+- counts real tokens with the target model's tokenizer (cached per text)
+- drops near-duplicate chunks
+- splits the token budget by relevance, so strong chunks get more room and
+  short chunks hand their unused share to the others
+- trims at sentence / sub-clause boundaries (।, ., (क), (१)) instead of mid-provision
+"""
+
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .sparse_index import tokenize
+
+DEFAULT_PROMPT_TOKENIZER = "NousResearch/Meta-Llama-3-8B-Instruct"  # Same tokenizer as Llama 3.x
+
+# Split after sentence enders / line breaks, and before (क) / (१) / (1) sub-clause markers
+_UNIT_SPLIT_RE = re.compile(r'(?<=[।.;:\n])\s+|\s+(?=\((?:[क-ह]|[०-९]+|[0-9]+)\))')
+
+
+class TokenCounter:
+    """Counts tokens with a Hugging Face tokenizer, falling back to an estimate."""
+
+    def __init__(self, tokenizer_name: Optional[str] = DEFAULT_PROMPT_TOKENIZER, cache_size: int = 8192):
+        self.tokenizer_name = None
+        self._tokenizer = None
+        if tokenizer_name:
+            try:
+                from tokenizers import Tokenizer
+                self._tokenizer = Tokenizer.from_pretrained(tokenizer_name)
+                self.tokenizer_name = tokenizer_name
+            except Exception as e:
+                print(f"Warning: Could not load tokenizer '{tokenizer_name}', estimating tokens. {e}")
+        self.count = lru_cache(maxsize=cache_size)(self._count)
+
+    def _count(self, text: str) -> int:
+        if self._tokenizer is not None:
+            return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+        # Llama 3 spends roughly one token per 2.5 Devanagari chars, 4 Latin chars
+        devanagari = sum(1 for ch in text if '\u0900' <= ch <= '\u097f')
+        return int(devanagari / 2.5 + (len(text) - devanagari) / 4) + 1
+
+    def prefix_chars(self, text: str, max_tokens: int) -> int:
+        """Length of the longest prefix of text that fits in max_tokens (not cached)."""
+        if self._tokenizer is not None:
+            offsets = self._tokenizer.encode(text, add_special_tokens=False).offsets
+            if len(offsets) <= max_tokens:
+                return len(text)
+            return offsets[max_tokens - 1][1] if max_tokens > 0 else 0
+        # The estimate grows with length, so binary-search the cut
+        low, high = 0, len(text)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self._count(text[:mid]) <= max_tokens:
+                low = mid
+            else:
+                high = mid - 1
+        return low
+
+
+def split_units(text: str) -> List[str]:
+    """Split a provision into sentences / sub-clauses, keeping their order."""
+    return [unit for unit in _UNIT_SPLIT_RE.split(text) if unit and unit.strip()]
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    terms = tokenize(text)
+    if len(terms) < size:
+        return {tuple(terms)}
+    return {tuple(terms[i:i + size]) for i in range(len(terms) - size + 1)}
+
+
+class ContextPacker:
+    def __init__(self, counter: TokenCounter, budget_tokens: int = 2000,
+                 min_chunk_tokens: int = 60, duplicate_threshold: float = 0.8):
+        self.counter = counter
+        self.budget_tokens = budget_tokens
+        self.min_chunk_tokens = min_chunk_tokens
+        self.duplicate_threshold = duplicate_threshold
+
+    def deduplicate(self, chunks: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Drop chunks whose word 3-grams mostly repeat a higher-ranked chunk."""
+        kept, kept_shingles = [], []
+        for chunk in chunks:
+            shingles = _shingles(chunk['text'])
+            duplicate = any(
+                len(shingles & other) / max(1, len(shingles | other)) >= self.duplicate_threshold
+                for other in kept_shingles
+            )
+            if not duplicate:
+                kept.append(chunk)
+                kept_shingles.append(shingles)
+        return kept
+
+    @staticmethod
+    def _weights(chunks: Sequence[Dict[str, Any]]) -> List[float]:
+        scores = [chunk.get('score') for chunk in chunks]
+        if any(score is None for score in scores) or max(scores) == min(scores):
+            # No usable scores: fall back to rank, 1, 1/2, 1/3, ...
+            return [1.0 / rank for rank in range(1, len(chunks) + 1)]
+        low, high = min(scores), max(scores)
+        # Keep a floor so the weakest chunk still gets some room
+        return [0.3 + 0.7 * (score - low) / (high - low) for score in scores]
+
+    def _allocate(self, needs: List[int], weights: List[float], budget: int) -> List[int]:
+        """Water-fill the budget: chunks needing less than their share release the rest."""
+        allocation = [0] * len(needs)
+        open_idx = list(range(len(needs)))
+        while open_idx and budget > 0:
+            total_weight = sum(weights[i] for i in open_idx)
+            shares = {i: budget * weights[i] / total_weight for i in open_idx}
+            satisfied = [i for i in open_idx if needs[i] <= shares[i]]
+            if not satisfied:
+                for i in open_idx:
+                    allocation[i] = int(shares[i])
+                break
+            for i in satisfied:
+                allocation[i] = needs[i]
+                budget -= needs[i]
+                open_idx.remove(i)
+        return allocation
+
+    def trim(self, text: str, max_tokens: int) -> Tuple[str, int, bool]:
+        """Cut text to max_tokens at the last whole sentence / sub-clause."""
+        tokens = self.counter.count(text)
+        if tokens <= max_tokens:
+            return text, tokens, False
+
+        kept, used = [], 0
+        for unit in split_units(text):
+            unit_tokens = self.counter.count(unit) + 1
+            if used + unit_tokens > max_tokens:
+                break
+            kept.append(unit)
+            used += unit_tokens
+
+        if not kept:
+            # First sentence alone is too long: cut at the token limit, then back to a word boundary
+            cut = self.counter.prefix_chars(text, max_tokens)
+            partial = text[:cut]
+            if cut < len(text) and not text[cut].isspace() and re.search(r'\s', partial):
+                partial = re.split(r'\s+(?=\S*$)', partial)[0]
+            kept = [' '.join(partial.split())]
+
+        trimmed = ' '.join(kept).rstrip() + " ..."
+        return trimmed, self.counter.count(trimmed), True
+
+    def pack(self, items: Sequence[Dict[str, Any]],
+             budget_tokens: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """Fit (header, chunk) items into the token budget.
+
+        Each item is {'header': str, 'chunk': retrieved chunk}. Returns the packed
+        items (with 'text', 'tokens', 'truncated' added) and the total token count.
+        """
+        budget = budget_tokens or self.budget_tokens
+        unique_chunks = self.deduplicate([item['chunk'] for item in items])
+        unique_ids = {chunk['id'] for chunk in unique_chunks}
+        items = [item for item in items if item['chunk']['id'] in unique_ids]
+
+        header_tokens = [self.counter.count(item['header']) + 2 for item in items]
+        body_budget = budget - sum(header_tokens)
+        needs = [self.counter.count(item['chunk']['text']) for item in items]
+        allocation = self._allocate(needs, self._weights([item['chunk'] for item in items]), body_budget)
+
+        packed, total = [], 0
+        for i, (item, limit) in enumerate(zip(items, allocation)):
+            # A sliver of a provision is noise; keep at least the top chunk
+            if limit < min(self.min_chunk_tokens, needs[i]) and packed:
+                continue
+            text, tokens, truncated = self.trim(item['chunk']['text'], max(limit, self.min_chunk_tokens))
+            packed.append({**item, 'text': text, 'tokens': tokens + header_tokens[i], 'truncated': truncated})
+            total += tokens + header_tokens[i]
+        return packed, total
@@ -0,0 +1,139 @@
+"""
+Conversation state for history-aware retrieval.
+
+Follow-ups such as "what about for foreigners?" only make sense next to the
+earlier question. Each chat session keeps a rolling summary of its older
+questions, the last few standalone questions verbatim and the chunks the last
+answer was built from, so a follow-up can be condensed into a standalone
+question and, when it stays on the same provisions, reuse that retrieval.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .citation_index import find_act_groups, find_citations
+
+# Openers and references that only make sense after an earlier question
+_FOLLOW_UP_RE = re.compile(
+    r'^(what about|how about|and|also|then|what if|in that case|same|for|but)\b'
+    r'|\b(it|that|this|they|them|those|these|such)\b'
+    r'|^(अनि|र|त्यसो|त्यसै|फेरि|तर)(\s|$)'
+    r'|(यसको|यसमा|यसले|त्यसको|त्यसमा|त्यसले|उक्त|सोही|माथिको)',
+    re.IGNORECASE
+)
+
+
+def is_follow_up(message: str, max_words: int = 12) -> bool:
+    """Heuristic: a short question with a back-reference and no provision of its own."""
+    text = message.strip()
+    if not text or len(text.split()) > max_words:
+        return False
+    if find_citations(text) or find_act_groups(text):
+        return False
+    return bool(_FOLLOW_UP_RE.search(text))
+
+
+@dataclass
+class ConversationState:
+    recent: Deque[str] = field(default_factory=deque)  # Last standalone questions, oldest first
+    summary: str = ""                                   # Older questions folded into one line
+    topic: Optional[str] = None                         # Last question that stood on its own
+    last_embedding: Optional[np.ndarray] = None
+    last_sources: List[Dict[str, Any]] = field(default_factory=list)
+    updated_at: float = field(default_factory=time.time)
+
+
+class ConversationStore:
+    def __init__(self, max_sessions: int = 1000, ttl_seconds: float = 3600,
+                 max_recent: int = 3, summary_token_budget: int = 150):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_recent = max_recent
+        self.summary_token_budget = summary_token_budget
+        self._sessions: "OrderedDict[str, ConversationState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'follow_ups': 0, 'retrieval_reused': 0, 'sessions_evicted': 0}
+
+    def get(self, session_id: Optional[str]) -> Optional[ConversationState]:
+        if not session_id:
+            return None
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                return None
+            if time.time() - state.updated_at > self.ttl_seconds:
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return state
+
+    def from_history(self, history: Sequence[Dict[str, str]],
+                     count_tokens: Callable[[str], int]) -> Optional[ConversationState]:
+        """Build a throwaway state from client-sent history (sessions without server state)."""
+        state = ConversationState()
+        for message in history:
+            question = message.get('content', '').strip()
+            if message.get('role') == 'user' and question:
+                self._push(state, question, count_tokens)
+                if state.topic is None or not is_follow_up(question):
+                    state.topic = question
+        return state if state.recent else None
+
+    def _push(self, state: ConversationState, question: str, count_tokens: Callable[[str], int]):
+        state.recent.append(question)
+        while len(state.recent) > self.max_recent:
+            oldest = state.recent.popleft()
+            state.summary = f"{state.summary}; {oldest}" if state.summary else oldest
+        # Keep the newest part of the summary within its token budget
+        while state.summary and count_tokens(state.summary) > self.summary_token_budget:
+            parts = state.summary.split('; ', 1)
+            state.summary = parts[1] if len(parts) > 1 else ""
+
+    def record(self, session_id: Optional[str], standalone: str, sources: List[Dict[str, Any]],
+               embedding: Optional[np.ndarray], count_tokens: Callable[[str], int],
+               follow_up: bool = False):
+        """Remember the resolved question and its sources for the next turn."""
+        if not session_id:
+            return
+        with self._lock:
+            state = self._sessions.pop(session_id, None) or ConversationState()
+            self._push(state, standalone, count_tokens)
+            if not follow_up or state.topic is None:
+                state.topic = standalone
+            state.last_sources = list(sources)
+            state.last_embedding = embedding
+            state.updated_at = time.time()
+            self._sessions[session_id] = state
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.stats['sessions_evicted'] += 1
+
+    def note(self, event: str):
+        with self._lock:
+            self.stats[event] += 1
+
+    def can_reuse(self, state: ConversationState, embedding: Optional[np.ndarray], threshold: float) -> bool:
+        """A follow-up close to the previous question stays on the same provisions."""
+        if not state.last_sources or state.last_embedding is None or embedding is None:
+            return False
+        return float(np.dot(state.last_embedding, embedding)) >= threshold
+
+    def prompt_history(self, state: ConversationState, count_tokens: Callable[[str], int],
+                       token_budget: int) -> str:
+        """Earlier questions for the prompt, newest kept first when over budget."""
+        lines = [f"- {question}" for question in state.recent]
+        if state.summary:
+            lines.insert(0, f"- {state.summary}")
+        while lines and count_tokens("\n".join(lines)) > token_budget:
+            lines.pop(0)
+        return "\n".join(lines)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, 'sessions': len(self._sessions)}
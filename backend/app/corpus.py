@@ -0,0 +1,66 @@
+"""
+In-process copy of the legal chunk corpus.
+
+Loaded once at startup and shared by the retrieval helpers that work without
+the vector index (sparse index, citation lookups). Reads the JSONL produced by
+ml/scripts/delimiter_chunker.py and falls back to the Chroma collection itself
+when the file is not deployed next to the embeddings.
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+
+def load_chunks_from_jsonl(chunks_file: Path) -> List[Dict[str, Any]]:
+    """Load chunks as {'id', 'text', 'metadata'} dicts."""
+    chunks = []
+    with open(chunks_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Warning: Skipping malformed line in {chunks_file}")
+                continue
+            chunks.append({
+                'id': data['id'],
+                'text': data['text_chunk'],
+                'metadata': data['metadata']
+            })
+    return chunks
+
+
+def load_chunks_from_collection(collection, page_size: int = 500) -> List[Dict[str, Any]]:
+    """Page through a Chroma collection and return its chunks."""
+    chunks = []
+    offset = 0
+    while True:
+        page = collection.get(
+            limit=page_size,
+            offset=offset,
+            include=['documents', 'metadatas']
+        )
+        if not page['ids']:
+            break
+        for chunk_id, text, metadata in zip(page['ids'], page['documents'], page['metadatas']):
+            chunks.append({'id': chunk_id, 'text': text, 'metadata': metadata or {}})
+        offset += len(page['ids'])
+    return chunks
+
+
+def load_corpus(chunks_file: Path, collection=None) -> List[Dict[str, Any]]:
+    """Load the corpus from the chunk JSONL, or from the collection if the file is missing."""
+    if chunks_file.exists():
+        chunks = load_chunks_from_jsonl(chunks_file)
+        source = str(chunks_file)
+    elif collection is not None:
+        chunks = load_chunks_from_collection(collection)
+        source = f"collection '{collection.name}'"
+    else:
+        raise FileNotFoundError(f"Chunks file not found: {chunks_file}")
+
+    print(f"✓ Loaded {len(chunks)} chunks for in-process retrieval from {source}")
+    return chunks
@@ -0,0 +1,108 @@
+"""
+Pluggable embedding backends for the legal corpus.
+
+- torch: SentenceTransformer on PyTorch (the original path)
+- onnx:  ONNX Runtime with an int8 dynamically-quantized export of the same
+         model, built by ml/scripts/export_onnx_embedder.py
+
+Both return mean-pooled, L2-normalized vectors (what the sentence-transformers
+config of multilingual-e5-large produces), so an ONNX query can search a
+collection embedded with PyTorch. Quantization moves vectors slightly; use
+ml/scripts/benchmark_embedding_backends.py to check recall@k, and if it drops
+re-index the collection with the same backend
+(EMBEDDING_BACKEND=onnx python ml/scripts/embedding_generator_v2.py).
+
+Select with the EMBEDDING_BACKEND (torch|onnx) and EMBEDDING_ONNX_DIR env vars.
+"""
+
+import os
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+DEFAULT_MODEL_NAME = "intfloat/multilingual-e5-large"
+
+
+class OnnxEmbeddingFunction:
+    """Chroma-compatible embedding function backed by ONNX Runtime."""
+
+    def __init__(self, model_dir: str, model_file: str = "model_quantized.onnx",
+                 max_length: int = 512, batch_size: int = 16,
+                 num_threads: Optional[int] = None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_dir = Path(model_dir)
+        self.batch_size = batch_size
+
+        model_path = self.model_dir / model_file
+        if not model_path.exists():
+            raise FileNotFoundError(
+                f"ONNX model not found: {model_path}. Run ml/scripts/export_onnx_embedder.py first."
+            )
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            str(model_path), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(str(self.model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        hidden = self.session.run(None, feeds)[0]  # (batch, seq_len, dim)
+
+        # Mean pooling over real tokens, then L2 normalization
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.clip(norms, 1e-12, None)
+
+    def __call__(self, input: List[str]) -> List[np.ndarray]:
+        # Sort by length so each batch pads to a similar size
+        order = sorted(range(len(input)), key=lambda i: len(input[i]))
+        vectors: List[Optional[np.ndarray]] = [None] * len(input)
+        for start in range(0, len(order), self.batch_size):
+            indices = order[start:start + self.batch_size]
+            batch_vectors = self._encode_batch([input[i] for i in indices])
+            for i, vector in zip(indices, batch_vectors):
+                vectors[i] = vector.astype(np.float32)
+        return vectors
+
+
+def create_embedding_function(backend: Optional[str] = None,
+                              model_name: str = DEFAULT_MODEL_NAME,
+                              onnx_dir: Optional[str] = None,
+                              device: str = "cpu"):
+    """Build the embedding function for the configured backend."""
+    backend = (backend or os.getenv("EMBEDDING_BACKEND", "torch")).lower()
+
+    if backend == "torch":
+        from chromadb.utils import embedding_functions
+        return embedding_functions.SentenceTransformerEmbeddingFunction(
+            model_name=model_name,
+            device=device
+        )
+
+    if backend == "onnx":
+        onnx_dir = onnx_dir or os.getenv("EMBEDDING_ONNX_DIR")
+        if not onnx_dir:
+            raise ValueError("EMBEDDING_ONNX_DIR must point to the exported ONNX model directory")
+        threads = os.getenv("EMBEDDING_ONNX_THREADS")
+        return OnnxEmbeddingFunction(onnx_dir, num_threads=int(threads) if threads else None)
+
+    raise ValueError(f"Unknown embedding backend '{backend}' (expected 'torch' or 'onnx')")
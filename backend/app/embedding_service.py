@@ -0,0 +1,132 @@
+"""
+Query embedding service for the legal RAG pipeline.
+
+Wraps the collection's embedding function with:
+- an LRU cache of query vectors keyed by normalized text
+- micro-batching: concurrent encode requests arriving within a short window
+  (from chats running on the RAG executor) share one forward pass
+- coalescing of identical in-flight queries
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+from .answer_cache import normalize_query
+
+
+class EmbeddingService:
+    def __init__(self, embedding_function: Callable[[List[str]], Any],
+                 cache_size: int = 2048, batch_window_ms: float = 5,
+                 max_batch_size: int = 32):
+        self.embedding_function = embedding_function
+        self.cache_size = cache_size
+        self.batch_window = batch_window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Requests waiting for the next forward pass
+        self._queue: List[Tuple[str, str, Future]] = []
+        self._in_flight: Dict[str, Future] = {}
+        self._batch_scheduled = False
+
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'batches': 0,
+            'encoded': 0
+        }
+
+    def embed(self, text: str) -> np.ndarray:
+        """Return the embedding for one query, blocking until it is ready."""
+        key = normalize_query(text)
+        leader = False
+
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.stats['hits'] += 1
+                return cached
+
+            self.stats['misses'] += 1
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.stats['coalesced'] += 1
+            else:
+                future = Future()
+                self._in_flight[key] = future
+                self._queue.append((key, ' '.join(text.split()), future))
+                # The first caller of a window becomes the batch leader
+                if not self._batch_scheduled:
+                    self._batch_scheduled = True
+                    leader = True
+
+        if leader:
+            # Give concurrent requests a moment to join this batch
+            if self.batch_window > 0:
+                time.sleep(self.batch_window)
+            self._drain()
+
+        return future.result()
+
+    def _drain(self):
+        """Encode queued requests in batches until the queue is empty."""
+        while True:
+            with self._lock:
+                batch = self._queue[:self.max_batch_size]
+                del self._queue[:self.max_batch_size]
+                if not batch:
+                    self._batch_scheduled = False
+                    return
+
+            try:
+                vectors = self.embedding_function([text for _, text, _ in batch])
+            except Exception as e:
+                with self._lock:
+                    for key, _, future in batch:
+                        self._in_flight.pop(key, None)
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            arrays = []
+            for vector in vectors:
+                array = np.asarray(vector, dtype=np.float32)
+                array.setflags(write=False)  # Shared between callers and the cache
+                arrays.append(array)
+
+            with self._lock:
+                self.stats['batches'] += 1
+                self.stats['encoded'] += len(batch)
+                for (key, _, _), array in zip(batch, arrays):
+                    self._cache[key] = array
+                    self._cache.move_to_end(key)
+                    self._in_flight.pop(key, None)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+            for (_, _, future), array in zip(batch, arrays):
+                future.set_result(array)
+
+    def clear(self):
+        """Drop all cached vectors, e.g. after switching embedding models."""
+        with self._lock:
+            self._cache.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'entries': len(self._cache),
+                'hit_rate': self.stats['hits'] / lookups if lookups else 0.0,
+                'avg_batch_size': self.stats['encoded'] / self.stats['batches'] if self.stats['batches'] else 0.0
+            }
@@ -0,0 +1,195 @@
+"""
+Parent expansion for hierarchically chunked provisions.
+
+ml/scripts/delimiter_chunker.py splits provisions longer than
+--max-chunk-chars (Financial Act schedules, long constitutional articles)
+into उपदफा / खण्ड children. The children are embedded and retrieved on their
+own; the full provisions are written to <chunks>.parents.jsonl. After
+retrieval a child is widened back towards its provision only when the answer
+needs it:
+- 'siblings': two or more children of the same provision were retrieved
+- 'enumeration': the question asks for a complete list (all conditions, के के ...)
+- 'lead_in': the child ends in a lead-in ("देहाय बमोजिम ...:") whose items
+  are in the following children
+The whole parent replaces the children when it fits in max_parent_share of
+the context token budget, otherwise a contiguous window of siblings around
+the hits does (up to window_share).
+"""
+
+import re
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .corpus import load_chunks_from_jsonl
+
+_ENUMERATION_RE = re.compile(
+    r'\b(?:all|list|every|each|conditions?|requirements?|grounds?|exceptions?)\b'
+    r'|के के|कुन कुन|सबै|सूची|शर्त|अवस्थाहरू|आधारहरू|अपवाद',
+    re.IGNORECASE
+)
+_LEAD_IN_RE = re.compile(r'(?:[:ः]|[-–—]|देहाय\s*(?:बमोजिम|का|को)[^।]*)\s*$')
+
+
+def parents_file_for(chunks_file: Path) -> Path:
+    """Parent store next to a chunks file: legal_chunks.jsonl -> legal_chunks.parents.jsonl."""
+    chunks_file = Path(chunks_file)
+    return chunks_file.with_name(f"{chunks_file.stem}.parents.jsonl")
+
+
+def load_parents(parents_file: Path) -> List[Dict[str, Any]]:
+    """Parent chunks as {'id', 'text', 'metadata'} dicts; empty if the file is missing."""
+    if not Path(parents_file).exists():
+        return []
+    return load_chunks_from_jsonl(Path(parents_file))
+
+
+def _parent_id(chunk: Dict[str, Any]) -> Optional[str]:
+    return chunk.get('metadata', {}).get('parent_id')
+
+
+class ChunkHierarchy:
+    def __init__(self, max_parent_share: float = 0.5, window_share: float = 0.35):
+        self.max_parent_share = max_parent_share
+        self.window_share = window_share
+        self._parents: Dict[str, Dict[str, Any]] = {}
+        self._children: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self.stats = {'expanded_parents': 0, 'expanded_windows': 0, 'not_expanded': 0,
+                      'siblings': 0, 'enumeration': 0, 'lead_in': 0}
+
+    def build(self, corpus: Sequence[Dict[str, Any]], parents: Sequence[Dict[str, Any]] = ()):
+        """Link the child chunks of the corpus to their parents.
+
+        Parents missing from the parents file are rebuilt by joining their
+        children without the heading each child repeats.
+        """
+        children = defaultdict(list)
+        for chunk in corpus:
+            parent_id = _parent_id(chunk)
+            if parent_id:
+                children[parent_id].append(chunk)
+        self._children = {
+            parent_id: sorted(group, key=lambda chunk: chunk['metadata'].get('child_index', 0))
+            for parent_id, group in children.items()
+        }
+        self._parents = {parent['id']: parent for parent in parents if parent['id'] in self._children}
+
+        for parent_id, group in self._children.items():
+            if parent_id not in self._parents:
+                first = group[0]['metadata']
+                metadata = {key: value for key, value in first.items()
+                            if key not in ('parent_id', 'child_index', 'subsection', 'heading_chars')}
+                reference, label = first.get('citation_reference', ''), first.get('subsection')
+                if label and reference.endswith(f" {label}"):
+                    metadata['citation_reference'] = reference[:-len(label) - 1]
+                metadata.update(chunk_level='parent', num_children=len(group))
+                self._parents[parent_id] = {'id': parent_id, 'text': self._join(group), 'metadata': metadata}
+
+    def __len__(self) -> int:
+        return len(self._children)
+
+    @staticmethod
+    def _join(children: Sequence[Dict[str, Any]]) -> str:
+        """Text of consecutive children with the repeated heading kept once."""
+        parts = [children[0]['text']]
+        for child in children[1:]:
+            parts.append(child['text'][child['metadata'].get('heading_chars', 0):])
+        return "\n".join(parts)
+
+    def needs_expansion(self, query: str, hits: Sequence[Dict[str, Any]]) -> Optional[str]:
+        """Why the retrieved children of one provision need more of it, or None."""
+        if len(hits) >= 2:
+            return 'siblings'
+        if _ENUMERATION_RE.search(query):
+            return 'enumeration'
+        if any(_LEAD_IN_RE.search(hit['text'].rstrip()) for hit in hits):
+            return 'lead_in'
+        return None
+
+    def _window(self, children: List[Dict[str, Any]], hit_indexes: List[int], reason: str,
+                max_tokens: float, count_tokens: Callable[[str], int]) -> Optional[Tuple[int, int]]:
+        """Widest [lo, hi] run of siblings covering the hits within max_tokens."""
+        lo, hi = min(hit_indexes), max(hit_indexes)
+        if reason == 'lead_in' and hi + 1 < len(children):
+            hi += 1  # the items follow the lead-in
+        if count_tokens(self._join(children[lo:hi + 1])) > max_tokens:
+            return None
+        while True:
+            # Prefer the following sibling: provisions read top-down
+            for candidate in ((lo, hi + 1), (lo - 1, hi)):
+                if 0 <= candidate[0] and candidate[1] < len(children) and \
+                        count_tokens(self._join(children[candidate[0]:candidate[1] + 1])) <= max_tokens:
+                    lo, hi = candidate
+                    break
+            else:
+                return lo, hi
+
+    def expand(self, query: str, results: List[Dict[str, Any]], token_budget: int,
+               count_tokens: Callable[[str], int]) -> List[Dict[str, Any]]:
+        """Replace retrieved children by their parent or a sibling window where needed.
+
+        The expanded chunk takes the place of the best-ranked child, keeps its
+        score and records the child ids in 'expanded_from'.
+        """
+        groups: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for result in results:
+            parent_id = _parent_id(result)
+            if parent_id in self._children:
+                groups[parent_id].append(result)
+        if not groups:
+            return results
+
+        replacements: Dict[str, Dict[str, Any]] = {}
+        for parent_id, hits in groups.items():
+            reason = self.needs_expansion(query, hits)
+            if reason is None:
+                continue
+            best = hits[0]
+            parent = self._parents[parent_id]
+            expanded = None
+            if count_tokens(parent['text']) <= token_budget * self.max_parent_share:
+                expanded = {**best, 'id': parent['id'], 'text': parent['text'], 'metadata': parent['metadata']}
+                kind = 'expanded_parents'
+            else:
+                children = self._children[parent_id]
+                positions = {child['id']: i for i, child in enumerate(children)}
+                hit_indexes = [positions[hit['id']] for hit in hits if hit['id'] in positions]
+                window = self._window(children, hit_indexes, reason,
+                                      token_budget * self.window_share, count_tokens) if hit_indexes else None
+                if window is not None:
+                    lo, hi = window
+                    first, last = children[lo]['metadata'], children[hi]['metadata']
+                    label = first.get('subsection', '')
+                    if hi > lo and last.get('subsection'):
+                        label = f"{label}–{last['subsection']}" if label else last['subsection']
+                    metadata = {**first, 'subsection': label,
+                                'citation_reference': f"{parent['metadata'].get('citation_reference', '')} {label}".strip()}
+                    expanded = {**best, 'id': f"{parent_id}-c{lo}-{hi}",
+                                'text': self._join(children[lo:hi + 1]), 'metadata': metadata}
+                kind = 'expanded_windows'
+            with self._lock:
+                self.stats[reason] += 1
+                self.stats[kind if expanded is not None else 'not_expanded'] += 1
+            if expanded is not None:
+                expanded.update(expanded_from=[hit['id'] for hit in hits], expansion=reason,
+                                score=max(hit.get('score', 0.0) for hit in hits))
+                replacements[parent_id] = expanded
+
+        if not replacements:
+            return results
+        expanded_results, placed = [], set()
+        for result in results:
+            parent_id = _parent_id(result)
+            if parent_id in replacements:
+                if parent_id not in placed:
+                    placed.add(parent_id)
+                    expanded_results.append(replacements[parent_id])
+                continue
+            expanded_results.append(result)
+        return [{**result, 'rank': i} for i, result in enumerate(expanded_results, 1)]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, 'split_provisions': len(self._children)}
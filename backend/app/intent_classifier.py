@@ -0,0 +1,233 @@
+"""
+Fast-path intent detection for greetings, capability questions and off-topic queries.
+
+Two tiers:
+1. One combined, precompiled regex with a named group per intent (plus a
+   group for legal vocabulary). A single scan finds every keyword hit, so
+   canned replies cost microseconds instead of repeated substring scans.
+2. An embedding-centroid classifier for paraphrases the keywords miss. It
+   reuses the query embedding that retrieval computes anyway, so it adds
+   one small matrix product and no model call.
+
+Keyword hits for intents marked "vetoed_by_legal_terms" are ignored when
+the question also uses legal vocabulary: "संविधानको इतिहास" is a legal
+history question, not an off-topic history one, and "can you help me with
+property tax?" needs an answer, not the capability reply.
+
+Categories are configurable with a JSON file (RAG_INTENTS_FILE) that has the
+same shape as DEFAULT_INTENTS. Replies name a prompt template ("template",
+rendered per answer language) or give fixed text ("response").
+"""
+
+import json
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_INTENTS: Dict[str, Any] = {
+    # Words that mark a question as legal; used to veto off-topic keyword hits
+    # and as exemplars for the "legal" centroid
+    'legal_terms': [
+        'law', 'legal', 'act', 'constitution', 'article', 'section', 'right', 'rights', 'court',
+        'tax', 'citizenship', 'property', 'marriage', 'divorce', 'inheritance', 'land', 'penalty',
+        'कानून', 'कानुन', 'ऐन', 'संविधान', 'धारा', 'दफा', 'नियम', 'अधिकार', 'अदालत', 'मुद्दा',
+        'कर', 'नागरिकता', 'सम्पत्ति', 'विवाह', 'सम्बन्धविच्छेद', 'अंश', 'जग्गा', 'सजाय', 'संहिता'
+    ],
+    'legal_exemplars': [
+        "What are the fundamental rights in Nepal?",
+        "नेपालका मौलिक अधिकारहरू के के हुन्?",
+        "How is the prime minister elected in Nepal?",
+        "सम्पत्ति कर कसरी तिर्ने?",
+        "What is the legal age for marriage?",
+        "जग्गा उपयोगको नियम के छ?",
+        "History of the constitution of Nepal",
+        "नेपालको संविधानको इतिहास के हो?"
+    ],
+    'intents': [
+        {
+            'name': 'greeting',
+            'keywords': ['hi', 'hello', 'hey', 'नमस्ते', 'नमस्कार', 'हाय', 'हेलो'],
+            'max_words': 2,  # "hello, what is article 17?" is a question, not a greeting
+            'template': 'greeting'
+        },
+        {
+            'name': 'capability',
+            'keywords': [
+                'what can you do', 'how can you help', 'who are you', 'what are you',
+                'तपाई के गर्न सक्नुहुन्छ', 'तपाई को हो', 'तपाई के हो', 'मदत गर्न सक्नुहुन्छ',
+                'help me', 'मलाई मदत गर्नुहोस्'
+            ],
+            'max_words': 8,  # Longer messages carry a question of their own
+            'vetoed_by_legal_terms': True,
+            'exemplars': [
+                "What can you do for me?",
+                "What kind of questions can you answer?",
+                "तपाईं कुन कुन विषयमा सहयोग गर्न सक्नुहुन्छ?",
+                "तपाईं को हुनुहुन्छ?"
+            ],
+            'template': 'capability'
+        },
+        {
+            'name': 'off_topic',
+            'keywords': [
+                'weather', 'मौसम', 'recipe', 'खाना पकाउने', 'cooking', 'sports', 'खेलकुद',
+                'movie', 'film', 'चलचित्र', 'music', 'संगीत', 'game', 'खेल',
+                'celebrity', 'प्रसिद्ध व्यक्ति', 'joke', 'मजाक', 'story', 'कथा',
+                'math', 'गणित', 'science', 'विज्ञान', 'history', 'इतिहास',
+                'geography', 'भूगोल', 'astronomy', 'खगोल', 'medicine', 'औषधि'
+            ],
+            'vetoed_by_legal_terms': True,
+            'exemplars': [
+                "What will the weather be like tomorrow?",
+                "Tell me a joke",
+                "भोलि मौसम कस्तो होला?",
+                "Who won the football match yesterday?",
+                "Recommend a good movie to watch",
+                "मलाई एउटा कथा सुनाउनुहोस्"
+            ],
+            'template': 'off_topic'
+        }
+    ]
+}
+
+# Devanagari vowel signs are not \w in Python, so \b would split words apart
+_WORD = r'\w\u0900-\u097F'
+
+# Postpositions glued to Nepali nouns: "संविधानको", "अधिकारहरू" still match
+_NEPALI_SUFFIX = r'(?:हरू|हरु)?(?:को|का|की|मा|ले|लाई|बाट|सँग)?'
+
+
+@dataclass
+class Intent:
+    name: str
+    template: Optional[str] = None   # Prompt registry template with the reply (per language)
+    response: Optional[str] = None   # Or a fixed reply, e.g. from a JSON intents file
+    max_words: Optional[int] = None
+    vetoed_by_legal_terms: bool = False
+    exemplars: Sequence[str] = ()
+
+
+def load_intent_config(path: Optional[str] = None) -> Dict[str, Any]:
+    """DEFAULT_INTENTS, or a JSON file with the same shape."""
+    if not path:
+        return DEFAULT_INTENTS
+    with open(Path(path), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _alternation(keywords: Sequence[str]) -> str:
+    # Longest first so "what can you do" wins over shorter overlapping phrases
+    escaped = [re.escape(k.casefold()).replace(r'\ ', r'\s+') for k in sorted(keywords, key=len, reverse=True)]
+    return '|'.join(escaped)
+
+
+class IntentClassifier:
+    def __init__(self, config: Optional[Dict[str, Any]] = None,
+                 similarity_threshold: float = 0.86, legal_margin: float = 0.03):
+        config = config or DEFAULT_INTENTS
+        self.similarity_threshold = similarity_threshold
+        self.legal_margin = legal_margin
+        self.intents: Dict[str, Intent] = {}
+        groups = []
+
+        for spec in config['intents']:
+            intent = Intent(
+                name=spec['name'],
+                template=spec.get('template'),
+                response=spec.get('response'),
+                max_words=spec.get('max_words'),
+                vetoed_by_legal_terms=spec.get('vetoed_by_legal_terms', False),
+                exemplars=tuple(spec.get('exemplars', ()))
+            )
+            self.intents[intent.name] = intent
+            if spec.get('keywords'):
+                groups.append(f"(?P<{intent.name}>{_alternation(spec['keywords'])})")
+        if config.get('legal_terms'):
+            groups.append(f"(?P<_legal>{_alternation(config['legal_terms'])})")
+
+        self._pattern = re.compile(
+            rf"(?<![{_WORD}])(?:{'|'.join(groups)}){_NEPALI_SUFFIX}(?![{_WORD}])",
+            re.IGNORECASE
+        )
+        self._legal_exemplars = tuple(config.get('legal_exemplars', ()))
+        self._centroid_names: List[str] = []
+        self._centroids: Optional[np.ndarray] = None
+
+    def match(self, query: str) -> Optional[Intent]:
+        """Keyword tier: one regex scan over the query.
+
+        >>> classifier = IntentClassifier()
+        >>> classifier.match("who are you?").name
+        'capability'
+        >>> classifier.match("Can you help me with property tax?") is None
+        True
+        >>> classifier.match("who are you and what is article 76") is None
+        True
+        """
+        text = query.casefold().strip()
+        hits = {m.lastgroup for m in self._pattern.finditer(text)}
+        if not hits:
+            return None
+
+        legal = '_legal' in hits
+        num_words = len(text.split())
+        # Config order decides between several matching intents
+        for intent in self.intents.values():
+            if intent.name not in hits:
+                continue
+            if intent.max_words is not None and num_words > intent.max_words:
+                continue
+            if intent.vetoed_by_legal_terms and legal:
+                continue
+            return intent
+        return None
+
+    def build_centroids(self, embed_batch: Callable[[List[str]], Sequence[Sequence[float]]]):
+        """Embed the exemplars once (startup) and keep one normalized centroid per intent."""
+        names, texts, owners = [], [], []
+        for intent in self.intents.values():
+            if intent.exemplars:
+                names.append(intent.name)
+                texts.extend(intent.exemplars)
+                owners.extend([intent.name] * len(intent.exemplars))
+        if not names or not self._legal_exemplars:
+            return
+        names.append('_legal')
+        texts.extend(self._legal_exemplars)
+        owners.extend(['_legal'] * len(self._legal_exemplars))
+
+        vectors = np.asarray(embed_batch(texts), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        centroids = []
+        for name in names:
+            centroid = vectors[[i for i, owner in enumerate(owners) if owner == name]].mean(axis=0)
+            centroids.append(centroid / np.linalg.norm(centroid))
+        self._centroid_names = names
+        self._centroids = np.stack(centroids)
+
+    def has_legal_terms(self, query: str) -> bool:
+        return any(m.lastgroup == '_legal' for m in self._pattern.finditer(query.casefold()))
+
+    def classify_embedding(self, query: str, embedding) -> Optional[Intent]:
+        """Centroid tier: nearest non-legal intent, if clearly closer than the legal centroid.
+
+        Questions using legal vocabulary are never classified away from retrieval.
+        """
+        if self._centroids is None or embedding is None or self.has_legal_terms(query):
+            return None
+        query_vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query_vec)
+        if norm == 0:
+            return None
+        similarities = self._centroids @ (query_vec / norm)
+        legal_similarity = similarities[self._centroid_names.index('_legal')]
+        best = int(np.argmax(similarities))
+        name = self._centroid_names[best]
+        if name == '_legal' or similarities[best] < self.similarity_threshold:
+            return None
+        if similarities[best] - legal_similarity < self.legal_margin:
+            return None
+        return self.intents[name]
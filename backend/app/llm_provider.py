@@ -0,0 +1,387 @@
+"""
+LLM provider layer for OpenAI-compatible chat completion APIs (Groq by default).
+
+One pooled HTTP/2 client is shared by every request. Each request runs under
+a deadline:
+- retries before the first token, with exponential backoff and full jitter,
+  only while time remains in the deadline
+- a circuit breaker per model, so a failing model is skipped for a while
+  instead of eating every request's budget
+- optional hedging: when the first token has not arrived by the observed p95
+  first-token latency, a second identical request races the first
+- a fallback chain, e.g. llama-3.3-70b-versatile -> llama-3.1-8b-instant
+
+Failures raise LLMError subclasses; error text is never returned as an answer.
+"""
+
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+
+# Worth retrying: rate limits, timeouts and server-side failures
+_RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Base class for LLM provider failures."""
+
+
+class LLMHTTPError(LLMError):
+    def __init__(self, status_code: int, detail: str = ""):
+        self.status_code = status_code
+        super().__init__(f"LLM API returned HTTP {status_code}: {detail}")
+
+    @property
+    def retryable(self) -> bool:
+        return self.status_code in _RETRYABLE_STATUS
+
+    @property
+    def model_failure(self) -> bool:
+        """Whether the error says the model is unhealthy, not just this request bad (e.g. 400, 413)."""
+        return self.retryable or self.status_code >= 500
+
+
+class LLMTimeoutError(LLMError):
+    """Raised when the first token or the whole answer misses its deadline."""
+
+    def __init__(self, stage: str, timeout: float):
+        self.stage = stage
+        self.timeout = timeout
+        super().__init__(f"{stage} exceeded {timeout:.1f}s")
+
+
+class LLMProtocolError(LLMError):
+    """Raised when the API sends a stream chunk that is not valid JSON."""
+
+
+class LLMUnavailableError(LLMError):
+    """Raised when every model in the fallback chain failed or is circuit-open."""
+
+
+class CircuitBreaker:
+    """Closed -> open after N consecutive failures -> half-open after reset_timeout."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half_open'
+            return 'open'
+
+    def allow(self) -> bool:
+        # Half-open lets requests through; the first failure re-opens the circuit
+        return self.state != 'open'
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Rolling window of first-token latencies (seconds)."""
+
+    def __init__(self, window: int = 200):
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+@dataclass
+class _OpenStream:
+    response: httpx.Response
+    tokens: AsyncIterator[str]
+    first: Optional[str]
+
+    async def aclose(self):
+        await self.tokens.aclose()
+        await self.response.aclose()
+
+
+class LLMProvider:
+    def __init__(self, api_key: str, models: Sequence[str], base_url: str = GROQ_BASE_URL,
+                 max_retries: int = 2, backoff_base: float = 0.25, backoff_max: float = 2.0,
+                 hedge: bool = False, hedge_min_samples: int = 20,
+                 breaker_failures: int = 5, breaker_reset: float = 30.0,
+                 max_connections: int = 20, connect_timeout: float = 5.0, http2: bool = True):
+        """models is the fallback chain, best model first."""
+        self.models = list(models)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self._breaker_config = (breaker_failures, breaker_reset)
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latency: Dict[str, LatencyTracker] = {}
+        self._stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'retries': 0, 'fallbacks': 0, 'hedged': 0,
+                      'hedge_wins': 0, 'failures': 0, 'circuit_skips': 0}
+
+        # Read timeouts are enforced per request from the deadline instead
+        self._client = httpx.AsyncClient(
+            base_url=base_url.rstrip('/'),
+            headers={"Authorization": f"Bearer {api_key}"},
+            http2=http2,
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(None, connect=connect_timeout)
+        )
+
+    def _count(self, stat: str):
+        with self._stats_lock:
+            self.stats[stat] += 1
+
+    def _breaker(self, model: str) -> CircuitBreaker:
+        with self._stats_lock:
+            if model not in self._breakers:
+                self._breakers[model] = CircuitBreaker(*self._breaker_config)
+                self._latency[model] = LatencyTracker()
+            return self._breakers[model]
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: uniform over [0, min(cap, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _hedge_delay(self, model: str) -> Optional[float]:
+        tracker = self._latency.get(model)
+        if not self.hedge or tracker is None or len(tracker) < self.hedge_min_samples:
+            return None
+        return tracker.percentile(0.95)
+
+    @staticmethod
+    async def _parse_sse(response: httpx.Response) -> AsyncIterator[str]:
+        async for line in response.aiter_lines():
+            if not line.startswith('data:'):
+                continue
+            data = line[5:].strip()
+            if data == '[DONE]':
+                return
+            try:
+                chunk = json.loads(data)
+            except json.JSONDecodeError as e:
+                raise LLMProtocolError(f"Malformed stream chunk from LLM API: {data[:100]!r}") from e
+            choices = chunk.get('choices') or []
+            if choices:
+                content = (choices[0].get('delta') or {}).get('content')
+                if content:
+                    yield content
+
+    async def _open(self, payload: Dict[str, Any]) -> _OpenStream:
+        """Send one streaming request and wait for its first content token."""
+        started = time.monotonic()
+        request = self._client.build_request("POST", "/chat/completions", json=payload)
+        response = await self._client.send(request, stream=True)
+        tokens = None
+        try:
+            if response.status_code != 200:
+                detail = (await response.aread()).decode('utf-8', 'replace')[:300]
+                raise LLMHTTPError(response.status_code, detail)
+            tokens = self._parse_sse(response)
+            try:
+                first = await tokens.__anext__()
+            except StopAsyncIteration:
+                first = None
+            self._latency[payload['model']].add(time.monotonic() - started)
+            return _OpenStream(response, tokens, first)
+        except BaseException:
+            # Also runs when a losing hedge is cancelled
+            if tokens is not None:
+                await tokens.aclose()
+            await response.aclose()
+            raise
+
+    async def _open_hedged(self, payload: Dict[str, Any], timeout: float) -> _OpenStream:
+        """Open a stream, racing a second request if the first is slower than p95."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        tasks = [asyncio.ensure_future(self._open(payload))]
+        hedge_task = None
+        try:
+            delay = self._hedge_delay(payload['model'])
+            if delay is not None and delay < timeout:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    self._count('hedged')
+                    hedge_task = asyncio.ensure_future(self._open(payload))
+                    tasks.append(hedge_task)
+
+            error: Optional[BaseException] = None
+            while tasks:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                done, _ = await asyncio.wait(tasks, timeout=remaining,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                winner = None
+                for task in done:
+                    tasks.remove(task)
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif winner is None:
+                        winner = task.result()
+                        if task is hedge_task:
+                            self._count('hedge_wins')
+                    else:
+                        # Both requests answered at once; keep one
+                        await task.result().aclose()
+                if winner is not None:
+                    return winner
+            if error is not None and not tasks:
+                raise error
+            raise LLMTimeoutError('llm_first_token', timeout)
+        finally:
+            for task in tasks:
+                task.cancel()
+            for task in tasks:
+                try:
+                    opened = await task
+                    await opened.aclose()
+                except BaseException:
+                    pass
+
+    async def stream(self, messages: List[Dict[str, str]], *, deadline: float,
+                     first_token_timeout: float, model: Optional[str] = None,
+                     **params) -> AsyncIterator[str]:
+        """Yield answer tokens, retrying and falling back until the first token arrives.
+
+        deadline is an event-loop time for the whole answer. Once tokens have
+        been yielded a failure is raised as is; a half-sent answer is not retried.
+        """
+        loop = asyncio.get_running_loop()
+        self._count('requests')
+        chain = [model] + [m for m in self.models if m != model] if model else list(self.models)
+        last_error: Optional[Exception] = None
+        opened: Optional[_OpenStream] = None
+        attempted = False
+
+        for candidate in chain:
+            breaker = self._breaker(candidate)
+            if not breaker.allow():
+                self._count('circuit_skips')
+                continue
+            # A fallback only when an earlier model was tried and failed, not merely skipped
+            if attempted:
+                self._count('fallbacks')
+            attempted = True
+            payload = {'model': candidate, 'messages': messages, 'stream': True, **params}
+
+            for attempt in range(self.max_retries + 1):
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise LLMTimeoutError('llm', first_token_timeout)
+                try:
+                    opened = await self._open_hedged(payload, min(first_token_timeout, remaining))
+                    breaker.record_success()
+                    break
+                except (httpx.TransportError, LLMTimeoutError, LLMProtocolError, LLMHTTPError) as e:
+                    last_error = e
+                    if isinstance(e, LLMHTTPError) and not e.model_failure:
+                        # A client error (oversized prompt, bad request) says nothing about
+                        # the model's health; keep it from opening the circuit for everyone
+                        break
+                    breaker.record_failure()
+                    if isinstance(e, LLMHTTPError) and not e.retryable:
+                        break
+                    if attempt < self.max_retries:
+                        pause = self._backoff(attempt)
+                        if loop.time() + pause >= deadline:
+                            break
+                        self._count('retries')
+                        await asyncio.sleep(pause)
+            if opened is not None:
+                break
+            if not breaker.allow():
+                logger.warning("Circuit opened", extra={'model': candidate})
+
+        if opened is None:
+            self._count('failures')
+            if isinstance(last_error, LLMTimeoutError):
+                raise last_error
+            raise LLMUnavailableError(f"All models failed ({', '.join(chain)}): {last_error}")
+
+        try:
+            if opened.first:
+                yield opened.first
+            while True:
+                remaining = deadline - loop.time()
+                try:
+                    token = await asyncio.wait_for(opened.tokens.__anext__(), timeout=max(remaining, 0))
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    raise LLMTimeoutError('llm', remaining)
+                except httpx.TransportError as e:
+                    raise LLMError(f"LLM stream interrupted: {e}") from e
+                yield token
+        finally:
+            await opened.aclose()
+
+    async def complete(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        """Collect a full answer from stream()."""
+        parts = []
+        async for token in self.stream(messages, **kwargs):
+            parts.append(token)
+        return "".join(parts)
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+            models = {
+                model: {
+                    'circuit': self._breakers[model].state,
+                    'first_token_p50_ms': _ms(self._latency[model].percentile(0.5)),
+                    'first_token_p95_ms': _ms(self._latency[model].percentile(0.95)),
+                }
+                for model in self._breakers
+            }
+        return {**stats, 'models': models}
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 1) if seconds is not None else None
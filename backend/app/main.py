@@ -1,15 +1,17 @@
 from typing import Union
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from .auth import router as auth_router
-from .api.v1.legal_chat import router as legal_chat_router
+from .api.v1.legal_chat import router as legal_chat_router, start_rag_warmup, stop_rag_system
 from .api.v1.chat_history import router as chat_history_router
 from .interactions import router as interactions_router
 from .documents import router as documents_router
 from . import models
+from .access_log import AccessLogger, start_logging, stop_logging
 from .db import init_db
+from .metrics import CONTENT_TYPE, REGISTRY
 
 app = FastAPI(
     title="OKIL AI Legal Assistant API",
@@ -30,20 +32,8 @@ app.add_middleware(
     expose_headers=["*"]
 )
 
-# Debug middleware to log all requests
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    print(f"🔍 Request: {request.method} {request.url}")
-    print(f"🔍 Headers: {dict(request.headers)}")
-    try:
-        response = await call_next(request)
-        print(f"🔍 Response status: {response.status_code}")
-        return response
-    except Exception as e:
-        print(f"❌ Error in middleware: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        raise
+# Sampled JSON access log with request ids; records are written by a background thread
+app.middleware("http")(AccessLogger.from_env().middleware)
 
 
 @app.get("/")
@@ -59,6 +49,12 @@ def read_root():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    # Prometheus scrape target: per-stage RAG latency histograms, cache hit rates, corpus size
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
 @app.get("/items/{item_id}")
 def read_item(item_id: int, q: Union[str, None] = None):
     return {"item_id": item_id, "q": q}
@@ -72,7 +68,27 @@ app.include_router(interactions_router)
 app.include_router(documents_router)
 
 
+@app.on_event("startup")
+def start_log_writer():
+    # JSON log records are queued by request handlers and written by one thread
+    start_logging()
+
+
 @app.on_event("startup")
 def on_startup():
     # Ensure DB tables are created (models must be imported before this runs)
-    init_db()
\ No newline at end of file
+    init_db()
+
+
+@app.on_event("startup")
+async def warm_up_rag():
+    # Load the embedding model, Chroma collection and LLM clients in the
+    # background; /api/v1/legal/health returns 503 until this finishes
+    start_rag_warmup()
+
+
+@app.on_event("shutdown")
+async def close_rag():
+    # Release the pooled LLM connections and RAG worker threads
+    await stop_rag_system()
+    stop_logging()
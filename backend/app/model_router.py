@@ -0,0 +1,139 @@
+"""
+Model routing: send simple questions to a fast model and hard ones to the large one.
+
+The decision uses signals the pipeline already has after retrieval:
+- query length in prompt tokens
+- retrieval score margin between the top two chunks (scale-free, see below)
+- number of distinct acts among the chunks that reach the prompt
+- whether a direct citation lookup answered retrieval
+
+Every decision is kept in memory for /routing/decisions and appended to a
+JSONL log so thresholds can be reviewed against answer quality offline. The
+log is written by a background thread, so routing never blocks on disk.
+Questions are recorded only as a hash and a length: users' legal questions
+must not be readable from the log or the endpoint.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .access_log import open_jsonl_log
+from .answer_cache import normalize_query
+from .citation_index import act_group
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RoutingDecision:
+    model: str
+    reason: str
+    signals: Dict[str, Any]
+    query_hash: str   # Groups repeats of the same normalized question
+    query_chars: int
+    decision_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    timestamp: float = field(default_factory=time.time)
+
+
+def score_margin(sources: Sequence[Dict[str, Any]]) -> float:
+    """(top1 - top2) / (top1 - lowest): 1.0 = one clear winner, 0.0 = a tie.
+
+    Normalizing by the spread makes the margin comparable whether the scores
+    are cross-encoder logits, RRF scores or cosine similarities.
+    """
+    scores = sorted((s['score'] for s in sources if s.get('score') is not None), reverse=True)
+    if len(scores) < 2:
+        return 1.0
+    spread = scores[0] - scores[-1]
+    if spread <= 0:
+        return 0.0
+    return (scores[0] - scores[1]) / spread
+
+
+class ModelRouter:
+    def __init__(self, fast_model: str, strong_model: str, max_query_tokens: int = 48,
+                 min_margin: float = 0.25, max_acts: int = 1,
+                 log_path: Optional[Path] = None, history_size: int = 500):
+        self.fast_model = fast_model
+        self.strong_model = strong_model
+        self.max_query_tokens = max_query_tokens
+        self.min_margin = min_margin
+        self.max_acts = max_acts
+        self.log_path = Path(log_path) if log_path else None
+        self._log: Optional[logging.Logger] = None
+        if self.log_path is not None:
+            try:
+                self._log = open_jsonl_log(f"{__name__}.decisions", self.log_path)
+            except OSError as e:
+                logger.warning("Could not open routing log, logging to memory only",
+                               extra={'log_path': str(self.log_path), 'error': str(e)})
+                self.log_path = None
+        self._decisions: deque = deque(maxlen=history_size)
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def signals(self, query_tokens: int, sources: Sequence[Dict[str, Any]], citation_hit: bool) -> Dict[str, Any]:
+        acts = {act_group(s['metadata'].get('act_name_ne', '')) for s in sources
+                if s.get('metadata', {}).get('act_name_ne')}
+        return {
+            'query_tokens': query_tokens,
+            'score_margin': round(score_margin(sources), 4) if not citation_hit else 1.0,
+            'distinct_acts': len(acts),
+            'citation_hit': citation_hit,
+            'num_sources': len(sources),
+        }
+
+    def _choose(self, signals: Dict[str, Any]) -> Tuple[str, str]:
+        if signals['distinct_acts'] > self.max_acts:
+            return self.strong_model, 'multiple_acts'
+        if signals['query_tokens'] > self.max_query_tokens:
+            return self.strong_model, 'long_query'
+        if signals['citation_hit']:
+            return self.fast_model, 'direct_citation'
+        if signals['score_margin'] < self.min_margin:
+            return self.strong_model, 'ambiguous_retrieval'
+        return self.fast_model, 'simple_question'
+
+    def route(self, query: str, query_tokens: int, sources: Sequence[Dict[str, Any]],
+              citation_hit: bool = False) -> RoutingDecision:
+        signals = self.signals(query_tokens, sources, citation_hit)
+        model, reason = self._choose(signals)
+        decision = RoutingDecision(model=model, reason=reason, signals=signals,
+                                   query_hash=hashlib.sha256(normalize_query(query).encode('utf-8')).hexdigest()[:16],
+                                   query_chars=len(query))
+        self._record(decision)
+        return decision
+
+    def _record(self, decision: RoutingDecision):
+        with self._lock:
+            self._decisions.append(decision)
+            self._counts[(decision.model, decision.reason)] += 1
+        if self.log_path is not None and self._log is not None:
+            # Only enqueued here; the file is appended to by the log writer thread
+            self._log.info(json.dumps(asdict(decision), ensure_ascii=False))
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            decisions = list(self._decisions)[-limit:]
+        return [asdict(decision) for decision in reversed(decisions)]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            by_model = Counter()
+            for (model, _), count in self._counts.items():
+                by_model[model] += count
+            return {
+                'fast_model': self.fast_model,
+                'strong_model': self.strong_model,
+                'by_model': dict(by_model),
+                'by_reason': {f"{model}:{reason}": count for (model, reason), count in self._counts.items()},
+                'log_path': str(self.log_path) if self.log_path else None
+            }
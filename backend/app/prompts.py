@@ -0,0 +1,388 @@
+"""
+Prompt template registry for the legal RAG pipeline.
+
+Every prompt the service sends or returns (system prompt, user prompt,
+history block, canned replies, "nothing found" message) is rendered once at
+import time and registered under (name, language, variant). Each template
+gets a content hash as its version, so:
+- answers record exactly which prompt produced them
+- the answer cache is keyed on the prompt version and editing a template
+  invalidates the answers it produced
+
+Languages: 'ne' (default) and 'en'. Variants: 'default' plus A/B variants
+(e.g. 'concise'); a missing variant falls back to 'default', and a missing
+language to the registry's default language.
+"""
+
+import hashlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_LANGUAGE = 'ne'
+DEFAULT_VARIANT = 'default'
+
+_SYSTEM_TEMPLATE = """You are "वकिल" - an expert Nepali legal advisor AI assistant. You help users understand Nepali law by providing accurate, well-structured answers.
+
+CRITICAL RULES (YOU MUST FOLLOW STRICTLY):
+
+1. **Language**: {language_rule}
+
+2. **Source Grounding**: Use ONLY the legal context provided in the user message. DO NOT use your training data or general knowledge. If the context doesn't contain the answer, clearly state: "{refusal}"
+
+3. **Citations**: For every important legal point, provide clear citations:
+{citation_examples}
+
+4. **Professional Formatting**:
+   - Start with a brief introduction
+   - Use bullet points (•) or numbered lists {list_style}
+   - Use relevant emojis for clarity: ⚖️ (law), 📋 (rules), ✅ (allowed), ❌ (prohibited), 📊 (process)
+   - Use headers with ** ** for sections
+   - End with "📚 {sources_heading}:" section listing sources
+
+5. **Structure Example**:
+```
+{structure_example}
+```
+
+6. **Accuracy**: Be precise and detailed. Don't generalize or assume.{extra_rules}
+
+Remember: Your credibility depends on ONLY using the provided legal context. Never hallucinate or add information not in the context."""
+
+_STRUCTURE_NE = """[Brief introduction answering the core question]
+
+**मुख्य बुँदाहरू:**
+
+१. **[Topic 1]:**
+   • [Point with citation]
+   • [Point with citation]
+
+२. **[Topic 2]:**
+   • [Point with citation]
+
+**प्रक्रिया:** [If applicable]
+• [Step-by-step process]
+
+📚 **सन्दर्भ:**
+• नेपालको संविधान, धारा X
+• [Other sources used]"""
+
+_STRUCTURE_EN = """[Brief introduction answering the core question]
+
+**Key points:**
+
+1. **[Topic 1]:**
+   • [Point with citation]
+   • [Point with citation]
+
+2. **[Topic 2]:**
+   • [Point with citation]
+
+**Process:** [If applicable]
+• [Step-by-step process]
+
+📚 **Sources:**
+• Constitution of Nepal, Article X
+• [Other sources used]"""
+
+_CONCISE_RULE = """
+
+7. **Brevity**: Keep the whole answer under 200 words. Give the direct answer first, then at most five bullet points."""
+
+_SYSTEM_FIELDS_NE = dict(
+    language_rule="Answer ONLY in NEPALI (नेपाली भाषा), even if the question is in English",
+    refusal="माफ गर्नुहोस्, दिइएको कानूनी सन्दर्भमा यस प्रश्नको पूर्ण जवाफ उपलब्ध छैन।",
+    citation_examples=(
+        '   - Format: "नेपालको संविधान, धारा ७६ अनुसार..."\n'
+        '   - Or: "नागरिक संहिता, २०७४, दफा १७ बमोजजम..."'
+    ),
+    list_style="(१., २., ३.)",
+    sources_heading="सन्दर्भ",
+    structure_example=_STRUCTURE_NE
+)
+
+_SYSTEM_FIELDS_EN = dict(
+    language_rule="Answer ONLY in ENGLISH, even if the question is in Nepali. Keep act names and legal terms recognisable (e.g. \"Muluki Civil Code (मुलुकी देवानी संहिता)\")",
+    refusal="Sorry, the provided legal context does not contain a complete answer to this question.",
+    citation_examples=(
+        '   - Format: "According to Article 76 of the Constitution of Nepal..."\n'
+        '   - Or: "Under Section 17 of the Civil Code, 2074..."'
+    ),
+    list_style="(1., 2., 3.)",
+    sources_heading="Sources",
+    structure_example=_STRUCTURE_EN
+)
+
+SYSTEM_PROMPT_NE = _SYSTEM_TEMPLATE.format(**_SYSTEM_FIELDS_NE, extra_rules="")
+SYSTEM_PROMPT_EN = _SYSTEM_TEMPLATE.format(**_SYSTEM_FIELDS_EN, extra_rules="")
+
+_USER_TEMPLATE_NE = """{history_block}**प्रयोगकर्ताको प्रश्न:**
+{query}
+
+**उपलब्ध कानूनी सन्दर्भ (यो मात्र प्रयोग गर्नुहोस्):**
+
+{context}
+
+---
+
+कृपया माथिको कानूनी सन्दर्भको आधारमा प्रयोगकर्ताको प्रश्नको विस्तृत, संरचित र पेशेवर जवाफ नेपालीमा दिनुहोस्।"""
+
+_USER_TEMPLATE_EN = """{history_block}**User's question:**
+{query}
+
+**Available legal context (use only this):**
+
+{context}
+
+---
+
+Please give a detailed, structured and professional answer to the user's question in English, based only on the legal context above."""
+
+_HISTORY_BLOCK_NE = "**अघिल्ला प्रश्नहरू (सन्दर्भका लागि मात्र):**\n{history}\n\n"
+_HISTORY_BLOCK_EN = "**Earlier questions (for context only):**\n{history}\n\n"
+
+_GREETING_NE = """नमस्ते! 🙏
+
+म **ओकिल AI** हुँ, तपाईंको नेपाली कानूनी सहयोगी।
+
+**म तपाईंलाई कसरी मदत गर्न सक्छु:**
+
+• **संविधान सम्बन्धी प्रश्न**: मौलिक अधिकार, सरकारी संरचना, नागरिकता आदि
+• **दीवानी संहिता**: सम्पत्ति, विवाह, उत्तराधिकार, ऋण आदि
+• **जग्गा सम्बन्धी कानून**: जग्गा उपयोग, स्वामित्व, जग्गा कर आदि
+• **सम्पत्ति कर**: सम्पत्ति कर नियम, दर र भुक्तानी प्रक्रिया
+• **वित्तीय ऐन**: बजेट, कर, राजस्व सम्बन्धी नियमहरू
+
+कृपया मलाई कानूनी प्रश्न सोध्नुहोस्। म तपाईंलाई सटीक र विश्वसनीय जवाफ दिन तयार छु। 💼⚖️"""
+
+_GREETING_EN = """Hello! 🙏
+
+I am **OKIL AI**, your Nepali legal assistant.
+
+**How I can help you:**
+
+• **Constitution**: fundamental rights, structure of government, citizenship
+• **Civil Code**: property, marriage, inheritance, loans
+• **Land law**: land use, ownership, land tax
+• **Property tax**: property tax rules, rates and payment
+• **Financial Act**: budget, taxes and revenue rules
+
+Please ask me a legal question. I am ready to give you accurate and reliable answers. 💼⚖️"""
+
+_CAPABILITY_NE = """नमस्ते! 🙏
+
+म **ओकिल AI** हुँ - नेपाली कानूनको विशेषज्ञ कृत्रिम बुद्धिमत्ता।
+
+**मेरा क्षमताहरू:**
+
+**१. संविधान सम्बन्धी जानकारी:**
+• मौलिक अधिकार र कर्तव्य
+• सरकारी संरचना र शक्ति विभाजन
+• नागरिकता र निर्वाचन प्रणाली
+
+**२. दीवानी कानून:**
+• विवाह, सम्बन्धविच्छेद र पारिवारिक मामिला
+• सम्पत्ति र उत्तराधिकार
+• ऋण, कर्जा र व्यापार सम्झौता
+
+**३. जग्गा सम्बन्धी कानून:**
+• जग्गा उपयोग र स्वामित्व
+• जग्गा कर र दर्ता प्रक्रिया
+
+**४. कर सम्बन्धी नियम:**
+• सम्पत्ति कर, आयकर
+• कर भुक्तानी प्रक्रिया
+
+**५. वित्तीय ऐन र बजेट**
+
+कृपया मलाई कानूनी प्रश्न सोध्नुहोस्। म तपाईंलाई सटीक, संरचित र प्रमाणित जानकारी प्रदान गर्नेछु। ⚖️"""
+
+_CAPABILITY_EN = """Hello! 🙏
+
+I am **OKIL AI** - an AI assistant specialised in Nepali law.
+
+**What I can do:**
+
+**1. Constitution:**
+• Fundamental rights and duties
+• Structure of government and separation of powers
+• Citizenship and the electoral system
+
+**2. Civil law:**
+• Marriage, divorce and family matters
+• Property and inheritance
+• Loans, credit and business contracts
+
+**3. Land law:**
+• Land use and ownership
+• Land tax and registration
+
+**4. Tax rules:**
+• Property tax, income tax
+• Tax payment process
+
+**5. Financial Act and budget**
+
+Please ask me a legal question. I will give you accurate, structured and sourced information. ⚖️"""
+
+_OFF_TOPIC_NE = """माफ गर्नुहोस्! 🙏
+
+म **ओकिल AI** - नेपाली कानूनी विशेषज्ञ हुँ। म केवल **कानून सम्बन्धी प्रश्नहरूको** जवाफ दिन सक्छु।
+
+**कृपया मलाई यस्ता प्रश्न सोध्नुहोस्:**
+• संविधान र मौलिक अधिकार
+• दीवानी कानून (विवाह, सम्पत्ति, उत्तराधिकार)
+• जग्गा उपयोग र जग्गा कर
+• सम्पत्ति कर र वित्तीय ऐन
+• नागरिकता र निर्वाचन
+
+कानूनी सहयोगको लागि म तयार छु! ⚖️💼"""
+
+_OFF_TOPIC_EN = """Sorry! 🙏
+
+I am **OKIL AI** - a Nepali legal assistant. I can only answer **questions about law**.
+
+**Please ask me about:**
+• The constitution and fundamental rights
+• Civil law (marriage, property, inheritance)
+• Land use and land tax
+• Property tax and the Financial Act
+• Citizenship and elections
+
+I am ready to help with legal questions! ⚖️💼"""
+
+_NO_RESULTS_NE = "माफ गर्नुहोस्, तपाईंको प्रश्नसँग सम्बन्धित कुनै जानकारी भेटिएन।"
+_NO_RESULTS_EN = "Sorry, no information related to your question was found."
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    name: str
+    language: str
+    variant: str
+    text: str
+    version: str = field(default="")
+
+    def render(self, **values) -> str:
+        return self.text.format(**values) if values else self.text
+
+
+@dataclass(frozen=True)
+class PromptSet:
+    """The templates one request uses, resolved once per request."""
+    language: str
+    variant: str
+    templates: Dict[str, PromptTemplate]
+
+    @property
+    def version(self) -> str:
+        """Identifies the exact prompt texts, e.g. 'ne/default@3f9a1c2b'."""
+        digest = hashlib.sha256(
+            "|".join(self.templates[name].version for name in sorted(self.templates)).encode()
+        ).hexdigest()[:8]
+        return f"{self.language}/{self.variant}@{digest}"
+
+    def text(self, name: str) -> str:
+        return self.templates[name].text
+
+    def render(self, name: str, **values) -> str:
+        return self.templates[name].render(**values)
+
+
+class PromptRegistry:
+    def __init__(self, default_language: str = DEFAULT_LANGUAGE, default_variant: str = DEFAULT_VARIANT,
+                 ab_weights: Optional[Dict[str, float]] = None):
+        self.default_language = default_language
+        self.default_variant = default_variant
+        # variant -> share of traffic, e.g. {'default': 0.5, 'concise': 0.5}
+        self.ab_weights = ab_weights or {}
+        self._templates: Dict[Tuple[str, str, str], PromptTemplate] = {}
+        self._sets: Dict[Tuple[str, str], PromptSet] = {}
+
+    def register(self, name: str, text: str, language: str = DEFAULT_LANGUAGE,
+                 variant: str = DEFAULT_VARIANT) -> PromptTemplate:
+        version = hashlib.sha256(text.encode('utf-8')).hexdigest()[:8]
+        template = PromptTemplate(name, language, variant, text, version)
+        self._templates[(name, language, variant)] = template
+        self._sets.clear()
+        return template
+
+    def get(self, name: str, language: Optional[str] = None, variant: Optional[str] = None) -> PromptTemplate:
+        language = language or self.default_language
+        variant = variant or self.default_variant
+        for key in ((name, language, variant), (name, language, DEFAULT_VARIANT),
+                    (name, self.default_language, variant), (name, self.default_language, DEFAULT_VARIANT)):
+            if key in self._templates:
+                return self._templates[key]
+        raise KeyError(f"No prompt template '{name}'")
+
+    @property
+    def languages(self) -> List[str]:
+        return sorted({language for _, language, _ in self._templates})
+
+    @property
+    def variants(self) -> List[str]:
+        return sorted({variant for _, _, variant in self._templates})
+
+    def choose_variant(self, key: Optional[str]) -> str:
+        """Stable A/B assignment: the same key (session or question) always gets the same variant."""
+        if not self.ab_weights or not key:
+            return self.default_variant
+        total = sum(self.ab_weights.values())
+        point = int(hashlib.md5(key.encode('utf-8')).hexdigest()[:8], 16) / 0xFFFFFFFF * total
+        for variant, weight in sorted(self.ab_weights.items()):
+            point -= weight
+            if point <= 0:
+                return variant
+        return self.default_variant
+
+    def select(self, language: Optional[str] = None, variant: Optional[str] = None) -> PromptSet:
+        """All templates for one (language, variant), cached after the first request."""
+        language = language if language in self.languages else self.default_language
+        variant = variant if variant in self.variants else self.default_variant
+        prompt_set = self._sets.get((language, variant))
+        if prompt_set is None:
+            names = {name for name, _, _ in self._templates}
+            prompt_set = PromptSet(language, variant, {name: self.get(name, language, variant) for name in names})
+            self._sets[(language, variant)] = prompt_set
+        return prompt_set
+
+    def describe(self) -> Dict[str, object]:
+        return {
+            'default_language': self.default_language,
+            'default_variant': self.default_variant,
+            'ab_weights': self.ab_weights,
+            'templates': [
+                {'name': t.name, 'language': t.language, 'variant': t.variant, 'version': t.version}
+                for t in self._templates.values()
+            ]
+        }
+
+
+def parse_ab_weights(spec: str) -> Dict[str, float]:
+    """'default:0.5,concise:0.5' -> {'default': 0.5, 'concise': 0.5}"""
+    weights = {}
+    for part in spec.split(','):
+        if ':' in part:
+            variant, weight = part.split(':', 1)
+            weights[variant.strip()] = float(weight)
+    return weights
+
+
+def build_registry(default_language: str = DEFAULT_LANGUAGE, default_variant: str = DEFAULT_VARIANT,
+                   ab_weights: Optional[Dict[str, float]] = None) -> PromptRegistry:
+    """Registry with every built-in template."""
+    registry = PromptRegistry(default_language, default_variant, ab_weights)
+    for language, texts in {
+        'ne': {'system': SYSTEM_PROMPT_NE, 'user': _USER_TEMPLATE_NE, 'history_block': _HISTORY_BLOCK_NE,
+               'greeting': _GREETING_NE, 'capability': _CAPABILITY_NE, 'off_topic': _OFF_TOPIC_NE,
+               'no_results': _NO_RESULTS_NE},
+        'en': {'system': SYSTEM_PROMPT_EN, 'user': _USER_TEMPLATE_EN, 'history_block': _HISTORY_BLOCK_EN,
+               'greeting': _GREETING_EN, 'capability': _CAPABILITY_EN, 'off_topic': _OFF_TOPIC_EN,
+               'no_results': _NO_RESULTS_EN},
+    }.items():
+        for name, text in texts.items():
+            registry.register(name, text, language)
+    # B variant: shorter answers, cheaper to generate
+    registry.register('system', _SYSTEM_TEMPLATE.format(**_SYSTEM_FIELDS_NE, extra_rules=_CONCISE_RULE), 'ne', 'concise')
+    registry.register('system', _SYSTEM_TEMPLATE.format(**_SYSTEM_FIELDS_EN, extra_rules=_CONCISE_RULE), 'en', 'concise')
+    return registry
@@ -4,16 +4,55 @@ Legal RAG System with Groq API
 Ultra-fast responses with proper Nepali formatting and strict context grounding
 """
 
+import asyncio
 import chromadb
-from chromadb.utils import embedding_functions
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, AsyncIterator, Callable, Optional, Tuple
+import logging
 import os
+import time
 from dotenv import load_dotenv
 from groq import Groq
 
+from .alignment import ParallelProvisionIndex
+from .answer_cache import AnswerCache
+from .citation_index import CitationIndex
+from .context_packer import DEFAULT_PROMPT_TOKENIZER, ContextPacker, TokenCounter
+from .conversation import ConversationState, ConversationStore, is_follow_up
+from .corpus import load_corpus
+from .embedding_backends import DEFAULT_MODEL_NAME, create_embedding_function
+from .embedding_service import EmbeddingService
+from .hierarchy import ChunkHierarchy, load_parents, parents_file_for
+from .intent_classifier import Intent, IntentClassifier, load_intent_config
+from .llm_provider import GROQ_BASE_URL, LLMProvider, LLMTimeoutError
+from .metrics import observe_stage, span
+from .model_router import ModelRouter
+from .prompts import PromptSet, build_registry, parse_ab_weights
+from .reranker import DEFAULT_RERANK_MODEL, CrossEncoderReranker
+from .retrieval_scope import RetrievalScope, ScopeResolver
+from .sparse_index import BM25Index, reciprocal_rank_fusion
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimeoutError(Exception):
+    """Raised when a pipeline stage exceeds its time budget."""
+
+    def __init__(self, stage: str, timeout: float):
+        self.stage = stage
+        self.timeout = timeout
+        super().__init__(f"{stage} stage timed out after {timeout:.1f}s")
+
+
 class LegalRAGWithGroq:
-    def __init__(self, base_dir: str = "D:/okil ai/ml"):
+    def __init__(self, base_dir: str = "D:/okil ai/ml", load: bool = True):
+        """Configure the RAG system.
+        
+        With load=False only configuration is read; call load() or await aload()
+        to bring up the LLM clients, embedding model and Chroma collection.
+        """
         self.base_dir = Path(base_dir)
         self.db_dir = self.base_dir / "embeddings" / "chroma_db_v2"
         
@@ -26,35 +65,176 @@ class LegalRAGWithGroq:
         if not self.groq_api_key:
             raise ValueError("Groq_API_KEY not found in .env file")
         
-        # Initialize Groq client
-        self.client = Groq(api_key=self.groq_api_key)
+        # Per-stage time budgets (seconds) for the async pipeline
+        self.search_timeout = float(os.getenv("RAG_SEARCH_TIMEOUT", "15"))
+        self.llm_first_token_timeout = float(os.getenv("RAG_LLM_FIRST_TOKEN_TIMEOUT", "20"))
+        self.llm_timeout = float(os.getenv("RAG_LLM_TIMEOUT", "90"))
+        
+        # Bounded pool for CPU-bound embedding and blocking Chroma calls, so the
+        # event loop stays free and concurrent chats cannot spawn unbounded threads
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("RAG_EXECUTOR_WORKERS", "4")),
+            thread_name_prefix="rag-worker"
+        )
         
         # Available models: 
         # - llama-3.3-70b-versatile (best quality, multilingual)
         # - llama-3.1-8b-instant (fast)
         # - mixtral-8x7b-32768 (good multilingual)
         # - gemma2-9b-it (fast, good for Nepali)
-        self.model = "llama-3.3-70b-versatile"
-        
-        print("✓ Groq API configured successfully")
-        print(f"  Model: {self.model}")
+        self.model = os.getenv("RAG_LLM_MODEL", "llama-3.3-70b-versatile")
+        # Tried in order when the main model fails or its circuit is open
+        self.fallback_models = [
+            model.strip() for model in os.getenv("RAG_LLM_FALLBACK_MODELS", "llama-3.1-8b-instant").split(',')
+            if model.strip() and model.strip() != self.model
+        ]
+        self.llm_base_url = os.getenv("LLM_BASE_URL", GROQ_BASE_URL)
+        
+        # Route simple questions to a fast model; decisions are logged for review
+        self.router: Optional[ModelRouter] = None
+        if os.getenv("RAG_MODEL_ROUTING", "true").lower() == "true":
+            self.router = ModelRouter(
+                fast_model=os.getenv("RAG_FAST_MODEL", "llama-3.1-8b-instant"),
+                strong_model=self.model,
+                max_query_tokens=int(os.getenv("RAG_ROUTER_MAX_QUERY_TOKENS", "48")),
+                min_margin=float(os.getenv("RAG_ROUTER_MIN_MARGIN", "0.25")),
+                max_acts=int(os.getenv("RAG_ROUTER_MAX_ACTS", "1")),
+                log_path=os.getenv("RAG_ROUTER_LOG", str(self.base_dir / "logs" / "model_routing.jsonl"))
+            )
         
         # Embedding Model
-        self.embedding_model_name = "intfloat/multilingual-e5-large"
+        self.embedding_model_name = DEFAULT_MODEL_NAME
+        self.embedding_backend = os.getenv("EMBEDDING_BACKEND", "torch")
         self.collection_name = "legal_corpus_v2"
         
-        # Initialize ChromaDB client
-        print(f"Connecting to ChromaDB at {self.db_dir}...")
-        self.client_db = chromadb.PersistentClient(path=str(self.db_dir))
+        # Hybrid retrieval: BM25 over the chunk JSONL fused with dense results (RRF)
+        self.chunks_file = Path(os.getenv(
+            "RAG_CHUNKS_FILE",
+            str(self.base_dir / "processed" / "chunks" / "legal_chunks_delimiter_based.jsonl")
+        ))
+        self.hybrid_search = os.getenv("RAG_HYBRID_SEARCH", "true").lower() == "true"
+        self.hybrid_candidates = int(os.getenv("RAG_HYBRID_CANDIDATES", "20"))
+        self.rrf_k = int(os.getenv("RAG_RRF_K", "60"))
+        self.corpus: List[Dict[str, Any]] = []
+        self.sparse_index: Optional[BM25Index] = None
+        self.citation_index = CitationIndex()
+        
+        # Scoped retrieval: acts/section types/languages from the request, or acts
+        # named in the question, become a Chroma `where` and BM25/citation filter
+        self.scope_resolver = ScopeResolver(infer=os.getenv("RAG_INFER_SCOPE", "true").lower() == "true")
+        
+        # Provisions present in two languages (Nepali + English constitution) are
+        # collapsed to the answer language so they take one top_k slot, not two
+        self.alignment = ParallelProvisionIndex(overfetch=float(os.getenv("RAG_BILINGUAL_OVERFETCH", "2")))
+        
+        # Oversized provisions are retrieved as उपदफा/खण्ड children and widened
+        # to the parent provision (or a sibling window) only when needed
+        self.parents_file = Path(os.getenv("RAG_PARENTS_FILE", str(parents_file_for(self.chunks_file))))
+        self.hierarchy = ChunkHierarchy(
+            max_parent_share=float(os.getenv("RAG_PARENT_MAX_SHARE", "0.5")),
+            window_share=float(os.getenv("RAG_PARENT_WINDOW_SHARE", "0.35"))
+        )
+        
+        # Cross-encoder rerank stage over a wider candidate set; depth adapts
+        # to the per-request latency budget (milliseconds)
+        self.rerank_enabled = os.getenv("RAG_RERANK", "true").lower() == "true"
+        self.rerank_model_name = os.getenv("RAG_RERANK_MODEL", DEFAULT_RERANK_MODEL)
+        self.rerank_max_candidates = int(os.getenv("RAG_RERANK_MAX_CANDIDATES", "30"))
+        self.rerank_budget_ms = float(os.getenv("RAG_RERANK_BUDGET_MS", "400"))
+        self.reranker: Optional[CrossEncoderReranker] = None
+        
+        # Prompt context is packed to a token budget counted with the LLM's tokenizer
+        self.prompt_tokenizer_name = os.getenv("RAG_PROMPT_TOKENIZER", DEFAULT_PROMPT_TOKENIZER)
+        self.context_token_budget = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "2000"))
+        self.context_packer: Optional[ContextPacker] = None
+        
+        # Versioned prompt templates; language and A/B variant are chosen per request
+        self.prompts = build_registry(
+            default_language=os.getenv("RAG_PROMPT_LANGUAGE", "ne"),
+            default_variant=os.getenv("RAG_PROMPT_VARIANT", "default"),
+            ab_weights=parse_ab_weights(os.getenv("RAG_PROMPT_AB", ""))
+        )
+        
+        # Greeting / capability / off-topic detection: one compiled keyword scan,
+        # then embedding centroids over the cached query embedding
+        self.intent_classifier = IntentClassifier(
+            load_intent_config(os.getenv("RAG_INTENTS_FILE")),
+            similarity_threshold=float(os.getenv("RAG_INTENT_SIMILARITY", "0.86"))
+        )
         
-        # Load embedding function
-        print(f"Loading embedding model: {self.embedding_model_name}...")
-        self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
+        # Chat sessions: follow-ups are condensed into standalone questions
+        # (heuristically, or with RAG_CONDENSE_MODEL) and earlier questions
+        # reach the prompt within a fixed token budget
+        self.condense_model = os.getenv("RAG_CONDENSE_MODEL", "")
+        self.condense_timeout = float(os.getenv("RAG_CONDENSE_TIMEOUT", "3"))
+        self.history_token_budget = int(os.getenv("RAG_HISTORY_TOKEN_BUDGET", "300"))
+        self.history_reuse_threshold = float(os.getenv("RAG_HISTORY_REUSE_THRESHOLD", "0.85"))
+        self.conversations = ConversationStore(
+            max_sessions=int(os.getenv("RAG_MAX_SESSIONS", "1000")),
+            ttl_seconds=float(os.getenv("RAG_SESSION_TTL", "3600"))
+        )
+        
+        # Set once every component is loaded and warmed up
+        self.ready = False
+        
+        if load:
+            self.load()
+
+    def _init_llm_clients(self):
+        """Initialize the LLM clients (sync Groq for the CLI, pooled provider for the API)."""
+        self.client = Groq(api_key=self.groq_api_key, timeout=self.llm_timeout, max_retries=2)
+        self.llm = LLMProvider(
+            api_key=self.groq_api_key,
+            models=[self.model] + self.fallback_models,
+            base_url=self.llm_base_url,
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+            hedge=os.getenv("LLM_HEDGE", "false").lower() == "true",
+            hedge_min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+            breaker_failures=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+            breaker_reset=float(os.getenv("LLM_BREAKER_RESET", "30")),
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+        )
+        
+        print("✓ Groq API configured successfully")
+        print(f"  Model: {self.model} (fallback: {', '.join(self.fallback_models) or 'none'})")
+
+    def _load_embedding_model(self):
+        """Load the embedding model (the slowest startup step)."""
+        print(f"Loading embedding model: {self.embedding_model_name} ({self.embedding_backend})...")
+        self.embedding_function = create_embedding_function(
+            backend=self.embedding_backend,
             model_name=self.embedding_model_name,
             device="cpu"
         )
-        
-        # Get the collection
+
+    def _load_reranker(self):
+        """Load the cross-encoder; reranking is skipped if it cannot be loaded."""
+        if not self.rerank_enabled:
+            return
+        print(f"Loading rerank model: {self.rerank_model_name}...")
+        try:
+            self.reranker = CrossEncoderReranker(
+                self.rerank_model_name,
+                max_candidates=self.rerank_max_candidates
+            )
+        except Exception as e:
+            print(f"Warning: Could not load rerank model, reranking disabled. {e}")
+            self.reranker = None
+
+    def _load_context_packer(self):
+        """Load the prompt tokenizer; token counts are estimated if it cannot be loaded."""
+        self.context_packer = ContextPacker(
+            TokenCounter(self.prompt_tokenizer_name),
+            budget_tokens=self.context_token_budget
+        )
+
+    def _open_vector_store(self):
+        """Open the persistent ChromaDB client."""
+        print(f"Connecting to ChromaDB at {self.db_dir}...")
+        self.client_db = chromadb.PersistentClient(path=str(self.db_dir))
+
+    def _attach_collection(self):
+        """Get the collection and build the caches; needs the model and the store."""
         try:
             self.collection = self.client_db.get_collection(
                 name=self.collection_name,
@@ -64,285 +244,560 @@ class LegalRAGWithGroq:
         except Exception as e:
             print(f"Error: Could not load collection. {e}")
             raise e
+        
+        # Cached, micro-batched query encoder (vectors go to Chroma as query_embeddings)
+        self.embedding_service = EmbeddingService(
+            self.embedding_function,
+            cache_size=int(os.getenv("RAG_EMBEDDING_CACHE_SIZE", "2048")),
+            batch_window_ms=float(os.getenv("RAG_EMBEDDING_BATCH_WINDOW_MS", "5")),
+            max_batch_size=int(os.getenv("RAG_EMBEDDING_MAX_BATCH", "32"))
+        )
+        
+        # Exact + semantic answer cache in front of the LLM
+        self.answer_cache = AnswerCache(
+            max_entries=int(os.getenv("RAG_ANSWER_CACHE_SIZE", "512")),
+            ttl_seconds=float(os.getenv("RAG_ANSWER_CACHE_TTL", "3600")),
+            similarity_threshold=float(os.getenv("RAG_SEMANTIC_CACHE_THRESHOLD", "0.95"))
+        )
+        
+        try:
+            self.intent_classifier.build_centroids(self.embedding_function)
+        except Exception as e:
+            print(f"Warning: Could not embed intent exemplars, keyword intents only. {e}")
+        
+        self._build_corpus_indexes()
 
-    def search(self, query: str, top_k: int = 6) -> List[Dict[str, Any]]:
-        """Search for relevant legal text chunks."""
-        print(f"🔍 Searching for: '{query}'")
+    def _build_corpus_indexes(self):
+        """Load the chunk corpus and build the in-process sparse, citation and parent indexes."""
+        try:
+            self.corpus = load_corpus(self.chunks_file, self.collection)
+        except Exception as e:
+            print(f"Warning: Could not load chunk corpus, hybrid search and citation lookup disabled. {e}")
+            self.corpus = []
         
-        results = self.collection.query(
-            query_texts=[query],
-            n_results=top_k
+        self.citation_index.build(self.corpus)
+        print(f"✓ Citation index built with {len(self.citation_index)} provisions")
+        self.scope_resolver.build(self.corpus)
+        self.alignment.build(self.corpus)
+        if len(self.alignment):
+            print(f"✓ Aligned {len(self.alignment)} provisions present in more than one language")
+        
+        if self.hybrid_search and self.corpus:
+            self.sparse_index = BM25Index()
+            self.sparse_index.build(self.corpus)
+            print(f"✓ BM25 index built over {len(self.sparse_index)} chunks")
+        
+        try:
+            self.hierarchy.build(self.corpus, load_parents(self.parents_file))
+        except Exception as e:
+            print(f"Warning: Could not load parent provisions, rebuilding them from children. {e}")
+            self.hierarchy.build(self.corpus)
+        if len(self.hierarchy):
+            print(f"✓ Linked {len(self.hierarchy)} split provisions to their sub-chunks")
+
+    def warm_up(self):
+        """Run one encode and one vector search so the first user pays nothing extra."""
+        vector = self.embedding_function(["नेपालको संविधान अनुसार मौलिक अधिकार"])[0]
+        self.collection.query(query_embeddings=[vector], n_results=1)
+        self.ready = True
+        print("✓ RAG system warmed up")
+
+    def load(self):
+        """Load every component sequentially (CLI use)."""
+        self._init_llm_clients()
+        self._open_vector_store()
+        self._load_embedding_model()
+        self._load_reranker()
+        self._load_context_packer()
+        self._attach_collection()
+        self.warm_up()
+
+    async def aload(self):
+        """Load the LLM clients, models and Chroma store concurrently, then warm up."""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            loop.run_in_executor(self.executor, self._init_llm_clients),
+            loop.run_in_executor(self.executor, self._load_embedding_model),
+            loop.run_in_executor(self.executor, self._load_reranker),
+            loop.run_in_executor(self.executor, self._load_context_packer),
+            loop.run_in_executor(self.executor, self._open_vector_store)
         )
+        await loop.run_in_executor(self.executor, self._attach_collection)
+        await loop.run_in_executor(self.executor, self.warm_up)
+
+    def invalidate_caches(self):
+        """Drop cached answers; call after the Chroma collection is rebuilt."""
+        self.answer_cache.invalidate()
+        print("✓ Answer cache invalidated")
+
+    def embed_query(self, query: str):
+        """Encode a query with the collection's embedding model (cached, batched)."""
+        with span('embedding'):
+            return self.embedding_service.embed(query)
+
+    def dense_search(self, query_embedding, n_results: int,
+                     where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Nearest-neighbour search in Chroma, optionally restricted by a metadata filter."""
+        with span('vector_search'):
+            results = self.collection.query(
+                query_embeddings=[query_embedding],
+                n_results=n_results,
+                where=where
+            )
         
         formatted_results = []
         for i in range(len(results['ids'][0])):
+            distance = results['distances'][0][i] if results.get('distances') else None
             formatted_results.append({
-                'rank': i + 1,
                 'id': results['ids'][0][i],
                 'text': results['documents'][0][i],
                 'metadata': results['metadatas'][0][i],
-                'distance': results['distances'][0][i] if 'distances' in results else None
+                'distance': distance,
+                # Collection uses cosine space, so similarity = 1 - distance
+                'similarity': 1 - distance if distance is not None else 0.0
             })
-        
-        print(f"✓ Found {len(formatted_results)} relevant legal chunks.\n")
         return formatted_results
 
-    def generate_system_prompt(self) -> str:
-        """Generate system prompt that enforces strict context-only answers."""
-        return """You are "वकिल" - an expert Nepali legal advisor AI assistant. You help users understand Nepali law by providing accurate, well-structured answers.
-
-CRITICAL RULES (YOU MUST FOLLOW STRICTLY):
-
-1. **Language**: Answer ONLY in NEPALI (नेपाली भाषा), even if the question is in English
-
-2. **Source Grounding**: Use ONLY the legal context provided in the user message. DO NOT use your training data or general knowledge. If the context doesn't contain the answer, clearly state: "माफ गर्नुहोस्, दिइएको कानूनी सन्दर्भमा यस प्रश्नको पूर्ण जवाफ उपलब्ध छैन।"
-
-3. **Citations**: For every important legal point, provide clear citations:
-   - Format: "नेपालको संविधान, धारा ७६ अनुसार..."
-   - Or: "नागरिक संहिता, २०७४, दफा १७ बमोजजम..."
-
-4. **Professional Formatting**:
-   - Start with a brief introduction
-   - Use bullet points (•) or numbered lists (१., २., ३.)
-   - Use relevant emojis for clarity: ⚖️ (law), 📋 (rules), ✅ (allowed), ❌ (prohibited), 📊 (process)
-   - Use headers with ** ** for sections
-   - End with "📚 सन्दर्भ:" section listing sources
-
-5. **Structure Example**:
-```
-[Brief introduction answering the core question]
-
-**मुख्य बुँदाहरू:**
-
-१. **[Topic 1]:** 
-   • [Point with citation]
-   • [Point with citation]
-
-२. **[Topic 2]:**
-   • [Point with citation]
-
-**प्रक्रिया:** [If applicable]
-• [Step-by-step process]
-
-📚 **सन्दर्भ:**
-• नेपालको संविधान, धारा X
-• [Other sources used]
-```
-
-6. **Accuracy**: Be precise and detailed. Don't generalize or assume.
+    def lookup_citations(self, query: str, top_k: int = 6,
+                         scope: Optional[RetrievalScope] = None,
+                         preferred_language: Optional[str] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """Fetch the provisions a question cites by name (e.g. "संविधान धारा ७६").
+        
+        Returns (results, exact); exact means every cited provision was found
+        (within the scope) and embedding + vector search can be skipped. A
+        provision found in two languages is returned once, in preferred_language.
+        """
+        with span('citation_lookup'):
+            chunks, exact = self.citation_index.lookup(query, scope.matches if scope else None)
+        results = [
+            {
+                'id': chunk['id'],
+                'text': chunk['text'],
+                'metadata': chunk['metadata'],
+                'distance': None,
+                'similarity': 1.0,
+                'score': 1.0,
+                'retrieval': 'citation'
+            }
+            for chunk in chunks
+        ]
+        results = self.alignment.collapse(results, preferred_language)
+        return [{**result, 'rank': i} for i, result in enumerate(results[:top_k], 1)], exact
+
+    def search(self, query: str, top_k: int = 6, query_embedding=None,
+               pinned: Optional[List[Dict[str, Any]]] = None,
+               latency_budget_ms: Optional[float] = None,
+               scope: Optional[RetrievalScope] = None,
+               preferred_language: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Search for relevant legal text chunks.
+        
+        Dense results are fused with BM25 results by reciprocal rank fusion when
+        hybrid search is enabled, then a cross-encoder reranks a candidate set
+        sized to latency_budget_ms. Pass a precomputed query_embedding to avoid
+        encoding the query twice. Pinned results (e.g. direct citation hits)
+        are kept at the top. A resolved scope restricts both retrievers, and
+        language variants of one provision collapse to preferred_language.
+        """
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
+        
+        # With a reranker, retrieve a wider candidate set than the prompt needs
+        if self.reranker is not None:
+            budget = latency_budget_ms if latency_budget_ms is not None else self.rerank_budget_ms
+            depth = self.reranker.candidate_depth(top_k, budget)
+        else:
+            depth = top_k
+        
+        # Over-fetch so top_k distinct provisions remain after the language collapse
+        fetch_depth = self.alignment.depth(depth)
+        where = scope.where() if scope else None
+        if self.sparse_index is None:
+            candidates = self.dense_search(query_embedding, fetch_depth, where)
+            for candidate in candidates:
+                candidate['score'] = candidate['similarity']
+        else:
+            hybrid_depth = max(fetch_depth, self.hybrid_candidates)
+            dense = self.dense_search(query_embedding, hybrid_depth, where)
+            with span('sparse_search'):
+                sparse = self.sparse_index.search(query, hybrid_depth, scope.matches if scope else None)
+            
+            by_id = {result['id']: result for result in dense}
+            for chunk, bm25_score in sparse:
+                result = by_id.setdefault(chunk['id'], {
+                    'id': chunk['id'],
+                    'text': chunk['text'],
+                    'metadata': chunk['metadata'],
+                    'distance': None,
+                    'similarity': 0.0
+                })
+                result['bm25_score'] = bm25_score
+            
+            fused = reciprocal_rank_fusion(
+                [[result['id'] for result in dense], [chunk['id'] for chunk, _ in sparse]],
+                k=self.rrf_k
+            )
+            candidates = [{**by_id[chunk_id], 'score': score} for chunk_id, score in fused]
+        
+        candidates = self.alignment.collapse(candidates, preferred_language)
+        if self.reranker is not None:
+            with span('rerank'):
+                candidates = self.reranker.rerank(query, candidates[:depth], top_k)
+        
+        if pinned:
+            pinned_ids = {result['id'] for result in pinned}
+            candidates = list(pinned) + [c for c in candidates if c['id'] not in pinned_ids]
+            candidates = self.alignment.collapse(candidates, preferred_language)
+        
+        formatted_results = [
+            {**candidate, 'rank': i}
+            for i, candidate in enumerate(candidates[:top_k], 1)
+        ]
+        
+        logger.debug("Search finished", extra={'results': len(formatted_results), 'depth': depth,
+                                               'hybrid': self.sparse_index is not None,
+                                               'pinned': len(pinned or [])})
+        return formatted_results
 
-Remember: Your credibility depends on ONLY using the provided legal context. Never hallucinate or add information not in the context."""
+    def generate_system_prompt(self, prompt_set: Optional[PromptSet] = None) -> str:
+        """System prompt that enforces strict context-only answers (pre-rendered template)."""
+        return (prompt_set or self.prompts.select()).text('system')
 
-    def generate_user_prompt(self, query: str, retrieved_chunks: List[Dict[str, Any]], max_chunk_chars: int = 800) -> str:
-        """Generate user prompt with query and legal context.
+    def build_context(self, retrieved_chunks: List[Dict[str, Any]],
+                      token_budget: Optional[int] = None) -> Tuple[str, int, List[Dict[str, Any]]]:
+        """Pack retrieved chunks into the prompt context within the token budget.
         
-        Args:
-            query: User's question
-            retrieved_chunks: Retrieved legal chunks
-            max_chunk_chars: Maximum characters per chunk (default: 800 to stay under token limits)
+        Returns (context, context_tokens, chunks actually used).
         """
+        if self.context_packer is None:
+            self._load_context_packer()
         
-        # Build the context from retrieved chunks
-        context_parts = []
-        for i, chunk in enumerate(retrieved_chunks, 1):
+        items = []
+        for chunk in retrieved_chunks:
             citation_ref = chunk['metadata'].get('citation_reference', 'Unknown Source')
             section_type = chunk['metadata'].get('section_type_ne', '')
             section_num = chunk['metadata'].get('section_number', '')
-            text = chunk['text']
-            
-            # Truncate text if too long
-            if len(text) > max_chunk_chars:
-                text = text[:max_chunk_chars] + "..."
-            
-            header = f"[सन्दर्भ {i}: {citation_ref}"
+            label = citation_ref
             if section_type and section_num:
-                header += f", {section_type} {section_num}"
-            header += "]"
-            
-            context_parts.append(f"{header}\n{text}")
+                label += f", {section_type} {section_num}"
+            items.append({'header': f"[सन्दर्भ {len(items) + 1}: {label}]", 'label': label, 'chunk': chunk})
         
-        context = "\n\n---\n\n".join(context_parts)
+        packed, context_tokens = self.context_packer.pack(items, token_budget)
         
-        # Construct the user message
-        user_message = f"""**प्रयोगकर्ताको प्रश्न:**
-{query}
+        # Number the references after near-duplicates were dropped
+        context_parts = [
+            f"[सन्दर्भ {i}: {item['label']}]\n{item['text']}"
+            for i, item in enumerate(packed, 1)
+        ]
+        context = "\n\n---\n\n".join(context_parts)
+        return context, context_tokens, [item['chunk'] for item in packed]
 
-**उपलब्ध कानूनी सन्दर्भ (यो मात्र प्रयोग गर्नुहोस्):**
+    def format_user_prompt(self, query: str, context: str, history: str = "",
+                           prompt_set: Optional[PromptSet] = None) -> str:
+        """Wrap the question, earlier questions and the packed legal context into the user message."""
+        prompt_set = prompt_set or self.prompts.select()
+        history_block = prompt_set.render('history_block', history=history) if history else ""
+        return prompt_set.render('user', history_block=history_block, query=query, context=context)
 
-{context}
+    def generate_user_prompt(self, query: str, retrieved_chunks: List[Dict[str, Any]],
+                             token_budget: Optional[int] = None) -> str:
+        """Generate user prompt with query and legal context.
+        
+        Args:
+            query: User's question
+            retrieved_chunks: Retrieved legal chunks
+            token_budget: Context tokens to fill (default: RAG_CONTEXT_TOKEN_BUDGET)
+        """
+        context, _, _ = self.build_context(retrieved_chunks, token_budget)
+        return self.format_user_prompt(query, context)
 
----
+    def stream_groq(self, system_prompt: str, user_prompt: str, model: Optional[str] = None) -> Iterator[str]:
+        """Send prompt to Groq and yield answer tokens as they arrive.
 
-कृपया माथिको कानूनी सन्दर्भको आधारमा प्रयोगकर्ताको प्रश्नको विस्तृत, संरचित र पेशेवर जवाफ नेपालीमा दिनुहोस्।"""
+        Closing the generator (e.g. when an HTTP client disconnects) also
+        closes the underlying Groq stream so the request stops consuming tokens.
+        """
+        started = time.perf_counter()
+        stream = self.client.chat.completions.create(
+            model=model or self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=0.3,  # Low temperature for factual accuracy
+            max_tokens=2048,
+            top_p=0.9,
+            stream=True
+        )
         
-        return user_message
-
-    def query_groq(self, system_prompt: str, user_prompt: str) -> str:
-        """Send prompt to Groq and get streaming response."""
+        first_token = True
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if first_token:
+                        observe_stage('llm_first_token', time.perf_counter() - started)
+                        first_token = False
+                    yield chunk.choices[0].delta.content
+            observe_stage('llm_total', time.perf_counter() - started)
+        finally:
+            stream.close()
+
+    def query_groq(self, system_prompt: str, user_prompt: str, model: Optional[str] = None) -> str:
+        """Send prompt to Groq and get streaming response; API errors are raised."""
         
         print("🤖 Generating answer using Groq (ultra-fast)...")
         print("=" * 60)
         print("📖 जवाफ (वकिल):")
         print("=" * 60 + "\n")
         
-        try:
-            # Create chat completion with streaming
-            stream = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.3,  # Low temperature for factual accuracy
-                max_tokens=2048,
-                top_p=0.9,
-                stream=True
-            )
-            
-            full_response = ""
-            for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    content = chunk.choices[0].delta.content
-                    print(content, end='', flush=True)
-                    full_response += content
-            
-            print("\n\n" + "=" * 60)
-            return full_response
-                
-        except Exception as e:
-            error_msg = f"❌ Error with Groq API: {str(e)}"
-            print(error_msg)
-            return error_msg
-
-    def is_greeting_or_general(self, query: str) -> tuple[bool, str]:
-        """Check if query is a greeting or general question about the bot."""
-        query_lower = query.lower().strip()
-        
-        # Common greetings in English and Nepali
-        greetings = ['hi', 'hello', 'hey', 'नमस्ते', 'नमस्कार', 'हाय', 'हेलो']
-        
-        # Bot capability questions
-        capability_keywords = [
-            'what can you do', 'how can you help', 'who are you', 'what are you',
-            'तपाई के गर्न सक्नुहुन्छ', 'तपाई को हो', 'तपाई के हो', 'मदत गर्न सक्नुहुन्छ',
-            'help me', 'मलाई मदत गर्नुहोस्'
-        ]
-        
-        # Check for simple greetings
-        if query_lower in greetings or len(query.split()) <= 2 and any(g in query_lower for g in greetings):
-            return True, """नमस्ते! 🙏
-
-म **ओकिल AI** हुँ, तपाईंको नेपाली कानूनी सहयोगी। 
-
-**म तपाईंलाई कसरी मदत गर्न सक्छु:**
-
-• **संविधान सम्बन्धी प्रश्न**: मौलिक अधिकार, सरकारी संरचना, नागरिकता आदि
-• **दीवानी संहिता**: सम्पत्ति, विवाह, उत्तराधिकार, ऋण आदि
-• **जग्गा सम्बन्धी कानून**: जग्गा उपयोग, स्वामित्व, जग्गा कर आदि
-• **सम्पत्ति कर**: सम्पत्ति कर नियम, दर र भुक्तानी प्रक्रिया
-• **वित्तीय ऐन**: बजेट, कर, राजस्व सम्बन्धी नियमहरू
-
-कृपया मलाई कानूनी प्रश्न सोध्नुहोस्। म तपाईंलाई सटीक र विश्वसनीय जवाफ दिन तयार छु। 💼⚖️"""
-        
-        # Check for capability questions
-        if any(keyword in query_lower for keyword in capability_keywords):
-            return True, """नमस्ते! 🙏
-
-म **ओकिल AI** हुँ - नेपाली कानूनको विशेषज्ञ कृत्रिम बुद्धिमत्ता। 
-
-**मेरा क्षमताहरू:**
-
-**१. संविधान सम्बन्धी जानकारी:**
-• मौलिक अधिकार र कर्तव्य
-• सरकारी संरचना र शक्ति विभाजन
-• नागरिकता र निर्वाचन प्रणाली
-
-**२. दीवानी कानून:**
-• विवाह, सम्बन्धविच्छेद र पारिवारिक मामिला
-• सम्पत्ति र उत्तराधिकार
-• ऋण, कर्जा र व्यापार सम्झौता
-
-**३. जग्गा सम्बन्धी कानून:**
-• जग्गा उपयोग र स्वामित्व
-• जग्गा कर र दर्ता प्रक्रिया
-
-**४. कर सम्बन्धी नियम:**
-• सम्पत्ति कर, आयकर
-• कर भुक्तानी प्रक्रिया
-
-**५. वित्तीय ऐन र बजेट**
-
-कृपया मलाई कानूनी प्रश्न सोध्नुहोस्। म तपाईंलाई सटीक, संरचित र प्रमाणित जानकारी प्रदान गर्नेछु। ⚖️"""
-        
-        return False, ""
-    
-    def is_off_topic(self, query: str) -> tuple[bool, str]:
-        """Check if query is completely off-topic (non-legal)."""
-        query_lower = query.lower().strip()
-        
-        # Non-legal topics
-        off_topic_keywords = [
-            'weather', 'मौसम', 'recipe', 'खाना पकाउने', 'cooking', 'sports', 'खेलकुद',
-            'movie', 'film', 'चलचित्र', 'music', 'संगीत', 'game', 'खेल',
-            'celebrity', 'प्रसिद्ध व्यक्ति', 'joke', 'मजाक', 'story', 'कथा',
-            'math', 'गणित', 'science', 'विज्ञान', 'history', 'इतिहास',
-            'geography', 'भूगोल', 'astronomy', 'खगोल', 'medicine', 'औषधि'
-        ]
+        full_response = ""
+        for content in self.stream_groq(system_prompt, user_prompt, model):
+            print(content, end='', flush=True)
+            full_response += content
         
-        # Check for off-topic keywords
-        if any(keyword in query_lower for keyword in off_topic_keywords):
-            return True, """माफ गर्नुहोस्! 🙏
-
-म **ओकिल AI** - नेपाली कानूनी विशेषज्ञ हुँ। म केवल **कानून सम्बन्धी प्रश्नहरूको** जवाफ दिन सक्छु।
+        print("\n\n" + "=" * 60)
+        return full_response
 
-**कृपया मलाई यस्ता प्रश्न सोध्नुहोस्:**
-• संविधान र मौलिक अधिकार
-• दीवानी कानून (विवाह, सम्पत्ति, उत्तराधिकार)
-• जग्गा उपयोग र जग्गा कर
-• सम्पत्ति कर र वित्तीय ऐन
-• नागरिकता र निर्वाचन
+    def _intent_answer(self, query: str, intent: Optional[Intent],
+                       prompt_set: PromptSet) -> Optional[Dict[str, Any]]:
+        if intent is None:
+            return None
+        return {
+            'query': query,
+            'answer': intent.response or prompt_set.text(intent.template),
+            'sources': [],
+            'intent': intent.name,
+            'prompt_version': prompt_set.version
+        }
 
-कानूनी सहयोगको लागि म तयार छु! ⚖️💼"""
-        
-        return False, ""
+    def _canned_answer(self, query: str, prompt_set: PromptSet) -> Optional[Dict[str, Any]]:
+        """Return a ready answer for greetings, capability and off-topic questions (keyword tier)."""
+        with span('intent_keywords'):
+            intent = self.intent_classifier.match(query)
+        return self._intent_answer(query, intent, prompt_set)
+
+    def _semantic_canned_answer(self, query: str, query_embedding,
+                                prompt_set: PromptSet) -> Optional[Dict[str, Any]]:
+        """Catch paraphrased non-legal questions with the already computed query embedding."""
+        with span('intent_embedding'):
+            intent = self.intent_classifier.classify_embedding(query, query_embedding)
+        return self._intent_answer(query, intent, prompt_set)
+
+    def select_prompts(self, answer_language: Optional[str] = None, prompt_variant: Optional[str] = None,
+                       ab_key: Optional[str] = None) -> PromptSet:
+        """Templates for one request: explicit variant, else a stable A/B pick by ab_key."""
+        return self.prompts.select(answer_language, prompt_variant or self.prompts.choose_variant(ab_key))
+
+    def _count_tokens(self, text: str) -> int:
+        if self.context_packer is None:
+            self._load_context_packer()
+        return self.context_packer.counter.count(text)
+
+    def condense_query(self, message: str, state: ConversationState) -> str:
+        """Rewrite a follow-up into a standalone question.
+        
+        Uses the small RAG_CONDENSE_MODEL when configured, otherwise (or if the
+        call fails) prefixes the follow-up with the question it refers to.
+        """
+        if self.condense_model:
+            history = self.conversations.prompt_history(state, self._count_tokens, self.history_token_budget)
+            try:
+                response = self.client.chat.completions.create(
+                    model=self.condense_model,
+                    messages=[
+                        {"role": "system", "content": (
+                            "Rewrite the user's follow-up as one standalone legal question in the "
+                            "same language, using the earlier questions for missing context. "
+                            "Reply with the question only."
+                        )},
+                        {"role": "user", "content": f"Earlier questions:\n{history}\n\nFollow-up: {message}"}
+                    ],
+                    temperature=0,
+                    max_tokens=128,
+                    timeout=self.condense_timeout
+                )
+                condensed = (response.choices[0].message.content or "").strip()
+                if condensed:
+                    return condensed
+            except Exception as e:
+                logger.warning("Query condensation failed, using heuristic", extra={'error': str(e)})
+        return f"{state.topic} {message}"
+
+    def _conversation_state(self, session_id: Optional[str],
+                            history: Optional[List[Dict[str, str]]]) -> Optional[ConversationState]:
+        """Server-side session state, or one rebuilt from the history the client sent."""
+        state = self.conversations.get(session_id)
+        if state is None and history:
+            state = self.conversations.from_history(history, self._count_tokens)
+        return state
+
+    def _reusable_sources(self, state: Optional[ConversationState], query_embedding,
+                          top_k: int, scope: RetrievalScope) -> Optional[List[Dict[str, Any]]]:
+        """Previous turn's chunks when a follow-up (state given) stays on the same provisions."""
+        if state is not None and self.conversations.can_reuse(state, query_embedding, self.history_reuse_threshold):
+            sources = [source for source in state.last_sources if scope.matches(source['metadata'])]
+            if sources:
+                self.conversations.note('retrieval_reused')
+                logger.debug("Follow-up reuses the previous retrieval", extra={'results': len(sources[:top_k])})
+                return sources[:top_k]
+        return None
+
+    @staticmethod
+    def _cache_namespace(prompt_set: PromptSet, scope: RetrievalScope) -> str:
+        """Answer-cache namespace: prompt version, plus the scope when there is one."""
+        return f"{prompt_set.version}#{scope.cache_key()}" if scope else prompt_set.version
+
+    def _remember_turn(self, session_id: Optional[str], prepared: Dict[str, Any], follow_up: bool):
+        if 'intent' in prepared:
+            return
+        self.conversations.record(
+            session_id, prepared['query'], prepared.get('sources', []),
+            prepared.get('query_embedding'), self._count_tokens, follow_up=follow_up
+        )
 
-    def answer_question(self, query: str, top_k: int = 6) -> Dict[str, Any]:
-        """Complete RAG pipeline: retrieve relevant chunks and generate answer."""
-        
-        # Step 0: Check for greetings or general questions
-        is_greeting, greeting_response = self.is_greeting_or_general(query)
-        if is_greeting:
+    def _build_prompts(self, query: str, top_k: int, results: List[Dict[str, Any]],
+                       prompt_set: PromptSet, query_embedding=None, citation_hit: bool = False,
+                       state: Optional[ConversationState] = None,
+                       scope: Optional[RetrievalScope] = None) -> Dict[str, Any]:
+        """Turn retrieved chunks into the prompts for generation."""
+        scope = scope or RetrievalScope()
+        if not results:
             return {
                 'query': query,
-                'answer': greeting_response,
-                'sources': []
+                'answer': prompt_set.text('no_results'),
+                'sources': [],
+                'prompt_version': prompt_set.version,
+                'scope': scope.describe()
             }
         
-        # Step 0.5: Check for off-topic questions
-        is_off_topic, off_topic_response = self.is_off_topic(query)
-        if is_off_topic:
-            return {
-                'query': query,
-                'answer': off_topic_response,
-                'sources': []
-            }
+        # Step 2: Generate prompts
+        with span('prompt_build'):
+            system_prompt = self.generate_system_prompt(prompt_set)
+            results = self.hierarchy.expand(query, results, self.context_token_budget, self._count_tokens)
+            context, context_tokens, used = self.build_context(results)
+            history = ""
+            if state is not None:
+                history = self.conversations.prompt_history(state, self._count_tokens, self.history_token_budget)
+            user_prompt = self.format_user_prompt(query, context, history, prompt_set)
+        
+        model, routing = None, None
+        if self.router is not None:
+            decision = self.router.route(query, self._count_tokens(query), used, citation_hit)
+            model = decision.model
+            routing = {'reason': decision.reason, 'decision_id': decision.decision_id}
         
-        # Step 1: Retrieve relevant chunks
-        results = self.search(query, top_k=top_k)
+        return {
+            'query': query,
+            'sources': used,
+            'system_prompt': system_prompt,
+            'user_prompt': user_prompt,
+            'context_tokens': context_tokens,
+            'history_tokens': self._count_tokens(history) if history else 0,
+            'top_k': top_k,
+            'query_embedding': query_embedding,
+            'citation_hit': citation_hit,
+            'model': model,
+            'routing': routing,
+            'prompt_version': prompt_set.version,
+            'scope': scope.describe(),
+            'cache_namespace': self._cache_namespace(prompt_set, scope)
+        }
+
+    def prepare_answer(self, query: str, top_k: int = 6,
+                       latency_budget_ms: Optional[float] = None,
+                       session_id: Optional[str] = None,
+                       history: Optional[List[Dict[str, str]]] = None,
+                       answer_language: Optional[str] = None,
+                       prompt_variant: Optional[str] = None,
+                       scope: Optional[RetrievalScope] = None) -> Dict[str, Any]:
+        """Run every step before generation: canned replies, cache, retrieval and prompts.
+
+        Returns a dict with 'answer' already set when no LLM call is needed
+        (greetings, off-topic, cache hits, nothing retrieved); otherwise it
+        carries the 'system_prompt' and 'user_prompt' to send to Groq.
+        Follow-ups in a session (session_id, or the client's history) are
+        condensed into a standalone question before retrieval. The prompt
+        templates come from answer_language and prompt_variant (or the A/B
+        split), and their version is part of the answer cache key. scope
+        restricts retrieval to some acts / section types / languages; without
+        one, acts named in the question are used (RAG_INFER_SCOPE). Raises
+        ScopeError when an explicit scope matches nothing in the corpus.
+        """
+        prompt_set = self.select_prompts(answer_language, prompt_variant, session_id or query)
+        canned = self._canned_answer(query, prompt_set)
+        if canned:
+            return canned
+        
+        state = self._conversation_state(session_id, history)
+        follow_up = state is not None and is_follow_up(query)
+        if follow_up:
+            self.conversations.note('follow_ups')
+            query = self.condense_query(query, state)
+            logger.debug("Follow-up condensed", extra={'query_chars': len(query)})
+        
+        prepared = self._retrieve_and_build(query, top_k, latency_budget_ms, prompt_set,
+                                            state if follow_up else None, scope)
+        self._remember_turn(session_id, prepared, follow_up)
+        return prepared
+
+    def _retrieve_and_build(self, query: str, top_k: int, latency_budget_ms: Optional[float],
+                            prompt_set: PromptSet, state: Optional[ConversationState],
+                            scope: Optional[RetrievalScope] = None) -> Dict[str, Any]:
+        scope = self.scope_resolver.resolve(query, scope)
+        namespace = self._cache_namespace(prompt_set, scope)
+        cached = self.answer_cache.get_exact(query, top_k, namespace)
+        if cached:
+            return cached
+        
+        # Step 1a: Questions naming exact provisions skip embedding and vector search
+        cited, exact = self.lookup_citations(query, top_k, scope, prompt_set.language)
+        if exact:
+            logger.debug("Direct citation lookup", extra={'results': len(cited)})
+            return self._build_prompts(query, top_k, cited, prompt_set, citation_hit=True, state=state,
+                                       scope=scope)
+        
+        query_embedding = self.embed_query(query)
+        canned = self._semantic_canned_answer(query, query_embedding, prompt_set)
+        if canned:
+            return canned
+        cached = self.answer_cache.get_semantic(query, query_embedding, top_k, namespace)
+        if cached:
+            return cached
+        
+        # Step 1b: Retrieve relevant chunks
+        results = self._reusable_sources(state, query_embedding, top_k, scope)
+        if results is None:
+            results = self.search(query, top_k=top_k, query_embedding=query_embedding, pinned=cited,
+                                  latency_budget_ms=latency_budget_ms, scope=scope,
+                                  preferred_language=prompt_set.language)
+        return self._build_prompts(query, top_k, results, prompt_set, query_embedding, state=state, scope=scope)
+
+    def cache_answer(self, prepared: Dict[str, Any], answer: str):
+        """Remember a generated answer for repeated and similar questions."""
+        if 'system_prompt' not in prepared or not answer:
+            return
+        self.answer_cache.put(
+            prepared['query'],
+            prepared['top_k'],
+            {'query': prepared['query'], 'answer': answer, 'sources': prepared['sources'],
+             'context_tokens': prepared.get('context_tokens'), 'prompt_version': prepared['prompt_version'],
+             'scope': prepared.get('scope')},
+            embedding=prepared.get('query_embedding'),
+            namespace=prepared.get('cache_namespace', prepared['prompt_version'])
+        )
+
+    def answer_question(self, query: str, top_k: int = 6,
+                        latency_budget_ms: Optional[float] = None) -> Dict[str, Any]:
+        """Complete RAG pipeline: retrieve relevant chunks and generate answer."""
         
-        if not results:
-            return {
-                'query': query,
-                'answer': 'माफ गर्नुहोस्, तपाईंको प्रश्नसँग सम्बन्धित कुनै जानकारी भेटिएन।',
-                'sources': []
-            }
+        prepared = self.prepare_answer(query, top_k=top_k, latency_budget_ms=latency_budget_ms)
+        if 'answer' in prepared:
+            return prepared
         
-        # Step 2: Generate prompts
-        system_prompt = self.generate_system_prompt()
-        user_prompt = self.generate_user_prompt(query, results)
+        results = prepared['sources']
         
         # Step 3: Get answer from Groq
-        answer = self.query_groq(system_prompt, user_prompt)
+        answer = self.query_groq(prepared['system_prompt'], prepared['user_prompt'], prepared.get('model'))
+        self.cache_answer(prepared, answer)
         
         # Step 4: Display sources
         print(f"\n📚 प्रयोग गरिएका कानूनी स्रोतहरू ({len(results)} अंश):")
@@ -358,13 +813,152 @@ Remember: Your credibility depends on ONLY using the provided legal context. Nev
         print()
         
         return {
-            'query': query,
-            'answer': answer,
-            'sources': results,
-            'system_prompt': system_prompt,
-            'user_prompt': user_prompt
+            **prepared,
+            'answer': answer
         }
 
+    async def _run_stage(self, stage: str, func: Callable, *args, timeout: float, **kwargs):
+        """Run a blocking step on the bounded executor with a time budget."""
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+        try:
+            return await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            raise StageTimeoutError(stage, timeout)
+
+    async def aprepare_answer(self, query: str, top_k: int = 6,
+                              latency_budget_ms: Optional[float] = None,
+                              session_id: Optional[str] = None,
+                              history: Optional[List[Dict[str, str]]] = None,
+                              answer_language: Optional[str] = None,
+                              prompt_variant: Optional[str] = None,
+                              scope: Optional[RetrievalScope] = None) -> Dict[str, Any]:
+        """Async variant of prepare_answer; condensation, embedding and search run off the event loop."""
+        prompt_set = self.select_prompts(answer_language, prompt_variant, session_id or query)
+        canned = self._canned_answer(query, prompt_set)
+        if canned:
+            return canned
+        
+        state = self._conversation_state(session_id, history)
+        follow_up = state is not None and is_follow_up(query)
+        if follow_up:
+            self.conversations.note('follow_ups')
+            query = await self._run_stage('condense', self.condense_query, query, state,
+                                          timeout=self.condense_timeout + 1)
+            logger.debug("Follow-up condensed", extra={'query_chars': len(query)})
+        
+        prepared = await self._aretrieve_and_build(query, top_k, latency_budget_ms, prompt_set,
+                                                   state if follow_up else None, scope)
+        self._remember_turn(session_id, prepared, follow_up)
+        return prepared
+
+    async def _aretrieve_and_build(self, query: str, top_k: int, latency_budget_ms: Optional[float],
+                                   prompt_set: PromptSet, state: Optional[ConversationState],
+                                   scope: Optional[RetrievalScope] = None) -> Dict[str, Any]:
+        # Dict lookups only, cheap enough to run inline
+        scope = self.scope_resolver.resolve(query, scope)
+        namespace = self._cache_namespace(prompt_set, scope)
+        cached = self.answer_cache.get_exact(query, top_k, namespace)
+        if cached:
+            return cached
+        
+        cited, exact = self.lookup_citations(query, top_k, scope, prompt_set.language)
+        if exact:
+            logger.debug("Direct citation lookup", extra={'results': len(cited)})
+            return self._build_prompts(query, top_k, cited, prompt_set, citation_hit=True, state=state,
+                                       scope=scope)
+        
+        query_embedding = await self._run_stage('embedding', self.embed_query, query,
+                                                timeout=self.search_timeout)
+        canned = self._semantic_canned_answer(query, query_embedding, prompt_set)
+        if canned:
+            return canned
+        cached = self.answer_cache.get_semantic(query, query_embedding, top_k, namespace)
+        if cached:
+            return cached
+        
+        results = self._reusable_sources(state, query_embedding, top_k, scope)
+        if results is None:
+            results = await self._run_stage('retrieval', self.search, query, top_k=top_k,
+                                            query_embedding=query_embedding, pinned=cited,
+                                            latency_budget_ms=latency_budget_ms, scope=scope,
+                                            preferred_language=prompt_set.language,
+                                            timeout=self.search_timeout)
+        return self._build_prompts(query, top_k, results, prompt_set, query_embedding, state=state, scope=scope)
+
+    async def astream_groq(self, system_prompt: str, user_prompt: str,
+                           model: Optional[str] = None) -> AsyncIterator[str]:
+        """Yield answer tokens through the LLM provider without blocking the event loop.
+
+        Enforces a time-to-first-token budget and an overall generation budget;
+        the provider retries, hedges and falls back to faster models within them.
+        """
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        tokens = self.llm.stream(
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            model=model,
+            deadline=loop.time() + self.llm_timeout,
+            first_token_timeout=self.llm_first_token_timeout,
+            temperature=0.3,
+            max_tokens=2048,
+            top_p=0.9
+        )
+        first_token = True
+        try:
+            async for token in tokens:
+                if first_token:
+                    observe_stage('llm_first_token', time.perf_counter() - started)
+                    first_token = False
+                yield token
+            # Only completed answers: aborted streams would skew the total downwards
+            observe_stage('llm_total', time.perf_counter() - started)
+        except LLMTimeoutError as e:
+            if e.stage == 'llm_first_token':
+                raise StageTimeoutError('llm_first_token', self.llm_first_token_timeout)
+            raise StageTimeoutError('llm', self.llm_timeout)
+        finally:
+            await tokens.aclose()
+
+    async def aquery_groq(self, system_prompt: str, user_prompt: str, model: Optional[str] = None) -> str:
+        """Collect the full async Groq answer."""
+        parts = []
+        async for content in self.astream_groq(system_prompt, user_prompt, model):
+            parts.append(content)
+        return "".join(parts)
+
+    async def aclose(self):
+        """Release pooled connections and worker threads (app shutdown)."""
+        if hasattr(self, 'llm'):
+            await self.llm.aclose()
+        self.executor.shutdown(wait=False)
+
+    async def aanswer_question(self, query: str, top_k: int = 6,
+                               latency_budget_ms: Optional[float] = None,
+                               session_id: Optional[str] = None,
+                               history: Optional[List[Dict[str, str]]] = None,
+                               answer_language: Optional[str] = None,
+                               prompt_variant: Optional[str] = None,
+                               scope: Optional[RetrievalScope] = None) -> Dict[str, Any]:
+        """Async RAG pipeline for the API: one slow answer no longer stalls the worker."""
+        prepared = await self.aprepare_answer(query, top_k=top_k, latency_budget_ms=latency_budget_ms,
+                                              session_id=session_id, history=history,
+                                              answer_language=answer_language,
+                                              prompt_variant=prompt_variant,
+                                              scope=scope)
+        if 'answer' in prepared:
+            return prepared
+        
+        answer = await self.aquery_groq(prepared['system_prompt'], prepared['user_prompt'], prepared.get('model'))
+        self.cache_answer(prepared, answer)
+        
+        return {
+            **prepared,
+            'answer': answer
+        }
 
 def main():
     """Interactive Q&A session with Groq."""
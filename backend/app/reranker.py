@@ -0,0 +1,111 @@
+"""
+Cross-encoder reranking for retrieved legal chunks.
+
+Retrieval casts a wide net (dense + BM25); a small multilingual cross-encoder
+then scores each (question, chunk) pair and only the best top_k chunks reach
+the prompt. Pair scores are cached, and the candidate depth adapts to a
+per-request latency budget using a running estimate of the per-pair cost.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from .answer_cache import normalize_query
+
+DEFAULT_RERANK_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+
+
+class CrossEncoderReranker:
+    def __init__(self, model_name: str = DEFAULT_RERANK_MODEL, max_candidates: int = 30,
+                 batch_size: int = 16, cache_size: int = 4096, max_length: int = 512):
+        from sentence_transformers import CrossEncoder
+
+        self.model_name = model_name
+        self.model = CrossEncoder(model_name, device="cpu", max_length=max_length)
+        self.max_candidates = max_candidates
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+
+        self._cache: "OrderedDict[tuple, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Exponentially weighted per-pair scoring cost, learned from real batches
+        self._pair_ms: Optional[float] = None
+        self._ewma_alpha = 0.2
+
+        self.stats = {'pairs_scored': 0, 'pairs_cached': 0, 'batches': 0}
+
+    def candidate_depth(self, top_k: int, budget_ms: Optional[float]) -> int:
+        """How many candidates to retrieve and rerank within the latency budget."""
+        if budget_ms is None:
+            return max(top_k, self.max_candidates)
+        if self._pair_ms is None:
+            # No cost estimate yet: stay conservative until the first batch is timed
+            return max(top_k, min(self.max_candidates, top_k * 3))
+        affordable = int(budget_ms / self._pair_ms)
+        return max(top_k, min(self.max_candidates, affordable))
+
+    def _score(self, query_key: str, query: str, candidates: List[Dict[str, Any]]) -> Dict[str, float]:
+        scores = {}
+        missing = []
+        with self._lock:
+            for candidate in candidates:
+                cached = self._cache.get((query_key, candidate['id']))
+                if cached is not None:
+                    self._cache.move_to_end((query_key, candidate['id']))
+                    scores[candidate['id']] = cached
+                else:
+                    missing.append(candidate)
+            self.stats['pairs_cached'] += len(candidates) - len(missing)
+
+        if missing:
+            start = time.perf_counter()
+            predicted = self.model.predict(
+                [(query, candidate['text']) for candidate in missing],
+                batch_size=self.batch_size,
+                show_progress_bar=False
+            )
+            pair_ms = (time.perf_counter() - start) * 1000 / len(missing)
+
+            with self._lock:
+                if self._pair_ms is None:
+                    self._pair_ms = pair_ms
+                else:
+                    self._pair_ms = self._ewma_alpha * pair_ms + (1 - self._ewma_alpha) * self._pair_ms
+                self.stats['pairs_scored'] += len(missing)
+                self.stats['batches'] += 1
+                for candidate, score in zip(missing, predicted):
+                    scores[candidate['id']] = float(score)
+                    self._cache[(query_key, candidate['id'])] = float(score)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return scores
+
+    def rerank(self, query: str, candidates: List[Dict[str, Any]], top_n: int) -> List[Dict[str, Any]]:
+        """Return the top_n candidates ordered by cross-encoder score."""
+        if not candidates:
+            return []
+        scores = self._score(normalize_query(query), query, candidates)
+        reranked = [
+            {**candidate, 'retrieval_score': candidate.get('score'), 'score': scores[candidate['id']]}
+            for candidate in candidates
+        ]
+        reranked.sort(key=lambda candidate: candidate['score'], reverse=True)
+        return reranked[:top_n]
+
+    def clear(self):
+        """Drop all cached pair scores, e.g. to time cold reranks."""
+        with self._lock:
+            self._cache.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                'model': self.model_name,
+                'cache_entries': len(self._cache),
+                'pair_ms_estimate': round(self._pair_ms, 3) if self._pair_ms is not None else None
+            }
@@ -0,0 +1,183 @@
+"""
+Scoped retrieval: restrict a question to some acts, section types or languages.
+
+A scope comes from the request (acts=["property tax"], exclude_sources=
+["constitution_english.txt"], source_language="ne") or, when no act is given,
+is inferred from act names in the question ("सम्पत्ति कर ऐन अनुसार ..."). It is
+resolved against the corpus into concrete act_name_ne values and pushed down
+into every retriever: a Chroma `where` filter for the vector search and a
+metadata predicate for BM25 and the citation index. Searching the smaller
+subset is faster and keeps other acts out of the context.
+"""
+
+import re
+import threading
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from .citation_index import ACT_ALIASES, SECTION_TYPE_ALIASES, act_group, find_act_groups
+
+_DEVANAGARI_RE = re.compile('[\u0900-\u097f]')
+_LETTER_RE = re.compile(r'[^\W\d_]')
+
+LANGUAGES = ('ne', 'en')
+
+
+class ScopeError(ValueError):
+    """Raised when an explicit scope names nothing in the corpus."""
+
+
+def text_language(text: str) -> str:
+    """'ne' when most letters are Devanagari, else 'en'."""
+    letters = len(_LETTER_RE.findall(text))
+    return 'ne' if letters and len(_DEVANAGARI_RE.findall(text)) / letters >= 0.5 else 'en'
+
+
+@dataclass(frozen=True)
+class RetrievalScope:
+    acts: Tuple[str, ...] = ()             # act names or aliases; act_name_ne values once resolved
+    section_types: Tuple[str, ...] = ()    # धारा / दफा / नियम (English aliases accepted)
+    source_language: Optional[str] = None  # 'ne' or 'en'
+    exclude_sources: Tuple[str, ...] = ()  # source_file values to leave out
+    inferred: bool = False                 # acts came from the question, not the request
+    resolved: bool = field(default=False, compare=False)
+
+    def __bool__(self) -> bool:
+        return bool(self.acts or self.section_types or self.source_language or self.exclude_sources)
+
+    def where(self) -> Optional[Dict[str, Any]]:
+        """Chroma metadata filter (resolved scopes only; the language is already folded into acts)."""
+        clauses = []
+        if self.acts:
+            clauses.append({'act_name_ne': {'$in': list(self.acts)}})
+        if self.section_types:
+            clauses.append({'section_type_ne': {'$in': list(self.section_types)}})
+        if self.exclude_sources:
+            clauses.append({'source_file': {'$nin': list(self.exclude_sources)}})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+    def matches(self, metadata: Dict[str, Any]) -> bool:
+        """Same test as where(), for the in-process indexes."""
+        if self.acts and metadata.get('act_name_ne') not in self.acts:
+            return False
+        if self.section_types and metadata.get('section_type_ne') not in self.section_types:
+            return False
+        if self.exclude_sources and metadata.get('source_file') in self.exclude_sources:
+            return False
+        return True
+
+    def cache_key(self) -> str:
+        """Stable answer-cache namespace for this scope ('' when unscoped)."""
+        if not self:
+            return ""
+        return "|".join([",".join(sorted(self.acts)), ",".join(sorted(self.section_types)),
+                         ",".join(sorted(self.exclude_sources))])
+
+    def describe(self) -> Optional[Dict[str, Any]]:
+        if not self:
+            return None
+        return {
+            'acts': list(self.acts),
+            'section_types': list(self.section_types),
+            'source_language': self.source_language,
+            'exclude_sources': list(self.exclude_sources),
+            'inferred': self.inferred
+        }
+
+
+class ScopeResolver:
+    def __init__(self, infer: bool = True):
+        self.infer = infer
+        self._acts_by_group: Dict[str, List[str]] = {}
+        self._act_language: Dict[str, str] = {}
+        self._unaliased_acts: List[str] = []
+        self._lock = threading.Lock()
+        self.stats = {'explicit': 0, 'inferred': 0, 'unscoped': 0}
+
+    def build(self, corpus: Sequence[Dict[str, Any]]):
+        """Learn the acts in the corpus, their alias group and their language."""
+        acts_by_group: Dict[str, Set[str]] = defaultdict(set)
+        letters: Dict[str, Counter] = defaultdict(Counter)
+        for chunk in corpus:
+            act_name = chunk.get('metadata', {}).get('act_name_ne')
+            if not act_name:
+                continue
+            acts_by_group[act_group(act_name)].add(act_name)
+            # A few hundred chars per chunk are enough to tell the script apart
+            letters[act_name][text_language(chunk['text'][:300])] += 1
+
+        self._acts_by_group = {group: sorted(acts) for group, acts in acts_by_group.items()}
+        self._act_language = {act: counts.most_common(1)[0][0] for act, counts in letters.items()}
+        self._unaliased_acts = sorted(group for group in self._acts_by_group if group not in ACT_ALIASES)
+
+    @property
+    def acts(self) -> List[str]:
+        return sorted(self._act_language)
+
+    def _resolve_act(self, name: str) -> List[str]:
+        if name in self._act_language:
+            return [name]
+        if name in self._acts_by_group:
+            return self._acts_by_group[name]
+        groups = find_act_groups(name, self._unaliased_acts)
+        return [act for group in groups for act in self._acts_by_group.get(group, [])]
+
+    def resolve(self, query: str, scope: Optional[RetrievalScope] = None) -> RetrievalScope:
+        """Turn a requested scope (or none) into concrete corpus act names."""
+        scope = scope or RetrievalScope()
+        if scope.resolved:
+            return scope
+        if scope.source_language and scope.source_language not in LANGUAGES:
+            raise ScopeError(f"Unknown source_language '{scope.source_language}' (use one of {', '.join(LANGUAGES)})")
+
+        section_types = []
+        for section_type in scope.section_types:
+            canonical = SECTION_TYPE_ALIASES.get(section_type.casefold().rstrip('.'))
+            if canonical is None:
+                raise ScopeError(f"Unknown section type '{section_type}'")
+            if canonical not in section_types:
+                section_types.append(canonical)
+
+        acts: List[str] = []
+        for name in scope.acts:
+            resolved = self._resolve_act(name)
+            if not resolved:
+                raise ScopeError(f"No act in the corpus matches '{name}'")
+            acts.extend(act for act in resolved if act not in acts)
+
+        inferred = False
+        if not acts and self.infer:
+            groups = find_act_groups(query, self._unaliased_acts)
+            acts = [act for group in groups for act in self._acts_by_group.get(group, [])]
+            inferred = bool(acts)
+
+        if scope.source_language:
+            candidates = acts or self.acts
+            in_language = [act for act in candidates if self._act_language.get(act) == scope.source_language]
+            if not in_language and not inferred:
+                raise ScopeError(f"No requested act is in language '{scope.source_language}'")
+            if not in_language:
+                # The question named an act that only exists in the other language
+                in_language = [act for act in self.acts if self._act_language[act] == scope.source_language]
+                inferred = False
+            acts = in_language
+
+        resolved = RetrievalScope(
+            acts=tuple(acts),
+            section_types=tuple(section_types),
+            source_language=scope.source_language,
+            exclude_sources=tuple(scope.exclude_sources),
+            inferred=inferred,
+            resolved=True
+        )
+        with self._lock:
+            self.stats['inferred' if inferred else 'explicit' if resolved else 'unscoped'] += 1
+        return resolved
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        return {**stats, 'acts': {act: self._act_language[act] for act in self.acts}}
@@ -0,0 +1,132 @@
+"""
+Sparse (BM25) retrieval over the legal chunk corpus, plus reciprocal rank fusion.
+
+Dense e5 retrieval is good at paraphrases but weak on exact legal lookups such
+as "धारा ७६" or "दफा १७". BM25 over Devanagari-aware tokens catches those, and
+fusing both rankings lets a small top_k carry the right provisions.
+"""
+
+import heapq
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+_NEPALI_DIGITS = str.maketrans('०१२३४५६७८९', '0123456789')
+
+# Devanagari letters and vowel signs (U+0900-U+0963, U+0970-U+097F; dandas and
+# digits excluded) or ASCII letters/digits after casefolding
+_TOKEN_RE = re.compile(r'[\u0900-\u0963\u0970-\u097F]+|[a-z0-9]+')
+
+# Common Nepali postpositions/plural markers glued to the noun
+_NEPALI_SUFFIXES = ('हरूको', 'हरुको', 'हरूले', 'हरूलाई', 'हरू', 'हरु', 'लाई', 'बाट', 'सँग',
+                    'को', 'का', 'की', 'मा', 'ले')
+
+_STOPWORDS = {
+    # Nepali
+    'र', 'वा', 'छ', 'छन्', 'हो', 'हुन्', 'के', 'कति', 'कसरी', 'यो', 'त्यो', 'पनि', 'गर्ने',
+    'भएको', 'गरी', 'सम्बन्धी', 'अनुसार', 'बमोजिम',
+    # English
+    'the', 'a', 'an', 'of', 'in', 'on', 'to', 'for', 'and', 'or', 'is', 'are', 'what',
+    'how', 'which', 'who', 'can', 'do', 'does', 'by', 'under', 'with', 'as', 'at', 'be',
+}
+
+
+def normalize_numerals(text: str) -> str:
+    """Convert Nepali numerals (०-९) to ASCII digits."""
+    return text.translate(_NEPALI_DIGITS)
+
+
+def _strip_suffix(token: str) -> str:
+    for suffix in _NEPALI_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 2:
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Split Nepali/English legal text into normalized index terms."""
+    text = normalize_numerals(unicodedata.normalize('NFC', text).casefold())
+    tokens = []
+    for token in _TOKEN_RE.findall(text):
+        if token in _STOPWORDS:
+            continue
+        tokens.append(_strip_suffix(token))
+    return tokens
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.chunks: List[Dict[str, Any]] = []
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._idf: Dict[str, float] = {}
+        self._doc_lengths: List[int] = []
+        self._avg_length = 0.0
+
+    def build(self, chunks: Sequence[Dict[str, Any]]):
+        """Index chunks given as {'id', 'text', 'metadata'} dicts."""
+        self.chunks = list(chunks)
+        postings = defaultdict(list)
+        self._doc_lengths = []
+
+        for doc_idx, chunk in enumerate(self.chunks):
+            metadata = chunk.get('metadata', {})
+            # Index the citation too so "धारा ७६" matches the heading
+            terms = tokenize(f"{metadata.get('citation_reference', '')} {chunk['text']}")
+            self._doc_lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                postings[term].append((doc_idx, tf))
+
+        num_docs = len(self.chunks)
+        self._postings = dict(postings)
+        self._idf = {
+            term: math.log(1 + (num_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self._postings.items()
+        }
+        self._avg_length = sum(self._doc_lengths) / num_docs if num_docs else 0.0
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def search(self, query: str, top_k: int = 10,
+               where: Optional[Callable[[Dict[str, Any]], bool]] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """Return the top_k (chunk, score) pairs for a query.
+
+        where is a metadata predicate; chunks failing it are never scored.
+        """
+        if not self.chunks:
+            return []
+
+        allowed: Dict[int, bool] = {}  # predicate results for the documents the query touches
+
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for doc_idx, tf in self._postings[term]:
+                if where is not None:
+                    if doc_idx not in allowed:
+                        allowed[doc_idx] = where(self.chunks[doc_idx].get('metadata', {}))
+                    if not allowed[doc_idx]:
+                        continue
+                length_norm = 1 - self.b + self.b * self._doc_lengths[doc_idx] / self._avg_length
+                scores[doc_idx] += idf * tf * (self.k1 + 1) / (tf + self.k1 * length_norm)
+
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [(self.chunks[doc_idx], score) for doc_idx, score in best]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60,
+                           weights: Optional[Sequence[float]] = None) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists: score(id) = sum(weight / (k + rank))."""
+    weights = weights or [1.0] * len(rankings)
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking, weight in zip(rankings, weights):
+        for rank, item_id in enumerate(ranking, 1):
+            scores[item_id] += weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,441 @@
+"""
+Offline retrieval benchmark over the questions in 'Sample questions.md'.
+Usage: python -m scripts.benchmark_retrieval --output bench.json
+       python -m scripts.benchmark_retrieval --baseline bench.json --fail-on-regression
+
+Runs the sync retrieval path of LegalRAGWithGroq (intent check, citation
+lookup, embedding, dense + BM25 search, rerank, prompt building) against the
+local Chroma store. The Groq client is replaced by a stub that returns a
+canned answer, so no API key or network is needed. Caches are cleared before
+every question so each one pays the full cost.
+
+Each question is scored against the expected act and section in
+scripts/benchmark_labels.json:
+- recall@k: share of labeled questions with a relevant chunk in the top k
+- mrr: mean of 1 / rank of the first relevant chunk
+both at act level (right act) and section level (right act and section).
+Questions whose expected section no chunk in the corpus carries are listed
+under 'section_not_in_corpus'; they bound section recall from above.
+Latency per stage (count, mean, p50, p95, p99 in ms) and the peak RSS of the
+process are reported too. The result is one JSON document; pass an earlier
+one as --baseline to print the deltas.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import re
+import resource
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from functools import wraps
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.alignment import provision_key
+from app.citation_index import act_group
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+PROJECT_ROOT = BACKEND_DIR.parent
+DEFAULT_QUESTIONS = PROJECT_ROOT / "Sample questions.md"
+DEFAULT_LABELS = Path(__file__).resolve().parent / "benchmark_labels.json"
+DEFAULT_KS = (1, 3, 5, 10)
+
+STUB_ANSWER = (
+    "**संक्षिप्त उत्तर:** यो बेन्चमार्कका लागि नक्कली जवाफ हो।\n\n"
+    "📚 **सन्दर्भ:**\n• नेपालको संविधान, धारा १"
+)
+
+_QUESTION_RE = re.compile(r'^\s*(\d+)\.\s*"(.+?)"\s*$')
+
+
+def load_questions(path: Path) -> List[Tuple[int, str]]:
+    """Numbered, quoted questions ('1. "..."') from the sample questions file."""
+    questions = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            match = _QUESTION_RE.match(line)
+            if match:
+                questions.append((int(match.group(1)), match.group(2)))
+    return questions
+
+
+def load_labels(path: Path) -> Dict[str, Dict[str, Any]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return {label['question']: label for label in data['labels']}
+
+
+def _in_sections(number: str, sections: List[str]) -> bool:
+    if not number.isdigit():
+        return False
+    for section in sections:
+        low, _, high = section.partition('-')
+        if int(low) <= int(number) <= int(high or low):
+            return True
+    return False
+
+
+def relevance(metadata: Dict[str, Any], expected: List[Dict[str, Any]]) -> Tuple[bool, bool]:
+    """(act hit, section hit) of one retrieved chunk against the expected provisions."""
+    act_name = metadata.get('act_name_ne')
+    if not act_name:
+        return False, False
+    group = act_group(act_name)
+    key = provision_key(metadata)
+    act_hit = section_hit = False
+    for provision in expected:
+        if provision['act'] != group:
+            continue
+        act_hit = True
+        sections = provision.get('sections')
+        if not sections:
+            section_hit = True
+        elif key is not None and key[1] == provision.get('section_type', key[1]) and _in_sections(key[2], sections):
+            section_hit = True
+    return act_hit, section_hit
+
+
+def score_ranking(ranking: List[Dict[str, Any]], expected: List[Dict[str, Any]]) -> Dict[str, Optional[int]]:
+    """1-based rank of the first act hit and of the first section hit (None if absent)."""
+    first = {'act': None, 'section': None}
+    for rank, result in enumerate(ranking, 1):
+        act_hit, section_hit = relevance(result.get('metadata', {}), expected)
+        if act_hit and first['act'] is None:
+            first['act'] = rank
+        if section_hit and first['section'] is None:
+            first['section'] = rank
+    return first
+
+
+def retrieval_metrics(first_ranks: List[Optional[int]], ks=DEFAULT_KS) -> Dict[str, Any]:
+    """recall@k and MRR from the rank of the first relevant chunk per question."""
+    n = len(first_ranks)
+    if not n:
+        return {'questions': 0}
+    metrics = {'questions': n}
+    for k in ks:
+        metrics[f'recall@{k}'] = round(sum(1 for rank in first_ranks if rank is not None and rank <= k) / n, 4)
+    metrics['mrr'] = round(sum(1 / rank for rank in first_ranks if rank is not None) / n, 4)
+    return metrics
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Linear-interpolated percentile (q in 0..100) of a non-empty sample."""
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def latency_summary(samples: List[float]) -> Dict[str, Any]:
+    return {
+        'count': len(samples),
+        'mean_ms': round(sum(samples) / len(samples), 3),
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'p99_ms': round(percentile(samples, 99), 3)
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    divisor = 1024 * 1024 if platform.system() == 'Darwin' else 1024
+    return round(peak / divisor, 1)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+class StageTimer:
+    """Wraps methods of the RAG components to record wall time per stage."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.active = True
+
+    def wrap(self, owner: Any, method: str, stage: str, on_call=None):
+        if owner is None or not hasattr(owner, method):
+            return
+        func = getattr(owner, method)
+
+        @wraps(func)
+        def timed(*args, **kwargs):
+            if on_call is not None:
+                on_call(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                if self.active:
+                    self.samples[stage].append((time.perf_counter() - started) * 1000)
+
+        setattr(owner, method, timed)
+
+    def record(self, stage: str, elapsed_ms: float):
+        if self.active:
+            self.samples[stage].append(elapsed_ms)
+
+    def summary(self) -> Dict[str, Any]:
+        return {stage: latency_summary(samples) for stage, samples in self.samples.items() if samples}
+
+
+class _StubStream:
+    def __init__(self, text: str):
+        self._chunks = [
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+            for token in re.findall(r'\S+\s*', text)
+        ]
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+    def close(self):
+        pass
+
+
+class StubGroqClient:
+    """Stands in for groq.Groq: chat.completions.create returns the canned answer."""
+
+    def __init__(self, answer: str = STUB_ANSWER):
+        self.calls = 0
+
+        def create(**kwargs):
+            self.calls += 1
+            if kwargs.get('stream'):
+                return _StubStream(answer)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=answer))])
+
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=create))
+
+
+def build_rag(base_dir: Path, quiet: bool):
+    """LegalRAGWithGroq with every component but the LLM clients loaded."""
+    os.environ.setdefault("Groq_API_KEY", "offline-benchmark")
+    from app.rag_service import LegalRAGWithGroq
+
+    output = io.StringIO() if quiet else sys.stdout
+    with contextlib.redirect_stdout(output):
+        rag = LegalRAGWithGroq(base_dir=str(base_dir), load=False)
+        rag.client = StubGroqClient()
+        if rag.router is not None:
+            rag.router.log_path = None  # keep benchmark runs out of the routing log
+        rag._open_vector_store()
+        rag._load_embedding_model()
+        rag._load_reranker()
+        rag._load_context_packer()
+        rag._attach_collection()
+        rag.warm_up()
+    return rag
+
+
+def instrument(rag, timer: StageTimer, captured: Dict[str, Any]):
+    def capture_ranking(query, top_k, results, *args, **kwargs):
+        captured['ranking'] = list(results)
+
+    timer.wrap(rag, '_canned_answer', 'intent')
+    timer.wrap(rag, 'lookup_citations', 'citation_lookup')
+    timer.wrap(rag, 'embed_query', 'embed')
+    timer.wrap(rag, 'dense_search', 'dense_search')
+    timer.wrap(rag.sparse_index, 'search', 'sparse_search')
+    timer.wrap(rag.reranker, 'rerank', 'rerank')
+    timer.wrap(rag, 'search', 'search')
+    timer.wrap(rag, '_build_prompts', 'prompt_build', on_call=capture_ranking)
+    timer.wrap(rag, 'prepare_answer', 'retrieval_total')
+    timer.wrap(rag, 'query_groq', 'generation_stub')
+
+
+def clear_caches(rag):
+    rag.answer_cache.invalidate()
+    rag.embedding_service.clear()
+    if rag.reranker is not None:
+        rag.reranker.clear()
+
+
+def run_benchmark(rag, questions: List[Tuple[int, str]], labels: Dict[str, Dict[str, Any]],
+                  top_k: int, repeat: int, quiet: bool) -> Dict[str, Any]:
+    timer, captured = StageTimer(), {}
+    instrument(rag, timer, captured)
+
+    def ask(question: str) -> Dict[str, Any]:
+        clear_caches(rag)
+        captured['ranking'] = []
+        started = time.perf_counter()
+        prepared = rag.prepare_answer(question, top_k=top_k)
+        if 'system_prompt' in prepared:
+            rag.query_groq(prepared['system_prompt'], prepared['user_prompt'], prepared.get('model'))
+        timer.record('end_to_end', (time.perf_counter() - started) * 1000)
+        return prepared
+
+    output = io.StringIO() if quiet else sys.stdout
+    per_question = []
+    with contextlib.redirect_stdout(output):
+        # One untimed pass so lazy imports and allocator growth do not land on question 1
+        timer.active = False
+        for _, question in questions[:3]:
+            ask(question)
+        timer.active = True
+
+        for _ in range(repeat):
+            per_question = []
+            for number, question in questions:
+                prepared = ask(question)
+                label = labels.get(question)
+                ranking = captured['ranking']
+                entry = {
+                    'number': number,
+                    'question': question,
+                    'category': label['category'] if label else None,
+                    'intent': prepared.get('intent'),
+                    'citation_hit': prepared.get('citation_hit', False),
+                    'retrieved': [result.get('metadata', {}).get('citation_reference') for result in ranking]
+                }
+                if label and label['expected']:
+                    entry.update(score_ranking(ranking, label['expected']))
+                    entry['scored'] = True
+                else:
+                    entry['scored'] = False
+                per_question.append(entry)
+
+    scored = [entry for entry in per_question if entry['scored']]
+    # Labeled sections no corpus chunk carries cap section recall below 1.0
+    unreachable = [
+        entry['number'] for entry in scored
+        if not any(relevance(chunk.get('metadata', {}), labels[entry['question']]['expected'])[1]
+                   for chunk in rag.corpus)
+    ]
+    by_category = defaultdict(list)
+    for entry in scored:
+        by_category[entry['category']].append(entry)
+
+    return {
+        'retrieval': {
+            'act': retrieval_metrics([entry['act'] for entry in scored]),
+            'section': retrieval_metrics([entry['section'] for entry in scored]),
+            'by_category': {
+                category: {
+                    'act': retrieval_metrics([entry['act'] for entry in entries]),
+                    'section': retrieval_metrics([entry['section'] for entry in entries])
+                }
+                for category, entries in sorted(by_category.items())
+            },
+            'unscored_questions': len(per_question) - len(scored),
+            'section_not_in_corpus': unreachable
+        },
+        'latency': timer.summary(),
+        'questions': per_question
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, out=sys.stdout) -> List[str]:
+    """Print metric and p95 deltas; return the retrieval metrics that dropped by more than tolerance."""
+    regressions = []
+    print(f"Compared with {baseline.get('config', {}).get('git_commit') or 'baseline'}:", file=out)
+    for level in ('act', 'section'):
+        for metric, value in current['retrieval'][level].items():
+            before = baseline.get('retrieval', {}).get(level, {}).get(metric)
+            if metric == 'questions' or before is None:
+                continue
+            delta = value - before
+            flag = ''
+            if delta < -tolerance:
+                regressions.append(f"{level} {metric}")
+                flag = '  <-- regression'
+            print(f"  {level:8s}{metric:12s}{before:8.3f} -> {value:8.3f} ({delta:+.3f}){flag}", file=out)
+    for stage, summary in current['latency'].items():
+        before = baseline.get('latency', {}).get(stage, {}).get('p95_ms')
+        if before:
+            change = (summary['p95_ms'] - before) / before * 100
+            print(f"  p95 {stage:20s}{before:9.1f} -> {summary['p95_ms']:9.1f} ms ({change:+.0f}%)", file=out)
+    before_rss = baseline.get('memory', {}).get('peak_rss_mb')
+    if before_rss:
+        print(f"  peak RSS{'':17s}{before_rss:9.1f} -> {current['memory']['peak_rss_mb']:9.1f} MB", file=out)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline retrieval quality and latency benchmark")
+    parser.add_argument("--questions", default=str(DEFAULT_QUESTIONS), help="Markdown file with numbered questions")
+    parser.add_argument("--labels", default=str(DEFAULT_LABELS), help="Expected act/section per question")
+    parser.add_argument("--base-dir", default=str(PROJECT_ROOT / "ml"), help="ml directory (Chroma store, chunks)")
+    parser.add_argument("--top-k", type=int, default=10, help="Results retrieved per question")
+    parser.add_argument("--repeat", type=int, default=1, help="Timed passes over the question set")
+    parser.add_argument("--output", default=None, help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", default=None, help="Earlier JSON report to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.0, help="Allowed drop in recall/MRR before failing")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit 1 when a retrieval metric drops")
+    parser.add_argument("--verbose", action="store_true", help="Show the RAG system's own output")
+    args = parser.parse_args()
+
+    questions = load_questions(Path(args.questions))
+    labels = load_labels(Path(args.labels))
+    known = {question for _, question in questions}
+    for stale in sorted(set(labels) - known):
+        print(f"Warning: label for a question not in {Path(args.questions).name}: {stale}", file=sys.stderr)
+    if not questions:
+        print(f"Error: no questions found in {args.questions}", file=sys.stderr)
+        sys.exit(1)
+
+    quiet = not args.verbose
+    started = time.perf_counter()
+    rag = build_rag(Path(args.base_dir), quiet)
+    startup_seconds = time.perf_counter() - started
+
+    report = run_benchmark(rag, questions, labels, args.top_k, max(args.repeat, 1), quiet)
+    report = {
+        'config': {
+            'git_commit': git_commit(),
+            'top_k': args.top_k,
+            'repeat': args.repeat,
+            'questions': len(questions),
+            'chunks_file': str(rag.chunks_file),
+            'corpus_chunks': len(rag.corpus),
+            'collection_count': rag.collection.count(),
+            'hybrid_search': rag.sparse_index is not None,
+            'rerank': rag.reranker is not None,
+            'embedding_model': rag.embedding_model_name,
+            'embedding_backend': rag.embedding_backend,
+            'python': platform.python_version()
+        },
+        'startup_seconds': round(startup_seconds, 3),
+        'memory': {'peak_rss_mb': peak_rss_mb()},
+        **report
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        section = report['retrieval']['section']
+        print(f"✓ {len(questions)} questions: section recall@5 {section.get('recall@5')}, "
+              f"MRR {section.get('mrr')}, peak RSS {report['memory']['peak_rss_mb']} MB -> {args.output}")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        # Keep stdout pure JSON when the report itself goes there
+        regressions = compare(report, baseline, args.tolerance, sys.stdout if args.output else sys.stderr)
+        if regressions and args.fail_on_regression:
+            print(f"Regressions: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
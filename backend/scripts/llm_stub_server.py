@@ -0,0 +1,118 @@
+"""
+Local OpenAI-compatible chat completion stub for testing the LLM provider offline.
+Usage: python -m scripts.llm_stub_server --port 8081 --fail-rate 0.2 --slow-rate 0.1
+
+Point the backend at it with:
+    LLM_BASE_URL=http://127.0.0.1:8081/v1
+
+Latency, failures and slow outliers are configurable so retries, the circuit
+breaker, hedging and model fallback can all be exercised without Groq.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ANSWER = (
+    "**संक्षिप्त उत्तर:** यो परीक्षणका लागि नक्कली जवाफ हो।\n\n"
+    "📚 **सन्दर्भ:**\n• नेपालको संविधान, धारा १"
+)
+
+
+def create_app(args: argparse.Namespace) -> FastAPI:
+    app = FastAPI(title="LLM stub server")
+    failing_models = {model.strip() for model in args.fail_models.split(',') if model.strip()}
+    stats = {'requests': 0, 'failed': 0, 'slow': 0, 'by_model': {}}
+
+    def first_token_delay() -> float:
+        delay = (args.latency_ms + random.uniform(0, args.jitter_ms)) / 1000
+        if random.random() < args.slow_rate:
+            stats['slow'] += 1
+            delay *= args.slow_factor
+        return delay
+
+    def chunk(completion_id: str, model: str, content: str = None, finish_reason: str = None) -> str:
+        delta = {'content': content} if content is not None else {}
+        payload = {
+            'id': completion_id,
+            'object': 'chat.completion.chunk',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+        }
+        return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    @app.post("/v1/chat/completions")
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get('model', 'stub')
+        stats['requests'] += 1
+        stats['by_model'][model] = stats['by_model'].get(model, 0) + 1
+
+        if model in failing_models or random.random() < args.fail_rate:
+            stats['failed'] += 1
+            return JSONResponse(
+                status_code=args.fail_status,
+                content={'error': {'message': 'stub failure', 'type': 'server_error'}}
+            )
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        answer = f"[{model}] {ANSWER}"
+        tokens = answer.split(' ')
+        delay = first_token_delay()
+
+        if not body.get('stream'):
+            await asyncio.sleep(delay)
+            return {
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': answer},
+                             'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': len(tokens), 'total_tokens': len(tokens)}
+            }
+
+        async def events():
+            await asyncio.sleep(delay)
+            for i, token in enumerate(tokens):
+                yield chunk(completion_id, model, token if i == 0 else f" {token}")
+                await asyncio.sleep(args.token_delay_ms / 1000)
+            yield chunk(completion_id, model, finish_reason='stop')
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible LLM stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=150, help="Base time to first token")
+    parser.add_argument("--jitter-ms", type=float, default=50, help="Uniform extra first-token delay")
+    parser.add_argument("--token-delay-ms", type=float, default=5, help="Delay between streamed tokens")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of slow outlier requests")
+    parser.add_argument("--slow-factor", type=float, default=10.0, help="Latency multiplier for outliers")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--fail-status", type=int, default=503, help="HTTP status for failures")
+    parser.add_argument("--fail-models", default="", help="Comma-separated models that always fail")
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Benchmark the PyTorch and ONNX int8 embedding backends on the legal corpus.
+
+Reports per backend:
+- corpus throughput (chunks/sec) and total embedding time
+- single-query latency (p50 / p95, ms)
+- recall@k of ONNX search against the PyTorch top-k on the same queries,
+  both ONNX-query vs ONNX-corpus (full re-index) and ONNX-query vs
+  PyTorch-corpus (querying the existing collection without re-indexing)
+- mean cosine similarity between the two backends' chunk vectors
+
+Usage:
+    python ml/scripts/benchmark_embedding_backends.py --onnx-dir ml/embeddings/onnx_e5_large --output bench.json
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+ML_DIR = Path(__file__).resolve().parent.parent
+PROJECT_ROOT = ML_DIR.parent
+sys.path.insert(0, str(PROJECT_ROOT / "backend"))
+from app.embedding_backends import create_embedding_function
+
+
+def load_chunk_texts(chunks_file: Path, limit: int = None) -> List[str]:
+    texts = []
+    with open(chunks_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                texts.append(json.loads(line)['text_chunk'])
+            if limit and len(texts) >= limit:
+                break
+    return texts
+
+
+def load_sample_questions(path: Path) -> List[str]:
+    """Pull the numbered, quoted questions out of 'Sample questions.md'."""
+    pattern = re.compile(r'^\s*\d+\.\s*"(.+?)"\s*$')
+    questions = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            match = pattern.match(line)
+            if match:
+                questions.append(match.group(1))
+    return questions
+
+
+def embed_all(embedding_function, texts: List[str], batch_size: int = 32) -> np.ndarray:
+    vectors = []
+    for i in range(0, len(texts), batch_size):
+        vectors.extend(embedding_function(texts[i:i + batch_size]))
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+
+def top_k(query_vectors: np.ndarray, corpus: np.ndarray, k: int) -> np.ndarray:
+    return np.argsort(-(query_vectors @ corpus.T), axis=1)[:, :k]
+
+
+def recall_at_k(reference: np.ndarray, candidate: np.ndarray) -> float:
+    k = reference.shape[1]
+    overlaps = [len(set(r) & set(c)) / k for r, c in zip(reference, candidate)]
+    return float(np.mean(overlaps))
+
+
+def benchmark_backend(name: str, embedding_function, corpus_texts: List[str],
+                      questions: List[str]) -> Dict:
+    print(f"\n[{name}] embedding {len(corpus_texts)} chunks...")
+    start = time.perf_counter()
+    corpus = embed_all(embedding_function, corpus_texts)
+    corpus_seconds = time.perf_counter() - start
+
+    # Warm up once so lazy initialization does not skew query latency
+    embedding_function([questions[0]])
+    latencies = []
+    query_vectors = []
+    for question in questions:
+        start = time.perf_counter()
+        query_vectors.append(embedding_function([question])[0])
+        latencies.append((time.perf_counter() - start) * 1000)
+    query_matrix = np.asarray(query_vectors, dtype=np.float32)
+    query_matrix /= np.clip(np.linalg.norm(query_matrix, axis=1, keepdims=True), 1e-12, None)
+
+    stats = {
+        'corpus_seconds': round(corpus_seconds, 3),
+        'throughput_chunks_per_sec': round(len(corpus_texts) / corpus_seconds, 2),
+        'query_latency_ms_p50': round(float(np.percentile(latencies, 50)), 2),
+        'query_latency_ms_p95': round(float(np.percentile(latencies, 95)), 2),
+    }
+    print(f"[{name}] {stats}")
+    return {'stats': stats, 'corpus': corpus, 'queries': query_matrix}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare PyTorch and ONNX embedding backends")
+    parser.add_argument("--onnx-dir", required=True, help="Directory from export_onnx_embedder.py")
+    parser.add_argument("--chunks", default=str(ML_DIR / "processed" / "chunks" / "legal_chunks_delimiter_based.jsonl"))
+    parser.add_argument("--questions", default=str(PROJECT_ROOT / "Sample questions.md"))
+    parser.add_argument("--limit", type=int, default=None, help="Only embed the first N chunks")
+    parser.add_argument("-k", type=int, nargs="+", default=[1, 3, 5, 10])
+    parser.add_argument("--output", default=None, help="Write results JSON here")
+    args = parser.parse_args()
+
+    corpus_texts = load_chunk_texts(Path(args.chunks), args.limit)
+    questions = load_sample_questions(Path(args.questions))
+    print(f"Corpus: {len(corpus_texts)} chunks, {len(questions)} questions")
+
+    torch_run = benchmark_backend("torch", create_embedding_function("torch"), corpus_texts, questions)
+    onnx_run = benchmark_backend("onnx", create_embedding_function("onnx", onnx_dir=args.onnx_dir),
+                                 corpus_texts, questions)
+
+    recall = {}
+    for k in args.k:
+        reference = top_k(torch_run['queries'], torch_run['corpus'], k)
+        recall[f'recall@{k}'] = {
+            'onnx_reindexed': round(recall_at_k(reference, top_k(onnx_run['queries'], onnx_run['corpus'], k)), 4),
+            'onnx_query_on_torch_index': round(recall_at_k(reference, top_k(onnx_run['queries'], torch_run['corpus'], k)), 4),
+        }
+
+    agreement = float(np.mean(np.sum(torch_run['corpus'] * onnx_run['corpus'], axis=1)))
+
+    results = {
+        'corpus_size': len(corpus_texts),
+        'num_queries': len(questions),
+        'torch': torch_run['stats'],
+        'onnx': onnx_run['stats'],
+        'speedup_throughput': round(onnx_run['stats']['throughput_chunks_per_sec'] / torch_run['stats']['throughput_chunks_per_sec'], 2),
+        'speedup_query_p50': round(torch_run['stats']['query_latency_ms_p50'] / onnx_run['stats']['query_latency_ms_p50'], 2),
+        'mean_cosine_torch_vs_onnx': round(agreement, 4),
+        **recall,
+    }
+
+    print("\n" + json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Parallel cleaning + chunking pipeline for large legal corpora.
+
+Documents listed in a manifest (default: ml/data/manifest.json) are fanned
+out over a process pool. Each worker optionally cleans its file
+(clean_source_files.clean_legal_document), chunks it
+(delimiter_chunker.iter_legal_chunks) and streams the chunks to its own part
+file. The parent process never holds chunks in memory: it concatenates the
+part files in manifest order, so the output is the same for any worker count
+and memory stays flat however many acts are ingested.
+
+Provisions longer than --max-chunk-chars are split into children; their
+parents go to <output>.parents.jsonl (see delimiter_chunker.parents_path_for).
+
+Usage:
+    python ml/scripts/chunk_pipeline.py --clean
+    python ml/scripts/chunk_pipeline.py --manifest my_acts.json --input-dir ml/data/raw --workers 8
+
+Manifest: a JSON list (or {"documents": [...]}) of
+    {"file": "civilcode.txt", "act_name_ne": "नागरिक संहिता, २०७४", "act_name_en": "Civil Code, 2074"}
+Relative "file" paths are resolved against --input-dir.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from clean_source_files import clean_legal_document
+from delimiter_chunker import (DEFAULT_MANIFEST, DEFAULT_MAX_CHUNK_CHARS, is_parent_chunk, iter_legal_chunks,
+                               load_manifest, parents_path_for, slugify)
+
+ML_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_INPUT_DIR = ML_DIR / "data" / "raw"
+DEFAULT_OUTPUT = ML_DIR / "processed" / "chunks" / "legal_chunks_delimiter_based.jsonl"
+
+
+def process_document(index: int, entry: Dict[str, Any], input_dir: str, parts_dir: str,
+                     clean: bool, cleaned_dir: Optional[str],
+                     max_chunk_chars: Optional[int] = DEFAULT_MAX_CHUNK_CHARS) -> Dict[str, Any]:
+    """Worker: clean and chunk one document into parts_dir/<index>-<slug>.jsonl (+ .parents.jsonl)."""
+    started = time.perf_counter()
+    file_path = Path(input_dir) / entry['file']
+    stats = {'index': index, 'file': entry['file'], 'act_name_en': entry['act_name_en'],
+             'chunks': 0, 'parents': 0, 'chars': 0, 'part': None, 'skipped': False, 'error': None}
+    if not file_path.exists():
+        stats['skipped'] = True
+        return stats
+
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        stats['chars'] = len(content)
+        if clean:
+            content = clean_legal_document(content)
+            if cleaned_dir:
+                with open(Path(cleaned_dir) / file_path.name, 'w', encoding='utf-8') as f:
+                    f.write(content)
+
+        part_path = Path(parts_dir) / f"{index:05d}-{slugify(entry['act_name_en']) or 'document'}.jsonl"
+        with open(part_path, 'w', encoding='utf-8') as f, \
+                open(parents_path_for(part_path), 'w', encoding='utf-8') as parents:
+            for chunk in iter_legal_chunks(content, entry['act_name_ne'], file_path.name, max_chunk_chars):
+                if is_parent_chunk(chunk):
+                    parents.write(json.dumps(chunk, ensure_ascii=False) + '\n')
+                    stats['parents'] += 1
+                else:
+                    f.write(json.dumps(chunk, ensure_ascii=False) + '\n')
+                    stats['chunks'] += 1
+        stats['part'] = str(part_path)
+    except Exception as e:
+        stats['error'] = str(e)
+    stats['seconds'] = round(time.perf_counter() - started, 3)
+    return stats
+
+
+def run_pipeline(manifest_path: Path, input_dir: Path, output_path: Path, workers: Optional[int] = None,
+                 clean: bool = False, cleaned_dir: Optional[Path] = None,
+                 max_chunk_chars: Optional[int] = DEFAULT_MAX_CHUNK_CHARS) -> Dict[str, Any]:
+    documents = load_manifest(manifest_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    parts_dir = output_path.parent / f".{output_path.stem}.parts"
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    parts_dir.mkdir(parents=True)
+    if cleaned_dir:
+        cleaned_dir.mkdir(parents=True, exist_ok=True)
+
+    workers = workers or min(len(documents), os.cpu_count() or 1) or 1
+    print(f"Processing {len(documents)} documents with {workers} workers...")
+    results = [None] * len(documents)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(process_document, i, entry, str(input_dir), str(parts_dir), clean,
+                        str(cleaned_dir) if cleaned_dir else None, max_chunk_chars)
+            for i, entry in enumerate(documents)
+        ]
+        for future in as_completed(futures):
+            stats = future.result()
+            results[stats['index']] = stats
+            if stats['skipped']:
+                print(f"  Skipping {stats['file']} (not found)")
+            elif stats['error']:
+                print(f"  ✗ {stats['file']}: {stats['error']}")
+            else:
+                print(f"  ✓ {stats['file']}: {stats['chunks']} chunks ({stats['seconds']:.2f}s)")
+
+    # Concatenate in manifest order, then swap the outputs in atomically
+    for target, part_of in ((output_path, Path), (parents_path_for(output_path), parents_path_for)):
+        tmp_path = target.with_suffix(target.suffix + '.tmp')
+        with open(tmp_path, 'wb') as out:
+            for stats in results:
+                if stats['part']:
+                    with open(part_of(stats['part']), 'rb') as part:
+                        shutil.copyfileobj(part, out)
+        os.replace(tmp_path, target)
+    shutil.rmtree(parts_dir, ignore_errors=True)
+
+    return {
+        'output': str(output_path),
+        'documents': len(documents),
+        'processed': sum(1 for stats in results if stats['part']),
+        'skipped': [stats['file'] for stats in results if stats['skipped']],
+        'failed': [stats['file'] for stats in results if stats['error']],
+        'total_chunks': sum(stats['chunks'] for stats in results),
+        'total_parents': sum(stats['parents'] for stats in results),
+        'per_document': results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean and chunk legal documents in parallel")
+    parser.add_argument("--manifest", default=str(DEFAULT_MANIFEST), help="JSON list of documents to process")
+    parser.add_argument("--input-dir", default=str(DEFAULT_INPUT_DIR), help="Base directory for manifest files")
+    parser.add_argument("--output", default=str(DEFAULT_OUTPUT), help="Chunks JSONL to write")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--clean", action="store_true", help="Run clean_legal_document before chunking")
+    parser.add_argument("--cleaned-dir", default=None, help="Also write cleaned text here (with --clean)")
+    parser.add_argument("--max-chunk-chars", type=int, default=DEFAULT_MAX_CHUNK_CHARS,
+                        help="Split longer provisions into उपदफा/खण्ड children (0 disables)")
+    args = parser.parse_args()
+
+    print("PARALLEL LEGAL CHUNKING PIPELINE")
+    print("=" * 60)
+    start_time = time.time()
+    summary = run_pipeline(
+        Path(args.manifest),
+        Path(args.input_dir),
+        Path(args.output),
+        workers=args.workers,
+        clean=args.clean,
+        cleaned_dir=Path(args.cleaned_dir) if args.cleaned_dir else None,
+        max_chunk_chars=args.max_chunk_chars or None
+    )
+    print(f"\n{'=' * 60}")
+    print(f"Processed {summary['processed']}/{summary['documents']} documents, "
+          f"{summary['total_chunks']} chunks ({summary['total_parents']} provisions split) "
+          f"in {time.time() - start_time:.2f}s")
+    print(f"Output file: {summary['output']}")
+    if summary['skipped']:
+        print(f"Skipped (not found): {', '.join(summary['skipped'])}")
+    if summary['failed']:
+        print(f"Failed: {', '.join(summary['failed'])}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,31 +3,45 @@ Clean legal document source files:
 1. Remove www.lawcommission.gov.np references
 2. Add newlines before section headers (धारा, दफा, नियम)
 3. Normalize spacing
+
+Usage: python ml/scripts/clean_source_files.py [--source-dir ml/data/cleaned]
+Files are cleaned in place. To clean and chunk many documents in parallel,
+use chunk_pipeline.py --clean.
 """
 
-import os
+import argparse
 import re
 from pathlib import Path
 
+DEFAULT_SOURCE_DIR = Path(__file__).resolve().parent.parent / "data" / "cleaned"
+
+# Compiled once; chunk_pipeline.py workers call clean_legal_document per file
+_LAWCOMMISSION_RE = re.compile(r'www\.lawcommission\.\s*gov\.np\s*\d*', re.IGNORECASE)
+# Match: (not newline)(धारा|दफा|नियम)(whitespace)(numbers)
+_INLINE_SECTION_RE = re.compile(r'([^\n])\s*(धारा|दफा|नियम)\s+([\d०-९]+)')
+_LEADING_SECTION_RE = re.compile(r'^(धारा|दफा|नियम)\s+([\d०-९]+)')
+_EXTRA_SPACES_RE = re.compile(r' {3,}')
+_EXTRA_NEWLINES_RE = re.compile(r'\n{3,}')
+
+
 def clean_legal_document(content: str) -> str:
     """Clean and format legal document text."""
     
     # Remove www.lawcommission.gov.np and variations
-    content = re.sub(r'www\.lawcommission\.\s*gov\.np\s*\d*', '', content, flags=re.IGNORECASE)
+    content = _LAWCOMMISSION_RE.sub('', content)
     
     # Add double newline BEFORE section headers to ensure they start on new lines
-    # Match: (not newline)(धारा|दफा|नियम)(whitespace)(numbers)
     # Replace with: (captured text)(newlines)(section marker)(space)(number)
-    content = re.sub(r'([^\n])\s*(धारा|दफा|नियम)\s+([\d०-९]+)', r'\1\n\n\2 \3', content)
+    content = _INLINE_SECTION_RE.sub(r'\1\n\n\2 \3', content)
     
     # Also handle cases where section marker is at the very beginning
-    content = re.sub(r'^(धारा|दफा|नियम)\s+([\d०-९]+)', r'\1 \2', content)
+    content = _LEADING_SECTION_RE.sub(r'\1 \2', content)
     
     # Remove multiple consecutive spaces (but keep intentional spacing)
-    content = re.sub(r' {3,}', '  ', content)
+    content = _EXTRA_SPACES_RE.sub('  ', content)
     
     # Remove multiple consecutive newlines (max 2)
-    content = re.sub(r'\n{3,}', '\n\n', content)
+    content = _EXTRA_NEWLINES_RE.sub('\n\n', content)
     
     # Clean up beginning and end
     content = content.strip()
@@ -35,11 +49,10 @@ def clean_legal_document(content: str) -> str:
     return content
 
 
-def process_files():
+def process_files(source_dir: Path = DEFAULT_SOURCE_DIR):
     """Process all legal document files."""
     
-    # Paths
-    source_dir = Path("D:/okil ai/ml/data/cleaned")
+    source_dir = Path(source_dir)
     
     if not source_dir.exists():
         print(f"❌ Source directory not found: {source_dir}")
@@ -93,4 +106,7 @@ def process_files():
 
 
 if __name__ == "__main__":
-    process_files()
+    parser = argparse.ArgumentParser(description="Clean legal document source files in place")
+    parser.add_argument("--source-dir", default=str(DEFAULT_SOURCE_DIR), help="Directory with .txt files")
+    args = parser.parse_args()
+    process_files(Path(args.source_dir))
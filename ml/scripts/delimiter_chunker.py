@@ -7,21 +7,54 @@ Processes Nepali legal documents by splitting on structural markers (धार
 import re
 import json
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 import unicodedata
 
+# Patterns are compiled once per process; the parallel pipeline
+# (chunk_pipeline.py) reuses them in every worker
+_URL_RE = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
+_EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+_PAGE_EN_RE = re.compile(r'(?i)page\s*\d+')
+_PAGE_NE_RE = re.compile(r'पृष्ठ\s*[०-९\d]+')
+_EXTRA_NEWLINES_RE = re.compile(r'\n{3,}')
+_EXTRA_SPACES_RE = re.compile(r' {2,}')
+_CONTROL_CHARS_RE = re.compile(r'[\f\r\v]')
+_SLUG_INVALID_RE = re.compile(r'[^\w\s-]')
+_SLUG_SEPARATOR_RE = re.compile(r'[-\s]+')
+_NEPALI_DIGITS = str.maketrans('०१२३४५६७८९', '0123456789')
+
+# Matches: धारा/दफा/नियम (or Article/Section/Rule in English texts) at START of line only
+# ^ matches start of line in MULTILINE mode
+# This prevents matching cross-references like "see धारा २०, २१, २२"
+DELIMITER_PATTERN = r'^(धारा|दफा|नियम|Article|Section|Rule)\s*([\d०-९]+)'
+_DELIMITER_RE = re.compile(DELIMITER_PATTERN, re.MULTILINE)
+
+# English headings share the Nepali section type, so "Article 76" of the English
+# constitution aligns with धारा ७६ of the Nepali one (same section_type_ne/section_number)
+_SECTION_TYPE_NE = {'Article': 'धारा', 'Section': 'दफा', 'Rule': 'नियम'}
+
+# Documents to chunk: [{"file", "act_name_ne", "act_name_en"}, ...]
+DEFAULT_MANIFEST = Path(__file__).resolve().parent.parent / "data" / "manifest.json"
+
+# Hierarchical sub-chunking of oversized provisions. A marker starts a line or
+# follows "।" / ":" / "ः" (inline lists in PDF-extracted text):
+#   level 1 उपदफा  (१) (२) ... / (1) (2) ...
+#   level 2 खण्ड    (क) (ख) ... / (a) (b) ...
+# Pieces still too long after level 2 (e.g. tariff schedules) are split at
+# sentence ends and line breaks.
+DEFAULT_MAX_CHUNK_CHARS = 1500
+DEFAULT_MIN_CHUNK_CHARS = 300
+_MARKER_BOUNDARY = r'(?:^|(?<=[\n।:ः]))[ \t]*'
+_SUBSECTION_RES = [
+    re.compile(_MARKER_BOUNDARY + r'\(([०-९\d]{1,3})\)', re.MULTILINE),
+    re.compile(_MARKER_BOUNDARY + r'\(([\u0915-\u0939]\u093c?|[a-z])\)', re.MULTILINE),
+]
+_SENTENCE_END_RE = re.compile(r'(?<=[।\n])')
+
 
 def normalize_nepali_number(text: str) -> str:
     """Convert Nepali numerals (०-९) to English numerals (0-9)."""
-    nepali_to_english = {
-        '०': '0', '१': '1', '२': '2', '३': '3', '४': '4',
-        '५': '5', '६': '6', '७': '7', '८': '8', '९': '9'
-    }
-    
-    for nepali, english in nepali_to_english.items():
-        text = text.replace(nepali, english)
-    
-    return text
+    return text.translate(_NEPALI_DIGITS)
 
 
 def slugify(text: str) -> str:
@@ -31,8 +64,8 @@ def slugify(text: str) -> str:
     # Convert to lowercase
     text = text.lower()
     # Replace spaces and special chars with hyphens
-    text = re.sub(r'[^\w\s-]', '', text)
-    text = re.sub(r'[-\s]+', '-', text)
+    text = _SLUG_INVALID_RE.sub('', text)
+    text = _SLUG_SEPARATOR_RE.sub('-', text)
     # Remove leading/trailing hyphens
     text = text.strip('-')
     return text
@@ -41,53 +74,136 @@ def slugify(text: str) -> str:
 def preprocess_text(content: str) -> str:
     """Clean and preprocess legal document text."""
     # Remove URLs
-    content = re.sub(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', content)
+    content = _URL_RE.sub('', content)
     
     # Remove email addresses
-    content = re.sub(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', '', content)
+    content = _EMAIL_RE.sub('', content)
     
     # Remove page numbers (common patterns)
-    content = re.sub(r'(?i)page\s*\d+', '', content)
-    content = re.sub(r'पृष्ठ\s*[०-९\d]+', '', content)
+    content = _PAGE_EN_RE.sub('', content)
+    content = _PAGE_NE_RE.sub('', content)
     
     # Remove excessive newlines (more than 2 consecutive)
-    content = re.sub(r'\n{3,}', '\n\n', content)
+    content = _EXTRA_NEWLINES_RE.sub('\n\n', content)
     
     # Remove excessive spaces
-    content = re.sub(r' {2,}', ' ', content)
+    content = _EXTRA_SPACES_RE.sub(' ', content)
     
     # Remove form feed and other control characters
-    content = re.sub(r'[\f\r\v]', '', content)
+    content = _CONTROL_CHARS_RE.sub('', content)
     
     return content.strip()
 
 
-def extract_legal_chunks(file_content: str, act_name_ne: str, file_name: str) -> List[Dict[str, Any]]:
+def _pack(pieces: List[Tuple[str, str]], max_chars: int) -> List[Tuple[str, str]]:
+    """Greedily merge consecutive (label, text) pieces into windows of at most max_chars."""
+    packed: List[Tuple[str, str]] = []
+    for label, text in pieces:
+        if packed and len(packed[-1][1]) + len(text) + 1 <= max_chars:
+            first_label = packed[-1][0].split('-')[0]
+            merged_label = f"{first_label}-{label}" if first_label and label and first_label != label else (first_label or label)
+            packed[-1] = (merged_label, packed[-1][1] + '\n' + text)
+        else:
+            packed.append((label, text))
+    return packed
+
+
+def _split_sentences(text: str, max_chars: int) -> List[Tuple[str, str]]:
+    pieces = []
+    for sentence in _SENTENCE_END_RE.split(text):
+        sentence = sentence.strip()
+        # A single sentence longer than the limit is cut at the last space
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(' ', 0, max_chars)
+            cut = cut if cut > max_chars // 2 else max_chars
+            pieces.append(('', sentence[:cut].strip()))
+            sentence = sentence[cut:].strip()
+        if sentence:
+            pieces.append(('', sentence))
+    return _pack(pieces, max_chars)
+
+
+def split_provision(text: str, max_chars: int = DEFAULT_MAX_CHUNK_CHARS, level: int = 0,
+                    prefix: str = '') -> List[Tuple[str, str]]:
+    """
+    Split an oversized provision into (label, text) children at उपदफा, then
+    खण्ड, then sentence boundaries. Labels look like "(२)", "(२)(क)-(ग)".
     """
-    Extract legal chunks from Nepali legal documents based on delimiters.
+    if len(text) <= max_chars:
+        return [(prefix, text)]
+    if level >= len(_SUBSECTION_RES):
+        return [(prefix, piece) for _, piece in _split_sentences(text, max_chars)]
+
+    matches = list(_SUBSECTION_RES[level].finditer(text))
+    if len(matches) < 2:
+        return split_provision(text, max_chars, level + 1, prefix)
+
+    pieces: List[Tuple[str, str]] = []
+    intro = text[:matches[0].start()].strip()
+    if intro:
+        pieces.extend(split_provision(intro, max_chars, level + 1, prefix))
+    for j, match in enumerate(matches):
+        end = matches[j + 1].start() if j + 1 < len(matches) else len(text)
+        label = f"{prefix}({match.group(1)})"
+        pieces.extend(split_provision(text[match.start():end].strip(), max_chars, level + 1, label))
+    return _pack(pieces, max_chars)
+
+
+def _merge_small(children: List[Tuple[str, str]], min_chars: int, max_chars: int) -> List[Tuple[str, str]]:
+    """Fold children shorter than min_chars into a neighbour, if the result stays within max_chars."""
+    merged: List[Tuple[str, str]] = []
+    for label, text in children:
+        fits = merged and len(merged[-1][1]) + len(text) + 1 <= max_chars
+        if fits and len(text) < min_chars:
+            prev_label, prev_text = merged[-1]
+            merged[-1] = (prev_label.split('-')[0] + ('-' + label if label else ''), prev_text + '\n' + text)
+        elif fits and len(merged[-1][1]) < min_chars:
+            prev_label, prev_text = merged[-1]
+            merged[-1] = ((prev_label + '-' if prev_label else '') + label, prev_text + '\n' + text)
+        else:
+            merged.append((label, text))
+    return merged
+
+
+def is_parent_chunk(chunk: Dict[str, Any]) -> bool:
+    """Parents go to the parent store (not embedded); everything else is retrievable."""
+    return chunk['metadata'].get('chunk_level') == 'parent'
+
+
+def parents_path_for(chunks_path: Path) -> Path:
+    """Parent store next to a chunks file: legal_chunks.jsonl -> legal_chunks.parents.jsonl."""
+    chunks_path = Path(chunks_path)
+    return chunks_path.with_name(f"{chunks_path.stem}.parents.jsonl")
+
+
+def iter_legal_chunks(file_content: str, act_name_ne: str, file_name: str,
+                      max_chunk_chars: Optional[int] = None,
+                      min_chunk_chars: int = DEFAULT_MIN_CHUNK_CHARS) -> Iterator[Dict[str, Any]]:
+    """
+    Yield legal chunks from a Nepali legal document based on delimiters.
     
     Args:
         file_content: The raw text content of the legal document
         act_name_ne: The name of the act in Nepali (e.g., 'आर्थिक ऐन, २०८२')
         file_name: The source file name (e.g., 'financial_act_cleaned.txt')
+        max_chunk_chars: If set, provisions longer than this are yielded as a
+            parent (metadata chunk_level='parent') followed by its children
+            (chunk_level='child', parent_id, child_index, subsection). Each
+            child starts with the provision's heading line.
+        min_chunk_chars: Children shorter than this are merged with a neighbour
     
-    Returns:
-        List of dictionaries, each representing a legal provision chunk
+    Yields:
+        Dictionaries, each representing a legal provision chunk
     """
     
     # Preprocess the content
     content = preprocess_text(file_content)
     
-    # Define the delimiter pattern
-    # Matches: धारा/दफा/नियम at START of line only (prevents matching in-text references)
-    # ^ matches start of line in MULTILINE mode
-    # This prevents matching cross-references like "see धारा २०, २१, २२"
-    delimiter_pattern = r'^(धारा|दफा|नियम)\s*([\d०-९]+)'
-    
     # Find all delimiter matches with their positions
     delimiter_matches = []
-    for match in re.finditer(delimiter_pattern, content, re.MULTILINE):
-        section_type = match.group(1)  # धारा, दफा, or नियम
+    for match in _DELIMITER_RE.finditer(content):
+        section_label = match.group(1)  # धारा, दफा, नियम (or Article, Section, Rule)
+        section_type = _SECTION_TYPE_NE.get(section_label, section_label)
         section_number = match.group(2)  # The numeral
         
         # Normalize the section number to English numerals
@@ -95,6 +211,7 @@ def extract_legal_chunks(file_content: str, act_name_ne: str, file_name: str) ->
         
         delimiter_matches.append({
             'section_type': section_type,
+            'section_label': section_label,
             'section_number_original': section_number,
             'section_number': section_number_normalized,
             'start_pos': match.start(),
@@ -105,12 +222,12 @@ def extract_legal_chunks(file_content: str, act_name_ne: str, file_name: str) ->
         print(f"Warning: No delimiters found in {file_name}")
         print(f"  Content length: {len(content)} chars")
         print(f"  Newlines: {content.count(chr(10))}")
-        print(f"  Pattern: {delimiter_pattern}")
-        return []
+        print(f"  Pattern: {DELIMITER_PATTERN}")
+        return
     
-    # Extract chunks between delimiters
-    chunks = []
+    act_slug = slugify(act_name_ne)
     
+    # Extract chunks between delimiters
     for i, delimiter_info in enumerate(delimiter_matches):
         # Determine the chunk boundaries
         chunk_start = delimiter_info['start_pos']
@@ -129,8 +246,7 @@ def extract_legal_chunks(file_content: str, act_name_ne: str, file_name: str) ->
             continue
         
         # Generate a unique, slugified ID
-        act_slug = slugify(act_name_ne)
-        section_type_slug = slugify(delimiter_info['section_type'])
+        section_type_slug = slugify(delimiter_info['section_label'])
         section_num = delimiter_info['section_number']
         # Add chunk index to ensure uniqueness (in case same article appears multiple times)
         chunk_id = f"{act_slug}-{section_type_slug}-{section_num}-{i}"
@@ -143,31 +259,94 @@ def extract_legal_chunks(file_content: str, act_name_ne: str, file_name: str) ->
             'section_number_original': delimiter_info['section_number_original'],
             'source_file': file_name,
             'chunk_index': i,
-            'citation_reference': f"{act_name_ne}, {delimiter_info['section_type']} {delimiter_info['section_number_original']}"
+            'citation_reference': f"{act_name_ne}, {delimiter_info['section_label']} {delimiter_info['section_number_original']}"
         }
         
-        # Create the chunk dictionary
-        chunk = {
-            'id': chunk_id,
-            'text_chunk': chunk_text,
-            'metadata': metadata
-        }
+        if not max_chunk_chars or len(chunk_text) <= max_chunk_chars:
+            # Create the chunk dictionary
+            yield {
+                'id': chunk_id,
+                'text_chunk': chunk_text,
+                'metadata': metadata
+            }
+            continue
         
-        chunks.append(chunk)
+        yield from _hierarchical_chunks(chunk_id, chunk_text, metadata, max_chunk_chars, min_chunk_chars)
+
+
+def _hierarchical_chunks(parent_id: str, text: str, metadata: Dict[str, Any],
+                         max_chars: int, min_chars: int) -> Iterator[Dict[str, Any]]:
+    heading, _, body = text.partition('\n')
+    if len(heading) > 200:
+        # Heading and body on one line (PDF text); keep the first clause as the heading
+        heading = heading[:heading.find(' ', 120) if heading.find(' ', 120) > 0 else 200]
+        body = text[len(heading):]
+    heading = heading.strip()
+    body_chars = max_chars - len(heading) - 1
+    children = _merge_small(split_provision(body.strip(), body_chars), min_chars, body_chars)
     
-    return chunks
+    yield {
+        'id': parent_id,
+        'text_chunk': text,
+        'metadata': {**metadata, 'chunk_level': 'parent', 'num_children': len(children)}
+    }
+    for j, (label, child_text) in enumerate(children):
+        child_metadata = {
+            **metadata,
+            'chunk_level': 'child',
+            'parent_id': parent_id,
+            'child_index': j,
+            'subsection': label,
+            # Characters of repeated heading to drop when children are joined again
+            'heading_chars': len(heading) + 1,
+        }
+        if label:
+            child_metadata['citation_reference'] = f"{metadata['citation_reference']} {label}"
+        yield {
+            'id': f"{parent_id}-c{j}",
+            'text_chunk': f"{heading}\n{child_text}",
+            'metadata': child_metadata
+        }
+
+
+def extract_legal_chunks(file_content: str, act_name_ne: str, file_name: str,
+                         max_chunk_chars: Optional[int] = None) -> List[Dict[str, Any]]:
+    """List version of iter_legal_chunks."""
+    return list(iter_legal_chunks(file_content, act_name_ne, file_name, max_chunk_chars))
+
 
+def load_manifest(path: Optional[Path] = None) -> List[Dict[str, Any]]:
+    """
+    Load the documents to chunk.
+    
+    The manifest is a JSON list (or {"documents": [...]}) of entries with
+    'file', 'act_name_ne' and 'act_name_en'. Relative 'file' paths are
+    resolved against the input directory by the caller.
+    """
+    path = Path(path or DEFAULT_MANIFEST)
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    documents = manifest['documents'] if isinstance(manifest, dict) else manifest
+    for entry in documents:
+        missing = [key for key in ('file', 'act_name_ne') if not entry.get(key)]
+        if missing:
+            raise ValueError(f"Manifest entry {entry} in {path} is missing {', '.join(missing)}")
+        entry.setdefault('act_name_en', entry['act_name_ne'])
+    return documents
 
-def process_legal_document(file_path: Path, act_name_ne: str) -> List[Dict[str, Any]]:
+
+def process_legal_document(file_path: Path, act_name_ne: str,
+                           max_chunk_chars: Optional[int] = DEFAULT_MAX_CHUNK_CHARS) -> List[Dict[str, Any]]:
     """
     Process a legal document file and extract chunks.
     
     Args:
         file_path: Path to the legal document file
         act_name_ne: The name of the act in Nepali
+        max_chunk_chars: Provisions above this are split into children (None disables)
     
     Returns:
-        List of chunk dictionaries
+        List of chunk dictionaries (parents included, see is_parent_chunk)
     """
     print(f"Processing: {file_path.name}")
     
@@ -175,7 +354,7 @@ def process_legal_document(file_path: Path, act_name_ne: str) -> List[Dict[str,
         with open(file_path, 'r', encoding='utf-8') as f:
             content = f.read()
         
-        chunks = extract_legal_chunks(content, act_name_ne, file_path.name)
+        chunks = extract_legal_chunks(content, act_name_ne, file_path.name, max_chunk_chars)
         print(f"  ✓ Extracted {len(chunks)} chunks from {file_path.name}")
         
         return chunks
@@ -199,39 +378,8 @@ def main():
     output_dir = base_dir / "processed" / "chunks"
     output_dir.mkdir(parents=True, exist_ok=True)
     
-    # Define documents to process with their Nepali act names
-    documents_config = [
-        {
-            'file': 'civilcode.txt',
-            'act_name_ne': 'नागरिक संहिता, २०७४',
-            'act_name_en': 'Civil Code, 2074'
-        },
-        {
-            'file': 'Constitution_Nepali.txt',
-            'act_name_ne': 'नेपालको संविधान, २०७२',
-            'act_name_en': 'Constitution of Nepal, 2072'
-        },
-        {
-            'file': 'constitution_english.txt',
-            'act_name_ne': 'Constitution of Nepal, 2072',
-            'act_name_en': 'Constitution of Nepal, 2072'
-        },
-        {
-            'file': 'Financial_Act.txt',
-            'act_name_ne': 'आर्थिक ऐन, २०८२',
-            'act_name_en': 'Financial Act, 2082'
-        },
-        {
-            'file': 'Land_use_act.txt',
-            'act_name_ne': 'भूमि उपयोग ऐन, २०७६',
-            'act_name_en': 'Land Use Act, 2076'
-        },
-        {
-            'file': 'Property_Tax.txt',
-            'act_name_ne': 'सम्पत्ति कर ऐन, २०७९',
-            'act_name_en': 'Property Tax Act, 2079'
-        }
-    ]
+    # Documents to process with their Nepali act names (ml/data/manifest.json)
+    documents_config = load_manifest()
     
     all_chunks = []
     stats = {}
@@ -248,23 +396,30 @@ def main():
         if chunks:
             all_chunks.extend(chunks)
             stats[doc_config['act_name_en']] = {
-                'total_chunks': len(chunks),
+                'total_chunks': sum(1 for chunk in chunks if not is_parent_chunk(chunk)),
                 'file': doc_config['file']
             }
     
-    # Save all chunks to a JSONL file
+    # Save retrievable chunks to a JSONL file and split provisions' parents next to it
     if all_chunks:
         output_file = output_dir / "legal_chunks_delimiter_based.jsonl"
+        parents_file = parents_path_for(output_file)
+        parents = [chunk for chunk in all_chunks if is_parent_chunk(chunk)]
+        all_chunks = [chunk for chunk in all_chunks if not is_parent_chunk(chunk)]
         
         with open(output_file, 'w', encoding='utf-8') as f:
             for chunk in all_chunks:
                 f.write(json.dumps(chunk, ensure_ascii=False) + '\n')
+        with open(parents_file, 'w', encoding='utf-8') as f:
+            for chunk in parents:
+                f.write(json.dumps(chunk, ensure_ascii=False) + '\n')
         
         print(f"\n{'=' * 60}")
         print("CHUNKING COMPLETE!")
         print(f"{'=' * 60}")
         print(f"\nTotal chunks extracted: {len(all_chunks)}")
         print(f"Output file: {output_file}")
+        print(f"Oversized provisions split into children: {len(parents)} (parents in {parents_file})")
         
         print(f"\nStatistics by Document:")
         for doc_name, doc_stats in stats.items():
@@ -2,17 +2,54 @@
 """
 Legal Document Embedding Generator (V2 - ChromaDB & E5-Large)
 Creates and stores embeddings in a persistent ChromaDB collection.
+
+Modes:
+    sync     (default) hash every chunk's text and metadata, upsert only new or
+             changed chunks and delete chunk IDs that are no longer in the file
+    rebuild  drop the collection and embed every chunk again
+
+Usage:
+    python ml/scripts/embedding_generator_v2.py                  # incremental sync
+    python ml/scripts/embedding_generator_v2.py --dry-run        # print the diff only
+    python ml/scripts/embedding_generator_v2.py --mode rebuild --yes
+    python ml/scripts/embedding_generator_v2.py --mode rebuild --yes --resume
+    python ml/scripts/embedding_generator_v2.py --retry-dead-letter
+
+Chunks are streamed from the JSONL file and ingested by streaming_ingest.py:
+adaptive, memory-bounded batches, embedding pipelined with the Chroma write,
+a checkpoint (ml/embeddings/ingest_checkpoint.json) and a dead-letter file
+(ml/embeddings/dead_letter.jsonl) for batches that fail after retries.
 """
 
+import argparse
+import hashlib
 import json
+import os
+import sys
 import chromadb
-from chromadb.utils import embedding_functions
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Iterable, Optional
 import time
 
+# Share the embedding backends with the backend API so both embed identically
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent / "backend"))
+from app.embedding_backends import DEFAULT_MODEL_NAME, create_embedding_function
+from streaming_ingest import AdaptiveBatcher, DeadLetterFile, IngestCheckpoint, Item, StreamingIngestor
+
+# Metadata key holding the chunk's content hash in the collection
+HASH_KEY = "content_hash"
+
+
+def content_hash(chunk: Dict[str, Any]) -> str:
+    """Stable hash of a chunk's text and metadata (key order does not matter)."""
+    metadata = {k: v for k, v in chunk['metadata'].items() if k != HASH_KEY}
+    payload = json.dumps({'text': chunk['text'], 'metadata': metadata},
+                         ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
 class LegalEmbeddingGenerator:
-    def __init__(self, base_dir: str = None):
+    def __init__(self, base_dir: str = None, chunks_file: Optional[str] = None):
         # Use dynamic path resolution if base_dir not provided
         if base_dir is None:
             script_dir = Path(__file__).resolve().parent
@@ -21,13 +58,17 @@ class LegalEmbeddingGenerator:
             self.base_dir = Path(base_dir)
             
         self.chunks_dir = self.base_dir / "processed" / "chunks"
+        self.chunks_file = Path(chunks_file) if chunks_file else self.chunks_dir / "legal_chunks_delimiter_based.jsonl"
         self.db_dir = self.base_dir / "embeddings" / "chroma_db_v2"
+        self.checkpoint_path = self.base_dir / "embeddings" / "ingest_checkpoint.json"
+        self.dead_letter_path = self.base_dir / "embeddings" / "dead_letter.jsonl"
         
         # Create directories
         self.db_dir.mkdir(parents=True, exist_ok=True)
         
         # Embedding Model
-        self.model_name = "intfloat/multilingual-e5-large"
+        self.model_name = DEFAULT_MODEL_NAME
+        self.backend = os.getenv("EMBEDDING_BACKEND", "torch")
         self.collection_name = "legal_corpus_v2"
         
         # Initialize ChromaDB client and collection
@@ -35,8 +76,9 @@ class LegalEmbeddingGenerator:
         self.client = chromadb.PersistentClient(path=str(self.db_dir))
         
         # Use SentenceTransformerEmbeddingFunction for on-the-fly embedding
-        print(f"Loading embedding model: {self.model_name}...")
-        self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
+        print(f"Loading embedding model: {self.model_name} ({self.backend})...")
+        self.embedding_function = create_embedding_function(
+            backend=self.backend,
             model_name=self.model_name,
             device="cpu"  # Change to "cuda" if you have a CUDA-enabled GPU
         )
@@ -49,91 +91,224 @@ class LegalEmbeddingGenerator:
         )
         print("ChromaDB collection initialized.")
 
-    def load_chunks(self) -> List[Dict[str, Any]]:
-        """Load processed chunks from the delimiter-based JSONL file."""
-        chunks_file = self.chunks_dir / "legal_chunks_delimiter_based.jsonl"
+    def iter_chunks(self) -> Iterator[Item]:
+        """Stream (line number, chunk) pairs from the delimiter-based JSONL file."""
+        chunks_file = self.chunks_file
         
         if not chunks_file.exists():
             raise FileNotFoundError(f"Chunks file not found: {chunks_file}. Run delimiter_chunker.py first.")
         
-        chunks = []
-        print(f"Loading chunks from {chunks_file}...")
-        
         with open(chunks_file, 'r', encoding='utf-8') as f:
-            for line in f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
                 try:
-                    chunk_data = json.loads(line.strip())
-                    # Normalize chunk structure for ChromaDB
-                    normalized_chunk = {
-                        'chunk_id': chunk_data['id'],
-                        'text': chunk_data['text_chunk'],
-                        'metadata': chunk_data['metadata']
-                    }
-                    chunks.append(normalized_chunk)
+                    chunk_data = json.loads(line)
                 except json.JSONDecodeError:
-                    print(f"Warning: Skipping malformed line in {chunks_file}")
+                    print(f"Warning: Skipping malformed line {line_no} in {chunks_file}")
+                    continue
+                # Normalize chunk structure for ChromaDB
+                normalized_chunk = {
+                    'chunk_id': chunk_data['id'],
+                    'text': chunk_data['text_chunk'],
+                    'metadata': chunk_data['metadata']
+                }
+                normalized_chunk['metadata'][HASH_KEY] = content_hash(normalized_chunk)
+                yield line_no, normalized_chunk
+
+    def load_chunks(self) -> List[Dict[str, Any]]:
+        """Load all processed chunks into memory (the ingestion path streams instead)."""
+        return [chunk for _, chunk in self.iter_chunks()]
+
+    def existing_hashes(self, page_size: int = 1000) -> Dict[str, Optional[str]]:
+        """Chunk ID -> stored content hash (None for chunks embedded before hashing)."""
+        hashes = {}
+        offset = 0
+        while True:
+            page = self.collection.get(include=['metadatas'], limit=page_size, offset=offset)
+            for chunk_id, metadata in zip(page['ids'], page['metadatas']):
+                hashes[chunk_id] = (metadata or {}).get(HASH_KEY)
+            if len(page['ids']) < page_size:
+                return hashes
+            offset += page_size
+
+    def plan_sync(self) -> Dict[str, Any]:
+        """One streaming pass: classify chunk IDs as added / changed / unchanged / removed.
+
+        Only IDs, hashes and line numbers are kept, not chunk text. When an ID
+        appears twice in the file, the last occurrence wins.
+        """
+        existing = self.existing_hashes()
+        latest: Dict[str, tuple] = {}
+        lines = 0
+        for line_no, chunk in self.iter_chunks():
+            latest[chunk['chunk_id']] = (line_no, chunk['metadata'][HASH_KEY],
+                                         chunk['metadata'].get('act_name_ne') or chunk['metadata'].get('source_file', 'unknown'))
+            lines += 1
+        if lines != len(latest):
+            print(f"Warning: {lines - len(latest)} duplicate chunk IDs, keeping the last occurrence")
+
+        diff = {'added': [], 'changed': [], 'unchanged': [], 'removed': [], 'embed_lines': set(), 'by_act': {}}
+        for chunk_id, (line_no, chunk_hash, act) in latest.items():
+            stored = existing.get(chunk_id, False)
+            if stored == chunk_hash:
+                diff['unchanged'].append(chunk_id)
+                continue
+            diff['added' if stored is False else 'changed'].append(chunk_id)
+            diff['embed_lines'].add(line_no)
+            diff['by_act'][act] = diff['by_act'].get(act, 0) + 1
+        diff['removed'] = sorted(chunk_id for chunk_id in existing if chunk_id not in latest)
+        return diff
+
+    @staticmethod
+    def print_diff(diff: Dict[str, Any]):
+        print("\nSync plan:")
+        print(f"   + added:     {len(diff['added'])}")
+        print(f"   ~ changed:   {len(diff['changed'])}")
+        print(f"   - removed:   {len(diff['removed'])}")
+        print(f"   = unchanged: {len(diff['unchanged'])}")
+        for act, count in sorted(diff['by_act'].items(), key=lambda item: -item[1]):
+            print(f"     {count:4d} to embed from {act}")
+
+    def delete_chunks(self, chunk_ids: List[str], batch_size: int = 500):
+        for i in range(0, len(chunk_ids), batch_size):
+            self.collection.delete(ids=chunk_ids[i:i + batch_size])
+        if chunk_ids:
+            print(f"  - Deleted {len(chunk_ids)} removed chunks")
+
+    def ingest(self, items: Iterable[Item], checkpoint: Optional[IngestCheckpoint] = None,
+               start_after: int = 0, dead_letter_path: Optional[Path] = None) -> Dict[str, Any]:
+        """Stream chunks through embedding and upsert (new IDs are added, existing ones replaced)."""
+        print(f"\nUpserting chunks into ChromaDB collection '{self.collection_name}'...")
+        ingestor = StreamingIngestor(
+            self.collection,
+            self.embedding_function,
+            batcher=AdaptiveBatcher(max_batch_size=int(os.getenv("EMBEDDING_MAX_BATCH", "64"))),
+            checkpoint=checkpoint,
+            dead_letter=DeadLetterFile(dead_letter_path or self.dead_letter_path),
+            max_retries=int(os.getenv("EMBEDDING_MAX_RETRIES", "3"))
+        )
+        stats = ingestor.run(items, start_after=start_after)
         
-        print(f"Loaded {len(chunks)} chunks.")
-        return chunks
+        print(f"\nWrote {stats['written']} chunks in {stats['batches']} batches ({stats['seconds']}s; "
+              f"embed {stats['embed_seconds']:.1f}s, write {stats['write_seconds']:.1f}s, "
+              f"{stats['retries']} retries, {stats['memory_splits']} memory splits)")
+        if stats['dead_lettered']:
+            print(f"{stats['dead_lettered']} chunks failed and were written to {ingestor.dead_letter.path}; "
+                  f"replay them with --retry-dead-letter")
+        return stats
 
     def add_chunks_to_db(self, chunks: List[Dict[str, Any]]):
-        """Adds chunks to the ChromaDB collection in batches."""
+        """Upserts in-memory chunks into the ChromaDB collection."""
         if not chunks:
             print("No chunks to add.")
             return
+        self.ingest(enumerate(chunks, 1))
 
-        print(f"\nAdding {len(chunks)} chunks to ChromaDB collection '{self.collection_name}'...")
-        
-        batch_size = 50  # Process in batches to manage memory
-        for i in range(0, len(chunks), batch_size):
-            batch = chunks[i:i + batch_size]
-            
-            # Prepare data for ChromaDB
-            ids = [chunk['chunk_id'] for chunk in batch]
-            documents = [chunk['text'] for chunk in batch]
-            metadatas = [chunk['metadata'] for chunk in batch]
-            
-            # Add to collection
-            # The embedding function will automatically handle embedding generation
-            try:
-                self.collection.add(
-                    ids=ids,
-                    documents=documents,
-                    metadatas=metadatas
-                )
-                print(f"  - Added batch {i // batch_size + 1}/{(len(chunks) + batch_size - 1) // batch_size} ({len(batch)} chunks)")
-            except Exception as e:
-                print(f"  - Error adding batch {i // batch_size + 1}: {e}")
-                # Optional: add retry logic here
+    def retry_dead_letter(self) -> Dict[str, Any]:
+        """Replay the dead-letter file; chunks that fail again are written to a fresh one.
+
+        A replay file left by a crashed retry is replayed too, never overwritten.
+        """
+        replay_path = self.dead_letter_path.with_suffix('.retrying.jsonl')
+        if replay_path.exists():
+            print(f"Resuming interrupted retry from {replay_path}")
+            if self.dead_letter_path.exists():
+                # Upserts are idempotent, so chunks present in both files are harmless
+                with open(replay_path, 'a', encoding='utf-8') as replay, \
+                        open(self.dead_letter_path, 'r', encoding='utf-8') as dead_letter:
+                    for line in dead_letter:
+                        replay.write(line)
+                self.dead_letter_path.unlink()
+        elif self.dead_letter_path.exists():
+            os.replace(self.dead_letter_path, replay_path)
+        else:
+            print("No dead-letter file; nothing to retry.")
+            return {'written': 0, 'dead_lettered': 0}
+        stats = self.ingest(DeadLetterFile(replay_path).read())
+        replay_path.unlink()
+        return stats
+
+    def reset_collection(self):
+        print("Clearing existing collection...")
+        self.client.delete_collection(name=self.collection_name)
+        self.collection = self.client.get_or_create_collection(
+            name=self.collection_name,
+            embedding_function=self.embedding_function,
+            metadata={"hnsw:space": "cosine"}
+        )
+        print("Collection cleared.")
+
+    def sync(self, dry_run: bool = False) -> Dict[str, Any]:
+        """Embed only new or changed chunks and delete chunks missing from the file.
+
+        Interrupted syncs need no checkpoint: written chunks already carry their
+        hash, so the next sync skips them.
+        """
+        diff = self.plan_sync()
+        self.print_diff(diff)
+        if dry_run:
+            print("\nDry run: collection not modified.")
+            return diff
         
-        print("\nAll chunks have been added to the database.")
+        self.delete_chunks(diff['removed'])
+        if diff['embed_lines']:
+            embed_lines = diff['embed_lines']
+            self.ingest(item for item in self.iter_chunks() if item[0] in embed_lines)
+        else:
+            print("\nCollection is up to date; nothing to embed.")
+        return diff
 
-    def process_embeddings(self):
-        """Complete embedding generation and storage pipeline."""
+    def process_embeddings(self, mode: str = "sync", assume_yes: bool = False, dry_run: bool = False,
+                           resume: bool = False, retry_dead_letter: bool = False):
+        """Complete embedding generation and storage pipeline.
+
+        mode="sync" is incremental and never prompts. mode="rebuild" re-embeds
+        everything; it asks for confirmation on a terminal unless assume_yes,
+        and with resume continues an interrupted rebuild from its checkpoint.
+        """
         try:
-            # Check if the collection already has data
+            if retry_dead_letter:
+                stats = self.retry_dead_letter()
+                return stats['dead_lettered'] == 0
+
+            if mode == "sync":
+                self.sync(dry_run=dry_run)
+                return True
+
+            checkpoint = IngestCheckpoint(self.checkpoint_path, self.chunks_file, mode) if self.chunks_file.exists() else None
+            start_after = checkpoint.load() if (checkpoint and resume) else 0
+            if start_after:
+                print(f"\nResuming rebuild after line {start_after} of {self.chunks_file}")
+                if dry_run:
+                    print("Dry run: collection not modified.")
+                    return True
+                self.ingest(self.iter_chunks(), checkpoint=checkpoint, start_after=start_after)
+                checkpoint.clear()
+                return True
+
             count = self.collection.count()
-            if count > 0:
+            if count > 0 and not dry_run:
                 print(f"\nCollection '{self.collection_name}' already contains {count} documents.")
-                user_input = input("Do you want to clear the existing collection and re-process? (yes/no): ").lower()
-                if user_input == 'yes':
-                    print("Clearing existing collection...")
-                    self.client.delete_collection(name=self.collection_name)
-                    self.collection = self.client.get_or_create_collection(
-                        name=self.collection_name,
-                        embedding_function=self.embedding_function,
-                        metadata={"hnsw:space": "cosine"}
-                    )
-                    print("Collection cleared.")
-                else:
-                    print("Skipping embedding generation.")
-                    return True
+                if not assume_yes:
+                    if not sys.stdin.isatty():
+                        print("Refusing to clear the collection without --yes in a non-interactive run.")
+                        return False
+                    user_input = input("Do you want to clear the existing collection and re-process? (yes/no): ").lower()
+                    if user_input != 'yes':
+                        print("Skipping embedding generation.")
+                        return True
+                self.reset_collection()
 
-            # Load processed chunks
-            chunks = self.load_chunks()
+            if dry_run:
+                total = sum(1 for _ in self.iter_chunks())
+                print(f"\nDry run: would clear {count} documents and embed {total} chunks.")
+                return True
             
-            # Add chunks to ChromaDB (embeddings are generated automatically)
-            self.add_chunks_to_db(chunks)
+            # Stream chunks from the JSONL file into ChromaDB
+            self.dead_letter_path.unlink(missing_ok=True)
+            self.ingest(self.iter_chunks(), checkpoint=checkpoint)
+            checkpoint.clear()
             
             return True
             
@@ -149,15 +324,26 @@ class LegalEmbeddingGenerator:
 
 def main():
     """Main embedding generation and storage pipeline."""
+    parser = argparse.ArgumentParser(description="Embed legal chunks into ChromaDB")
+    parser.add_argument("--mode", choices=["sync", "rebuild"], default="sync",
+                        help="sync: embed only new/changed chunks (default); rebuild: re-embed everything")
+    parser.add_argument("--yes", action="store_true", help="Do not ask before clearing the collection")
+    parser.add_argument("--dry-run", action="store_true", help="Print what would change and exit")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted rebuild from its checkpoint")
+    parser.add_argument("--retry-dead-letter", action="store_true", help="Re-ingest chunks from the dead-letter file")
+    parser.add_argument("--chunks-file", default=None, help="Chunks JSONL (default: processed/chunks/legal_chunks_delimiter_based.jsonl)")
+    args = parser.parse_args()
+    
     print("LEGAL DOCUMENT EMBEDDING GENERATOR (V2)")
     print("=" * 50)
     
     start_time = time.time()
     
-    generator = LegalEmbeddingGenerator()
+    generator = LegalEmbeddingGenerator(chunks_file=args.chunks_file)
     
     # Process and store embeddings
-    success = generator.process_embeddings()
+    success = generator.process_embeddings(mode=args.mode, assume_yes=args.yes, dry_run=args.dry_run,
+                                           resume=args.resume, retry_dead_letter=args.retry_dead_letter)
     
     end_time = time.time()
     duration = end_time - start_time
@@ -173,7 +359,7 @@ def main():
         print(f"   - ChromaDB Collection: '{generator.collection_name}'")
         print(f"   - Location: '{generator.db_dir}'")
         print(f"   - Total Documents: {final_count}")
-        print(f"   - Embedding Model: '{generator.model_name}'")
+        print(f"   - Embedding Model: '{generator.model_name}' ({generator.backend})")
         
         print(f"\nThe system is now ready for the RAG pipeline.")
     else:
@@ -181,6 +367,7 @@ def main():
         print(f"Total time taken: {duration:.2f} seconds")
         print("=" * 60)
         print("Please check the error messages above.")
+        sys.exit(1)
 
 
 if __name__ == "__main__":
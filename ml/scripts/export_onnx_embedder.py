@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Export multilingual-e5-large to ONNX and quantize it to int8.
+
+Produces a directory usable with EMBEDDING_BACKEND=onnx:
+    model.onnx (+ external weights)   fp32 export
+    model_quantized.onnx              int8 dynamic quantization (used at runtime)
+    tokenizer.json                    fast tokenizer
+
+Usage:
+    python ml/scripts/export_onnx_embedder.py --output ml/embeddings/onnx_e5_large
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent / "backend"))
+from app.embedding_backends import DEFAULT_MODEL_NAME
+
+
+def export_model(model_name: str, output_dir: Path, opset: int = 17) -> Path:
+    """Export the transformer encoder (last hidden state) to ONNX."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    print(f"Loading {model_name}...")
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name)
+    model.eval()
+
+    tokenizer.save_pretrained(str(output_dir))
+
+    dummy = tokenizer(["नेपालको संविधान धारा ७६"], return_tensors="pt")
+    fp32_path = output_dir / "model.onnx"
+
+    print(f"Exporting to {fp32_path}...")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (dummy["input_ids"], dummy["attention_mask"]),
+            str(fp32_path),
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+            },
+            opset_version=opset,
+        )
+    return fp32_path
+
+
+def quantize_model(fp32_path: Path, output_dir: Path) -> Path:
+    """Apply int8 dynamic quantization to the weights (activations stay fp32)."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    int8_path = output_dir / "model_quantized.onnx"
+    print(f"Quantizing to {int8_path}...")
+    quantize_dynamic(
+        model_input=str(fp32_path),
+        model_output=str(int8_path),
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+        use_external_data_format=True,  # e5-large fp32 weights exceed the 2 GB protobuf limit
+    )
+    return int8_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the embedding model to quantized ONNX")
+    parser.add_argument("--model", default=DEFAULT_MODEL_NAME, help="Hugging Face model name")
+    parser.add_argument("--output", default=str(Path(__file__).resolve().parent.parent / "embeddings" / "onnx_e5_large"),
+                        help="Output directory")
+    parser.add_argument("--skip-quantize", action="store_true", help="Only export the fp32 model")
+    args = parser.parse_args()
+
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    fp32_path = export_model(args.model, output_dir)
+    if not args.skip_quantize:
+        quantize_model(fp32_path, output_dir)
+
+    print(f"\nDone. Use it with:\n  EMBEDDING_BACKEND=onnx EMBEDDING_ONNX_DIR={output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+PDF extraction stage: turn the acts and ordinances in the `documents` table
+(or a pdfs/ folder) into RAG chunks.
+
+For every PDF a worker process:
+1. loads the bytes (from the DB by Document.id, or from disk)
+2. extracts the page text (PyMuPDF, falling back to pypdf), normalizes it to
+   NFC and drops running headers/footers and bare page numbers
+3. runs clean_source_files.clean_legal_document and
+   delimiter_chunker.iter_legal_chunks
+4. writes its chunks, tagged with document_id / category / file_hash, to its
+   own part file (and the parents of split provisions to <part>.parents.jsonl)
+
+Extraction is incremental on the file hash: a state file remembers the MD5 of
+every document, and unchanged documents reuse their part file. For the DB the
+hash is computed by Postgres (md5(file_data)), so unchanged PDFs are never
+even transferred. The parts are then joined into one chunks JSONL, optionally
+after other chunk files, so the library and the chatbot share one corpus.
+
+Usage:
+    python ml/scripts/pdf_extractor.py                        # DB (DATABASE_URL), Acts + ordinance
+    python ml/scripts/pdf_extractor.py --source disk --pdf-dir pdfs
+    python ml/scripts/pdf_extractor.py \\
+        --merge-with ml/processed/chunks/legal_chunks_delimiter_based.jsonl \\
+        --output ml/processed/chunks/legal_corpus.jsonl
+
+Requires PyMuPDF (pip install pymupdf) or pypdf. PDFs typeset in legacy
+(non-Unicode) Devanagari fonts yield little Devanagari text; they are reported
+with a low devanagari_ratio in the state file. Scanned PDFs without a text
+layer are reported as "no_text" (OCR is out of scope here).
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import sys
+import time
+import unicodedata
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+ML_DIR = SCRIPT_DIR.parent
+BACKEND_DIR = ML_DIR.parent / "backend"
+sys.path.insert(0, str(SCRIPT_DIR))
+from clean_source_files import clean_legal_document
+from delimiter_chunker import DEFAULT_MAX_CHUNK_CHARS, is_parent_chunk, iter_legal_chunks, parents_path_for
+
+DEFAULT_WORK_DIR = ML_DIR / "processed" / "pdf"
+DEFAULT_OUTPUT = ML_DIR / "processed" / "chunks" / "legal_chunks_pdf.jsonl"
+DEFAULT_CATEGORIES = ("Acts", "ordinance")  # 'formats' are blank forms, not law
+
+# Zero-width space, BOM and soft hyphen; ZWJ/ZWNJ are kept (they shape Devanagari conjuncts)
+_INVISIBLE_RE = re.compile('[\u200b\ufeff\u00ad]')
+_PAGE_NUMBER_RE = re.compile(r'^\s*[-–]?\s*[\d०-९]+\s*[-–]?\s*$')
+_DEVANAGARI_RE = re.compile('[\u0900-\u097f]')
+_LETTER_RE = re.compile(r'[^\W\d_]')
+# "... ऐन, २०७६" / "... संहिता, २०७४" / "... अध्यादेश, २०८१" in the first lines
+_ACT_TITLE_RE = re.compile(r'^\s*(.{3,120}?(?:ऐन|संहिता|अध्यादेश|नियमावली|संविधान)\s*,?\s*[०-९\d]{4})\s*$')
+
+
+def file_hash(data: bytes) -> str:
+    """MD5 content fingerprint; matches Postgres md5(file_data)."""
+    return hashlib.md5(data).hexdigest()
+
+
+def extract_pdf_pages(data: bytes) -> List[str]:
+    """Text of every page, via PyMuPDF if installed, else pypdf."""
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        fitz = None
+    if fitz is not None:
+        with fitz.open(stream=data, filetype="pdf") as pdf:
+            return [page.get_text("text", sort=True) for page in pdf]
+
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise RuntimeError("PDF extraction needs PyMuPDF (pip install pymupdf) or pypdf")
+    return [page.extract_text() or '' for page in PdfReader(io.BytesIO(data)).pages]
+
+
+def normalize_pages(pages: List[str], repeat_ratio: float = 0.5) -> str:
+    """NFC-normalize, drop page numbers and lines repeated on most pages (running headers/footers)."""
+    page_lines = []
+    for page in pages:
+        page = _INVISIBLE_RE.sub('', unicodedata.normalize('NFC', page))
+        page_lines.append([line.rstrip() for line in page.splitlines()])
+
+    repeated = set()
+    if len(page_lines) >= 3:
+        counts = Counter(line.strip() for lines in page_lines for line in set(lines) if line.strip())
+        repeated = {line for line, count in counts.items() if count / len(page_lines) >= repeat_ratio}
+
+    kept = []
+    for lines in page_lines:
+        kept.extend(line for line in lines
+                    if line.strip() not in repeated and not _PAGE_NUMBER_RE.match(line))
+    return '\n'.join(kept)
+
+
+def devanagari_ratio(text: str) -> float:
+    letters = len(_LETTER_RE.findall(text))
+    return len(_DEVANAGARI_RE.findall(text)) / letters if letters else 0.0
+
+
+def guess_act_name(text: str, fallback: str) -> str:
+    """Act title from the first lines of the text, else the file name without extension."""
+    for line in text.splitlines()[:25]:
+        match = _ACT_TITLE_RE.match(line)
+        if match:
+            return re.sub(r'\s+', ' ', match.group(1)).strip()
+    return Path(fallback).stem.replace('_', ' ').strip()
+
+
+def document_prefix(doc: Dict[str, Any]) -> str:
+    """Chunk ID / part file prefix, unique per document even when two PDFs share a title."""
+    if doc['document_id'] is not None:
+        return f"doc-{doc['document_id']}"
+    return f"pdf-{hashlib.md5(doc['key'].encode('utf-8')).hexdigest()[:10]}"
+
+
+def _load_db_bytes(document_id: int) -> bytes:
+    from app.db import SessionLocal
+    from app.models import Document
+
+    db = SessionLocal()
+    try:
+        return db.query(Document.file_data).filter(Document.id == document_id).scalar() or b''
+    finally:
+        db.close()
+
+
+def _init_worker(source: str):
+    if source == "db":
+        sys.path.insert(0, str(BACKEND_DIR))
+        from app.db import engine
+        # Connections inherited from the parent must not be reused after fork
+        engine.dispose(close=False)
+
+
+def extract_document(doc: Dict[str, Any], parts_dir: str, previous: Dict[str, Any],
+                     max_chunk_chars: Optional[int] = DEFAULT_MAX_CHUNK_CHARS) -> Dict[str, Any]:
+    """Worker: extract, clean and chunk one PDF into its part file."""
+    started = time.perf_counter()
+    result = {**doc, 'status': 'ok', 'chunks': 0, 'parents': 0, 'part': None, 'error': None,
+              'max_chunk_chars': max_chunk_chars}
+    prefix = document_prefix(doc)
+    part_path = Path(parts_dir) / f"{prefix}.jsonl"
+
+    def unchanged(hash_value: Optional[str]) -> bool:
+        return (hash_value is not None and hash_value == previous.get('hash')
+                and previous.get('max_chunk_chars') == max_chunk_chars
+                and (part_path.exists() or previous.get('status') == 'no_text'))
+
+    try:
+        # DB rows carry their hash already, so unchanged PDFs are never loaded
+        if unchanged(doc.get('hash')):
+            result.update(status='unchanged')
+            return result
+        if 'path' in doc:
+            with open(doc['path'], 'rb') as f:
+                data = f.read()
+        else:
+            data = _load_db_bytes(doc['document_id'])
+        result['hash'] = doc.get('hash') or file_hash(data)
+        if unchanged(result['hash']):
+            result.update(status='unchanged')
+            return result
+
+        text = normalize_pages(extract_pdf_pages(data))
+        del data
+        result['devanagari_ratio'] = round(devanagari_ratio(text), 3)
+        if not text.strip():
+            result['status'] = 'no_text'
+            return result
+
+        text = clean_legal_document(text)
+        act_name = guess_act_name(text, doc['title'])
+        result['act_name'] = act_name
+        parents_path = parents_path_for(part_path)
+        tmp_path = part_path.with_suffix('.tmp')
+        tmp_parents_path = parents_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f, open(tmp_parents_path, 'w', encoding='utf-8') as parents:
+            for chunk in iter_legal_chunks(text, act_name, doc['title'], max_chunk_chars):
+                chunk['id'] = f"{prefix}-{chunk['id']}"
+                if 'parent_id' in chunk['metadata']:
+                    chunk['metadata']['parent_id'] = f"{prefix}-{chunk['metadata']['parent_id']}"
+                chunk['metadata'].update({
+                    'source_type': 'pdf',
+                    'category': doc['category'],
+                    'file_hash': result['hash'],
+                })
+                if doc['document_id'] is not None:
+                    chunk['metadata']['document_id'] = doc['document_id']
+                line = json.dumps(chunk, ensure_ascii=False) + '\n'
+                if is_parent_chunk(chunk):
+                    parents.write(line)
+                    result['parents'] += 1
+                else:
+                    f.write(line)
+                    result['chunks'] += 1
+        os.replace(tmp_parents_path, parents_path)
+        os.replace(tmp_path, part_path)
+        result['part'] = str(part_path)
+    except Exception as e:
+        result.update(status='error', error=str(e))
+    finally:
+        result['seconds'] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def list_db_documents(categories: List[str]) -> Iterator[Dict[str, Any]]:
+    """Document rows with a server-side MD5 of the PDF bytes (no PDF data transferred)."""
+    sys.path.insert(0, str(BACKEND_DIR))
+    from sqlalchemy import func
+    from app.db import SessionLocal
+    from app.models import Document
+
+    db = SessionLocal()
+    try:
+        rows = (db.query(Document.id, Document.title, Document.category, func.md5(Document.file_data))
+                .filter(Document.file_data.isnot(None), Document.category.in_(categories))
+                .order_by(Document.id))
+        for document_id, title, category, md5 in rows:
+            yield {'key': f"db-{document_id}", 'document_id': document_id, 'title': title,
+                   'category': category, 'hash': md5}
+    finally:
+        db.close()
+
+
+def list_disk_documents(pdf_dir: Path, categories: List[str]) -> Iterator[Dict[str, Any]]:
+    """PDFs under pdf_dir/<category>/ (same layout as upload_pdfs_to_db.py)."""
+    for category in categories:
+        category_dir = pdf_dir / category
+        if not category_dir.exists():
+            print(f"Warning: Category folder '{category}' not found at {category_dir}")
+            continue
+        for path in sorted(category_dir.rglob("*")):
+            if path.suffix.lower() == '.pdf':
+                rel = path.relative_to(pdf_dir).as_posix()
+                yield {'key': f"disk-{rel}", 'document_id': None, 'title': path.name,
+                       'category': category, 'path': str(path)}
+
+
+def load_state(path: Path) -> Dict[str, Any]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_state(path: Path, state: Dict[str, Any]):
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def run_extraction(documents: List[Dict[str, Any]], source: str, work_dir: Path, output: Path,
+                   merge_with: List[Path], workers: Optional[int] = None, force: bool = False,
+                   max_chunk_chars: Optional[int] = DEFAULT_MAX_CHUNK_CHARS) -> Dict[str, Any]:
+    parts_dir = work_dir / "parts"
+    parts_dir.mkdir(parents=True, exist_ok=True)
+    state_path = work_dir / "extraction_state.json"
+    state = {} if force else load_state(state_path)
+
+    workers = workers or min(len(documents), os.cpu_count() or 1) or 1
+    print(f"Extracting {len(documents)} PDFs with {workers} workers...")
+    results: Dict[str, Dict[str, Any]] = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(source,)) as pool:
+        futures = [pool.submit(extract_document, doc, str(parts_dir), state.get(doc['key'], {}),
+                               max_chunk_chars)
+                   for doc in documents]
+        for future in as_completed(futures):
+            result = future.result()
+            results[result['key']] = result
+            if result['status'] == 'error':
+                print(f"  ✗ {result['title']}: {result['error']}")
+            elif result['status'] == 'no_text':
+                print(f"  ! {result['title']}: no text layer (scanned PDF?)")
+            elif result['status'] == 'unchanged':
+                print(f"  = {result['title']}: unchanged")
+            else:
+                warning = " (low Devanagari ratio; legacy font?)" if result['devanagari_ratio'] < 0.2 else ""
+                print(f"  ✓ {result['title']}: {result['chunks']} chunks ({result['seconds']:.2f}s){warning}")
+
+    # New state: documents that no longer exist are dropped with their part files
+    new_state = {}
+    for doc in documents:
+        result = results[doc['key']]
+        previous = state.get(doc['key'], {})
+        if result['status'] == 'unchanged':
+            new_state[doc['key']] = previous
+        elif result['status'] == 'error':
+            if previous:
+                new_state[doc['key']] = previous  # keep serving the last good extraction
+        else:
+            new_state[doc['key']] = {
+                key: result.get(key) for key in
+                ('document_id', 'title', 'category', 'hash', 'status', 'chunks', 'parents', 'part',
+                 'act_name', 'devanagari_ratio', 'max_chunk_chars')
+            }
+            new_state[doc['key']]['extracted_at'] = time.time()
+    removed = [key for key in state if key not in new_state]
+    for key in removed:
+        if state[key].get('part'):
+            Path(state[key]['part']).unlink(missing_ok=True)
+            parents_path_for(state[key]['part']).unlink(missing_ok=True)
+    save_state(state_path, new_state)
+
+    # Join (merge files first, then PDFs in document order) and swap the outputs in atomically;
+    # the parents of split provisions are joined the same way into <output>.parents.jsonl
+    output.parent.mkdir(parents=True, exist_ok=True)
+    for target, part_of in ((output, Path), (parents_path_for(output), parents_path_for)):
+        tmp_path = target.with_suffix(target.suffix + '.tmp')
+        with open(tmp_path, 'wb') as out:
+            for path in merge_with:
+                if part_of(path).exists():
+                    with open(part_of(path), 'rb') as f:
+                        shutil.copyfileobj(f, out)
+            for doc in documents:
+                part = new_state.get(doc['key'], {}).get('part')
+                if part and part_of(part).exists():
+                    with open(part_of(part), 'rb') as f:
+                        shutil.copyfileobj(f, out)
+        os.replace(tmp_path, target)
+
+    statuses = Counter(result['status'] for result in results.values())
+    return {
+        'output': str(output),
+        'documents': len(documents),
+        'extracted': statuses['ok'],
+        'unchanged': statuses['unchanged'],
+        'no_text': statuses['no_text'],
+        'failed': [r['title'] for r in results.values() if r['status'] == 'error'],
+        'removed': len(removed),
+        'total_chunks': sum(entry.get('chunks') or 0 for entry in new_state.values()),
+        'total_parents': sum(entry.get('parents') or 0 for entry in new_state.values())
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract and chunk legal PDFs for the RAG corpus")
+    parser.add_argument("--source", choices=["db", "disk"], default="db",
+                        help="Read PDFs from the documents table (DATABASE_URL) or from --pdf-dir")
+    parser.add_argument("--pdf-dir", default=str(ML_DIR.parent / "pdfs"), help="Root with <category>/ folders (disk)")
+    parser.add_argument("--categories", default=",".join(DEFAULT_CATEGORIES), help="Comma-separated categories")
+    parser.add_argument("--work-dir", default=str(DEFAULT_WORK_DIR), help="Part files and extraction state")
+    parser.add_argument("--output", default=str(DEFAULT_OUTPUT), help="Chunks JSONL to write")
+    parser.add_argument("--merge-with", nargs="*", default=[], help="Chunk JSONL files to put before the PDF chunks")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Ignore the state file and re-extract everything")
+    parser.add_argument("--max-chunk-chars", type=int, default=DEFAULT_MAX_CHUNK_CHARS,
+                        help="Split longer provisions into उपदफा/खण्ड children (0 disables)")
+    args = parser.parse_args()
+
+    print("LEGAL PDF EXTRACTION")
+    print("=" * 60)
+    start_time = time.time()
+    categories = [c.strip() for c in args.categories.split(',') if c.strip()]
+    if args.source == "db":
+        documents = list(list_db_documents(categories))
+    else:
+        documents = list(list_disk_documents(Path(args.pdf_dir), categories))
+    if not documents:
+        print("No PDFs found.")
+        return
+
+    summary = run_extraction(documents, args.source, Path(args.work_dir), Path(args.output),
+                             [Path(p) for p in args.merge_with], workers=args.workers, force=args.force,
+                             max_chunk_chars=args.max_chunk_chars or None)
+    print(f"\n{'=' * 60}")
+    print(f"Extracted {summary['extracted']}, unchanged {summary['unchanged']}, "
+          f"no text {summary['no_text']}, removed {summary['removed']} "
+          f"({summary['documents']} PDFs, {summary['total_chunks']} chunks) in {time.time() - start_time:.2f}s")
+    print(f"Output file: {summary['output']}")
+    if summary['failed']:
+        print(f"Failed: {', '.join(summary['failed'])}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
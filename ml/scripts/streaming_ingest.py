@@ -0,0 +1,286 @@
+"""
+Streaming, memory-bounded ingestion of chunks into a Chroma collection.
+
+    chunk generator -> adaptive batches -> embed (caller thread)
+                    -> bounded queue -> upsert (writer thread)
+
+- Batches are sized by a token budget derived from currently available memory
+  and the length of the chunks (padding makes a batch cost
+  len(batch) x longest chunk), not by a fixed count.
+- Embedding batch N+1 overlaps with the Chroma write of batch N. The queue
+  bound keeps at most `queue_size` embedded batches in memory.
+- Failed batches are retried with backoff. On MemoryError the batch is split
+  in half and the budget shrinks. Chunks that still fail go to a
+  dead-letter JSONL that can be replayed later.
+- After every batch the writer records the last input line in a checkpoint,
+  so an interrupted run can resume instead of starting over. If the writer
+  itself fails (e.g. the checkpoint or dead-letter file cannot be written),
+  run() stops embedding and re-raises its error.
+
+Used by embedding_generator_v2.py.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# (input line number, chunk with 'chunk_id', 'text', 'metadata')
+Item = Tuple[int, Dict[str, Any]]
+
+
+def available_memory_bytes() -> Optional[int]:
+    """MemAvailable on Linux, free physical pages elsewhere; None if unknown."""
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def estimate_tokens(text: str, max_seq_tokens: int = 512) -> int:
+    """Rough XLM-R token count (~3 chars per token for Devanagari), capped at the model's max length."""
+    return min(max_seq_tokens, max(1, len(text) // 3))
+
+
+class AdaptiveBatcher:
+    def __init__(self, memory_fraction: float = 0.1, bytes_per_token: int = 100_000,
+                 min_tokens: int = 512, max_tokens: int = 32_768, max_batch_size: int = 64,
+                 max_seq_tokens: int = 512, fallback_tokens: int = 8192):
+        # bytes_per_token: activation memory per padded token for e5-large (24 layers, 1024 hidden)
+        self.memory_fraction = memory_fraction
+        self.bytes_per_token = bytes_per_token
+        self.min_tokens = min_tokens
+        self.max_tokens = max_tokens
+        self.max_batch_size = max_batch_size
+        self.max_seq_tokens = max_seq_tokens
+        self.fallback_tokens = fallback_tokens
+        self.scale = 1.0
+
+    def token_budget(self) -> int:
+        """Padded tokens allowed in the next batch, re-read from free memory each time."""
+        available = available_memory_bytes()
+        if available is None:
+            budget = self.fallback_tokens
+        else:
+            budget = available * self.memory_fraction / self.bytes_per_token
+        return int(max(self.min_tokens, min(self.max_tokens, budget * self.scale)))
+
+    def shrink(self):
+        """Halve future batches, e.g. after a MemoryError."""
+        self.scale = max(self.scale / 2, 1 / 64)
+
+    def batches(self, items: Iterable[Item]) -> Iterator[List[Item]]:
+        batch: List[Item] = []
+        longest = 0
+        budget = self.token_budget()
+        for item in items:
+            cost = estimate_tokens(item[1]['text'], self.max_seq_tokens)
+            padded = (len(batch) + 1) * max(longest, cost)
+            if batch and (padded > budget or len(batch) >= self.max_batch_size):
+                yield batch
+                batch, longest = [], 0
+                budget = self.token_budget()
+            batch.append(item)
+            longest = max(longest, cost)
+        if batch:
+            yield batch
+
+
+class IngestCheckpoint:
+    """Last input line written, valid only for the same source file and mode."""
+
+    def __init__(self, path: Path, source: Path, mode: str):
+        self.path = Path(path)
+        stat = Path(source).stat()
+        self.signature = {'source': str(Path(source).resolve()), 'size': stat.st_size,
+                          'mtime': stat.st_mtime, 'mode': mode}
+
+    def load(self) -> int:
+        """Line to resume after (0 = start), ignoring checkpoints from another file or mode."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return 0
+        if state.get('signature') != self.signature:
+            print(f"Ignoring checkpoint {self.path}: it belongs to a different chunks file or mode")
+            return 0
+        return state.get('last_line', 0)
+
+    def save(self, last_line: int, written: int):
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'signature': self.signature, 'last_line': last_line, 'written': written,
+                       'updated_at': time.time()}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+
+class DeadLetterFile:
+    """JSONL of chunks that failed after all retries, replayable as an ingestion source."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.count = 0
+
+    def write(self, batch: List[Item], error: str):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for line, chunk in batch:
+                f.write(json.dumps({'line': line, 'chunk': chunk, 'error': error,
+                                    'failed_at': time.time()}, ensure_ascii=False) + '\n')
+        self.count += len(batch)
+
+    def read(self) -> Iterator[Item]:
+        if not self.path.exists():
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    yield record['line'], record['chunk']
+
+
+class StreamingIngestor:
+    def __init__(self, collection, embed_fn: Callable[[List[str]], List[Any]],
+                 batcher: Optional[AdaptiveBatcher] = None,
+                 checkpoint: Optional[IngestCheckpoint] = None,
+                 dead_letter: Optional[DeadLetterFile] = None,
+                 max_retries: int = 3, backoff_seconds: float = 1.0, queue_size: int = 2):
+        self.collection = collection
+        self.embed_fn = embed_fn
+        self.batcher = batcher or AdaptiveBatcher()
+        self.checkpoint = checkpoint
+        self.dead_letter = dead_letter
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.queue_size = queue_size
+        self.stats = {'batches': 0, 'written': 0, 'dead_lettered': 0, 'retries': 0,
+                      'memory_splits': 0, 'embed_seconds': 0.0, 'write_seconds': 0.0}
+        self._writer_error: Optional[BaseException] = None
+
+    def _retry_delay(self, attempt: int) -> float:
+        self.stats['retries'] += 1
+        return self.backoff_seconds * (2 ** attempt)
+
+    def _embed(self, batch: List[Item]) -> List[Tuple[List[Item], Optional[List[Any]], Optional[str]]]:
+        """Embed a batch; returns (sub-batch, embeddings or None, error) pieces in input order."""
+        error = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                started = time.perf_counter()
+                embeddings = self.embed_fn([chunk['text'] for _, chunk in batch])
+                self.stats['embed_seconds'] += time.perf_counter() - started
+                return [(batch, embeddings, None)]
+            except MemoryError:
+                self.batcher.shrink()
+                if len(batch) > 1:
+                    self.stats['memory_splits'] += 1
+                    mid = len(batch) // 2
+                    return self._embed(batch[:mid]) + self._embed(batch[mid:])
+                error = 'MemoryError'
+                break
+            except Exception as e:
+                error = repr(e)
+                if attempt < self.max_retries:
+                    time.sleep(self._retry_delay(attempt))
+        return [(batch, None, f"embed: {error}")]
+
+    def _write(self, batch: List[Item], embeddings: List[Any]) -> Optional[str]:
+        error = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                started = time.perf_counter()
+                self.collection.upsert(
+                    ids=[chunk['chunk_id'] for _, chunk in batch],
+                    documents=[chunk['text'] for _, chunk in batch],
+                    metadatas=[chunk['metadata'] for _, chunk in batch],
+                    embeddings=embeddings
+                )
+                self.stats['write_seconds'] += time.perf_counter() - started
+                return None
+            except Exception as e:
+                error = repr(e)
+                if attempt < self.max_retries:
+                    time.sleep(self._retry_delay(attempt))
+        return f"write: {error}"
+
+    def _fail(self, batch: List[Item], error: str):
+        print(f"  - Batch of {len(batch)} chunks failed ({error}); sent to dead-letter file")
+        self.stats['dead_lettered'] += len(batch)
+        if self.dead_letter is not None:
+            self.dead_letter.write(batch, error)
+
+    def _writer(self, work: "queue.Queue"):
+        try:
+            self._drain(work)
+        except BaseException as e:
+            # Picked up by run(); the thread's own traceback would go unnoticed
+            self._writer_error = e
+
+    def _drain(self, work: "queue.Queue"):
+        while True:
+            piece = work.get()
+            if piece is None:
+                return
+            batch, embeddings, error = piece
+            if error is None:
+                error = self._write(batch, embeddings)
+            if error is None:
+                self.stats['written'] += len(batch)
+                self.stats['batches'] += 1
+                print(f"  - Upserted batch {self.stats['batches']} ({len(batch)} chunks, "
+                      f"{self.stats['written']} written)")
+            else:
+                self._fail(batch, error)
+            # Batches arrive in input order, so everything up to here is settled
+            if self.checkpoint is not None:
+                self.checkpoint.save(batch[-1][0], self.stats['written'])
+
+    @staticmethod
+    def _enqueue(work: "queue.Queue", piece, writer: threading.Thread) -> bool:
+        """Put piece on the queue; False if the writer died and will never take it."""
+        while writer.is_alive():
+            try:
+                work.put(piece, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def run(self, items: Iterable[Item], start_after: int = 0) -> Dict[str, Any]:
+        """Ingest items (line, chunk), skipping lines <= start_after. Returns the run stats.
+
+        Re-raises the writer thread's exception if it fails.
+        """
+        started = time.perf_counter()
+        self._writer_error = None
+        work: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        writer = threading.Thread(target=self._writer, args=(work,), name="chroma-writer", daemon=True)
+        writer.start()
+        try:
+            pending = (item for item in items if item[0] > start_after)
+            for batch in self.batcher.batches(pending):
+                for piece in self._embed(batch):
+                    if not self._enqueue(work, piece, writer):
+                        break
+                if not writer.is_alive():
+                    break
+        finally:
+            self._enqueue(work, None, writer)
+            writer.join()
+        if self._writer_error is not None:
+            raise self._writer_error
+        self.stats['seconds'] = round(time.perf_counter() - started, 2)
+        return self.stats